@@ -0,0 +1,276 @@
+"""Embeddable Python API.
+
+Runs podd in-process, without the command line interface, e.g.::
+
+    with Client() as client:
+        client.add_feeds(["https://example.com/feed.rss"])
+        refreshed = client.refresh()
+        report = client.download(ep for pod in refreshed for ep in pod.episodes)
+
+Nothing is printed, results are returned as named tuples, and progress is
+reported by calling `progress` with a `Progress` as each podcast or episode is
+done.  A client keeps its thread and tagging pools between calls, so they're
+only started once.  `AsyncClient` has the same methods, as coroutines.
+"""
+
+import asyncio
+from functools import partial
+from multiprocessing import Pool as ProcessPool
+from multiprocessing.dummy import Pool as ThreadPool
+from os import cpu_count
+from threading import Lock
+import typing as tp
+
+from podd.archive import FeedArchive
+from podd.artwork import ArtworkCache
+from podd.database import Addition, Database, Feed
+from podd.downloader import (
+    TAGGING_PROCESSES,
+    DownloadReport,
+    Progress,
+    bandwidth_limiter,
+    refresh_profiles,
+    tagging_pool,
+    threaded_downloader,
+)
+from podd.podcast import Episode
+from podd.redirects import RedirectCache
+from podd.scheduling import schedule
+from podd.settings import Config
+
+ProgressCallback = tp.Callable[[Progress], None]
+
+
+class Refresh(tp.NamedTuple):
+    """New episodes of a subscription, see `Client.refresh`."""
+
+    name: str
+    url: str
+    episodes: tp.List[Episode]
+
+
+class Client:
+    """Refresh subscriptions, download episodes and add feeds in-process.
+
+    Pools are started the first time they're needed and kept until `close`.
+    Methods may be called from several threads at once.
+    """
+
+    def __init__(
+        self,
+        database: str = Config.database,
+        threads: int = 3,
+        tagging_processes: int = TAGGING_PROCESSES,
+    ):
+        """Init method.
+
+        :param database: database holding subscriptions, see `create_database`
+        :param threads: number of feeds fetched, or episodes downloaded, at once
+        :param tagging_processes: max number of processes tagging downloaded files
+        """
+        self.database = database
+        self.threads = threads
+        self.tagging_processes = min(tagging_processes, cpu_count() or 1)
+        self._pool: ThreadPool = None
+        self._tagger: ProcessPool = None
+        self._artwork: ArtworkCache = None
+        self._redirects: RedirectCache = None
+        self._lock = Lock()
+
+    def __enter__(self):
+        """Context method."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context method."""
+        self.close()
+
+    def __repr__(self):
+        """`repr` method."""
+        return f"{self.__class__.__name__}({self.database}, {self.threads})"
+
+    def subscriptions(self) -> tp.List[tuple]:
+        """Return subscriptions.
+
+        :return: list of tuples of name, rss feed url and download directory
+        """
+        with Database(self.database) as _db:
+            return _db.get_podcasts()
+
+    def refresh(
+        self, subscriptions: tp.List[str] = None, progress: ProgressCallback = None
+    ) -> tp.List[Refresh]:
+        """Fetch rss feeds, finding episodes that haven't been downloaded yet.
+
+        Back catalog episodes are limited by the backlog budget, as in `podd dl`.
+        Feeds are fetched with a timeout, their refresh stats are recorded, see
+        `podd stats`, and they're archived if archiving is on, see `FeedArchive`.
+        :param subscriptions: rss feed urls to refresh, by default all of them
+        :param progress: called with a `Progress` as each feed is refreshed
+        :return: list of Refreshes, one per subscription
+        """
+        with Database(self.database) as _db:
+            podcasts = _db.get_podcasts()
+            budget = _db.get_backlog_budget()
+            archive = FeedArchive() if _db.get_archive() else None
+        if subscriptions is not None:
+            wanted = set(subscriptions)
+            podcasts = [podcast for podcast in podcasts if podcast[1] in wanted]
+        refreshed = refresh_profiles(
+            {self.database: (podcasts, budget)}, self._threads(), progress, archive
+        )[self.database]
+        return [Refresh(pod.name, pod.url, pod.episodes) for pod in refreshed]
+
+    def download(
+        self,
+        episodes: tp.Iterable[Episode],
+        order: str = "feed",
+        inline_tags: bool = False,
+        progress: ProgressCallback = None,
+    ) -> DownloadReport:
+        """Download, tag and record episodes.
+
+        The bandwidth limit set by `podd limit` applies to each call.
+        :param episodes: Episodes, e.g., from `refresh`
+        :param order: name of scheduling policy used to order downloads
+        :param inline_tags: tag mp3 files while downloading them
+        :param progress: called with a `Progress` as each episode is downloaded
+        :return: DownloadReport
+        """
+        with Database(self.database) as _db:
+            limiter = bandwidth_limiter(*_db.get_bandwidth())
+        with self._lock:
+            if self._artwork is None:
+                self._artwork = ArtworkCache()
+            if self._redirects is None:
+                self._redirects = RedirectCache()
+            if self._tagger is None:
+                self._tagger = tagging_pool(self.tagging_processes)
+        return threaded_downloader(
+            schedule(list(episodes), order),
+            limiter,
+            inline_tags,
+            self.database,
+            self._threads(),
+            self._tagger,
+            self._artwork,
+            progress,
+            self._redirects,
+        )
+
+    def add_feeds(
+        self, urls: tp.List[str], newest_only: bool = False, root: str = None
+    ) -> tp.List[Addition]:
+        """Subscribe to feeds.
+
+        :param urls: rss feed urls
+        :param newest_only: only download the newest episode of each, instead of
+        putting their back catalog in the backlog
+        :param root: download root to pin podcasts to, by default one is chosen
+        by the placement policy
+        :return: list of Additions, one per url
+        """
+        with Feed(self.database) as feed:
+            return feed.add_many(
+                urls, newest_only, root=root, pool=self._threads(), verbose=False
+            )
+
+    def close(self) -> None:
+        """Stop pools, waiting for work in progress.
+
+        :return: None
+        """
+        with self._lock:
+            pools, self._pool, self._tagger = (self._pool, self._tagger), None, None
+        for pool in pools:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    def _threads(self) -> ThreadPool:
+        """Return thread pool, starting it if needed."""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPool(self.threads)
+            return self._pool
+
+
+class AsyncClient:
+    """Asyncio variant of `Client`.
+
+    Work is done by a `Client` in the event loop's default executor, so the loop
+    isn't blocked.  Progress callbacks are called in the event loop's thread.
+    """
+
+    def __init__(
+        self,
+        database: str = Config.database,
+        threads: int = 3,
+        tagging_processes: int = TAGGING_PROCESSES,
+    ):
+        """Init method, see `Client`."""
+        self._client = Client(database, threads, tagging_processes)
+
+    async def __aenter__(self):
+        """Context method."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Context method."""
+        await self.close()
+
+    def __repr__(self):
+        """`repr` method."""
+        return f"{self.__class__.__name__}({self._client.database})"
+
+    async def subscriptions(self) -> tp.List[tuple]:
+        """See `Client.subscriptions`."""
+        return await self._run(self._client.subscriptions)
+
+    async def refresh(
+        self, subscriptions: tp.List[str] = None, progress: ProgressCallback = None
+    ) -> tp.List[Refresh]:
+        """See `Client.refresh`."""
+        return await self._run(
+            self._client.refresh, subscriptions, self._callback(progress)
+        )
+
+    async def download(
+        self,
+        episodes: tp.Iterable[Episode],
+        order: str = "feed",
+        inline_tags: bool = False,
+        progress: ProgressCallback = None,
+    ) -> DownloadReport:
+        """See `Client.download`."""
+        return await self._run(
+            self._client.download,
+            list(episodes),
+            order,
+            inline_tags,
+            self._callback(progress),
+        )
+
+    async def add_feeds(
+        self, urls: tp.List[str], newest_only: bool = False, root: str = None
+    ) -> tp.List[Addition]:
+        """See `Client.add_feeds`."""
+        return await self._run(self._client.add_feeds, urls, newest_only, root)
+
+    async def close(self) -> None:
+        """See `Client.close`."""
+        await self._run(self._client.close)
+
+    @staticmethod
+    async def _run(func: tp.Callable, *args) -> tp.Any:
+        """Call func in the default executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(func, *args))
+
+    @staticmethod
+    def _callback(progress: ProgressCallback = None) -> ProgressCallback or None:
+        """Wrap progress, so it's called in the event loop's thread."""
+        if progress is None:
+            return None
+        loop = asyncio.get_running_loop()
+        return lambda event: loop.call_soon_threadsafe(progress, event)
@@ -0,0 +1,197 @@
+"""Implement archive of raw feed bodies, and replaying refreshes against it."""
+
+import gzip
+from hashlib import sha256
+import json
+import os
+import pathlib
+from threading import Lock, get_ident
+import time
+import typing as tp
+
+import feedparser as fp
+
+from podd.database import Database
+from podd.logger import logger
+from podd.podcast import Podcast
+from podd.settings import Config
+
+
+class Fetch(tp.NamedTuple):
+    """Single archived fetch of a feed."""
+
+    url: str  # URL the feed was fetched from
+    href: str  # Final URL, after redirects
+    fetched: float  # Seconds since the epoch
+    sha256: str  # Hash of the body, see `FeedArchive.body`
+    headers: tp.Dict[str, str]
+
+
+class Replay(tp.NamedTuple):
+    """Outcome of replaying a subscription's refresh, see `replay`."""
+
+    name: str
+    url: str
+    fetched: float or None  # None if the feed was never archived
+    episodes: int  # New episodes that would be downloaded
+    parse_seconds: float
+    diff_seconds: float
+
+
+class FeedArchive:
+    """Content-addressed archive of fetched feed bodies.
+
+    Bodies are stored gzipped in `blobs/`, named after the hash of the body, so
+    a feed that didn't change between fetches is only stored once.  `fetches/`
+    holds a JSON line per fetch of each URL, named after the hash of the URL,
+    with the response headers feedparser needs to parse the body as it was.
+    """
+
+    def __init__(self, directory: pathlib.Path = Config.feed_archive_directory):
+        """Init method.
+
+        :param directory: archive directory
+        """
+        self._blobs = pathlib.Path(directory) / "blobs"
+        self._fetches = pathlib.Path(directory) / "fetches"
+        self._blobs.mkdir(parents=True, exist_ok=True)
+        self._fetches.mkdir(parents=True, exist_ok=True)
+        self._logger = logger(f"{self.__class__.__name__}")
+        self._lock = Lock()
+
+    def __repr__(self):
+        """`repr` method."""
+        return f"{self.__class__.__name__}({self._blobs.parent})"
+
+    def store(
+        self,
+        url: str,
+        body: bytes,
+        headers: tp.Dict[str, str],
+        href: str = None,
+        fetched: float = None,
+    ) -> Fetch:
+        """Archive a fetched feed.
+
+        :param url: URL the feed was fetched from
+        :param body: raw response body
+        :param headers: response headers, with lowercase names
+        :param href: final URL after redirects, by default `url`
+        :param fetched: time of fetch in seconds since the epoch, by default now
+        :return: Fetch
+        """
+        digest = sha256(body).hexdigest()
+        blob = self._blobs / f"{digest}.gz"
+        if not blob.exists():
+            temp = blob.with_suffix(f".{os.getpid()}.{get_ident()}.tmp")
+            temp.write_bytes(gzip.compress(body))
+            os.replace(temp, blob)
+        fetch = Fetch(url, href or url, fetched or time.time(), digest, headers)
+        line = json.dumps(fetch._asdict()) + "\n"
+        with self._lock, open(self._index(url), "a") as file:
+            file.write(line)
+        self._logger.debug(f"Archived {url} as {digest}")
+        return fetch
+
+    def fetches(self, url: str) -> tp.List[Fetch]:
+        """Return archived fetches of a URL, oldest first.
+
+        :param url: URL the feed was fetched from
+        :return: list of Fetches
+        """
+        try:
+            with open(self._index(url)) as file:
+                return [Fetch(**json.loads(line)) for line in file if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def latest(self, url: str, before: float = None) -> Fetch or None:
+        """Return most recent archived fetch of a URL.
+
+        :param url: URL the feed was fetched from
+        :param before: only look at fetches before this time
+        :return: Fetch, or None if there isn't one
+        """
+        fetches = [
+            fetch
+            for fetch in self.fetches(url)
+            if before is None or fetch.fetched < before
+        ]
+        return fetches[-1] if fetches else None
+
+    def body(self, digest: str) -> bytes:
+        """Return archived body.
+
+        :param digest: `Fetch.sha256`
+        :return: raw response body
+        """
+        return gzip.decompress((self._blobs / f"{digest}.gz").read_bytes())
+
+    def parse(self, fetch: Fetch) -> fp.FeedParserDict:
+        """Parse archived body as `fetch_feed` parsed it when it was fetched.
+
+        :param fetch: Fetch
+        :return: FeedParserDict
+        """
+        feed = fp.parse(self.body(fetch.sha256), response_headers=fetch.headers)
+        feed["href"] = fetch.href
+        return feed
+
+    def usage(self) -> tp.Tuple[int, int]:
+        """Return number of stored bodies and their compressed size.
+
+        :return: tuple of number of blobs and bytes
+        """
+        sizes = [entry.stat().st_size for entry in os.scandir(self._blobs)]
+        return len(sizes), sum(sizes)
+
+    def _index(self, url: str) -> pathlib.Path:
+        """Return file listing fetches of url."""
+        return self._fetches / f"{sha256(url.encode()).hexdigest()}.jsonl"
+
+
+def replay(
+    database: str = Config.database,
+    archive: FeedArchive = None,
+    podcast: str = "",
+    before: float = None,
+) -> tp.List[Replay]:
+    """Refresh subscriptions against archived feeds, rather than the network.
+
+    Runs the same parsing and diffing against the database as `podd dl`, but
+    nothing is downloaded or saved, so it can be repeated, e.g., to time it or
+    to check changes to how feeds are parsed.
+    :param database: database holding the subscriptions
+    :param archive: FeedArchive, by default the one in `Config.feed_archive_directory`
+    :param podcast: only replay podcasts whose name contains this
+    :param before: replay the last fetch before this time, by default the latest
+    :return: list of Replays, in the order of subscriptions
+    """
+    archive = archive or FeedArchive()
+    with Database(database) as _db:
+        subscriptions = _db.get_podcasts()
+        budget = _db.get_backlog_budget()
+    results = []
+    for name, url, directory in subscriptions:
+        if podcast.lower() not in name.lower():
+            continue
+        fetch = archive.latest(url, before)
+        if fetch is None:
+            results.append(Replay(name, url, None, 0, 0.0, 0.0))
+            continue
+        start = time.perf_counter()
+        feed = archive.parse(fetch)
+        parsed = time.perf_counter()
+        with Podcast(url, directory, budget, database, feed, read_only=True) as pod:
+            episodes = len(pod.episodes)
+        results.append(
+            Replay(
+                name,
+                url,
+                fetch.fetched,
+                episodes,
+                parsed - start,
+                time.perf_counter() - parsed,
+            )
+        )
+    return results
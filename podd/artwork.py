@@ -0,0 +1,162 @@
+"""Implement on-disk podcast artwork cache."""
+
+from hashlib import sha256
+from io import BytesIO
+import json
+import os
+import pathlib
+from threading import Lock, get_ident
+
+from requests import get
+from requests.exceptions import RequestException
+
+from podd.logger import logger
+from podd.settings import Config
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, without it artwork is embedded as is
+    Image = None
+
+# Artwork larger than this many pixels on either side is scaled down
+ARTWORK_SIZE = 600
+
+
+class ArtworkCache:
+    """Content-addressed cache of podcast artwork.
+
+    Images are stored in `blobs/`, named after the hash of their content, so
+    podcasts sharing artwork share a file.  `urls/` maps the hash of each image
+    URL to its blob and ETag, which is used to revalidate the image once per
+    process.  Blobs are touched whenever they're used, and the least recently
+    used ones are evicted once the cache grows past `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        directory: pathlib.Path = Config.artwork_directory,
+        max_bytes: int = Config.artwork_cache_size,
+    ):
+        """Init method.
+
+        :param directory: cache directory
+        :param max_bytes: max total size of cached images
+        """
+        self._blobs = pathlib.Path(directory) / "blobs"
+        self._urls = pathlib.Path(directory) / "urls"
+        self._blobs.mkdir(parents=True, exist_ok=True)
+        self._urls.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._logger = logger(f"{self.__class__.__name__}")
+        self._lock = Lock()
+        self._locks = {}
+        self._paths = {}
+
+    def __repr__(self):
+        """`repr` method."""
+        return f"{self.__class__.__name__}({self._blobs.parent}, {self._max_bytes})"
+
+    def path(self, url: str) -> str or None:
+        """Return location of cached artwork, fetching it if needed.
+
+        Each URL is fetched or revalidated at most once per cache instance, no
+        matter how many threads ask for it.
+        :param url: image URL
+        :return: path to image file, or None if there's no usable image
+        """
+        if not url:
+            return None
+        with self._lock:
+            lock = self._locks.setdefault(url, Lock())
+        with lock:
+            path = self._paths.get(url)
+            if url not in self._paths or (path and not os.path.exists(path)):
+                path = self._paths[url] = self._fetch(url)
+        if path:
+            try:
+                os.utime(path)
+            except FileNotFoundError:  # Evicted in the meantime
+                return None
+        return path
+
+    def _fetch(self, url: str) -> str or None:
+        """Fetch or revalidate artwork.
+
+        Falls back to a stale copy if the server can't be reached.
+        """
+        entry_file = self._urls / f"{sha256(url.encode()).hexdigest()}.json"
+        try:
+            entry = json.loads(entry_file.read_text())
+            if not (self._blobs / entry["blob"]).exists():
+                entry = {}
+        except FileNotFoundError:
+            entry = {}
+        except (OSError, ValueError, KeyError, TypeError):  # e.g., interrupted write
+            self._logger.warning(f"Ignoring unreadable cache entry {entry_file}")
+            entry = {}
+        headers = {"If-None-Match": entry["etag"]} if entry.get("etag") else {}
+        try:
+            resp = get(url, headers=headers, timeout=30)
+        except RequestException:
+            self._logger.exception(f"Unable to fetch artwork {url}")
+            return str(self._blobs / entry["blob"]) if entry else None
+        if resp.status_code == 304 and entry:
+            return str(self._blobs / entry["blob"])
+        if not resp.ok:
+            self._logger.warning(f"Unable to fetch artwork {url}: {resp.status_code}")
+            return str(self._blobs / entry["blob"]) if entry else None
+        data = self._resize(resp.content)
+        blob = sha256(data).hexdigest()
+        if not (self._blobs / blob).exists():
+            self._write(self._blobs / blob, data)
+        entry = {"url": url, "etag": resp.headers.get("ETag"), "blob": blob}
+        self._write(entry_file, json.dumps(entry).encode())
+        self._logger.info(f"Cached artwork {url}")
+        self.evict()
+        return str(self._blobs / blob)
+
+    @staticmethod
+    def _write(path: pathlib.Path, data: bytes) -> None:
+        """Write file atomically, so an interrupted write leaves no partial file."""
+        temp = path.with_name(f".{path.name}.{os.getpid()}.{get_ident()}.tmp")
+        temp.write_bytes(data)
+        os.replace(temp, path)
+
+    def _resize(self, data: bytes) -> bytes:
+        """Scale artwork down to `ARTWORK_SIZE`, if Pillow is installed."""
+        if Image is None:
+            return data
+        try:
+            image = Image.open(BytesIO(data))
+            if max(image.size) <= ARTWORK_SIZE:
+                return data
+            image.thumbnail((ARTWORK_SIZE, ARTWORK_SIZE))
+            resized = BytesIO()
+            image.convert("RGB").save(resized, format="JPEG", quality=90)
+            return resized.getvalue()
+        except (OSError, ValueError):
+            self._logger.exception("Unable to resize artwork")
+            return data
+
+    def evict(self) -> None:
+        """Remove least recently used images until cache fits in `max_bytes`."""
+        blobs = []
+        for entry in os.scandir(self._blobs):
+            if entry.name.startswith("."):
+                continue  # Being written, see `_write`
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # Evicted by another process
+            blobs.append((stat.st_mtime, stat.st_size, entry.path))
+        blobs.sort()
+        total = sum(size for _, size, _ in blobs)
+        for _, size, path in blobs:
+            if total <= self._max_bytes:
+                break
+            total -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self._logger.info(f"Evicted artwork {path}")
@@ -1,10 +1,24 @@
 """Implement CLI."""
 
+from calendar import timegm
+import csv
+import json
+import pathlib
+import time
+
 import click
 
 from podd.settings import Config
-from podd.database import Feed, Options
-from podd.downloader import downloader
+from podd.archive import FeedArchive, replay as replay_feeds
+from podd.database import FEED_STATS_ORDER, Feed, Options, Subscription
+from podd.downloader import downloader, worker as run_worker
+from podd.opml import read_feed_list, write_opml
+from podd.reconcile import Reconciler
+from podd.retention import Retention
+from podd.scheduling import POLICIES
+from podd.storage import PLACEMENT_POLICIES, free_space
+from podd.utilities import create_database, upgrade_database
+from podd.verify import Verifier
 
 
 @click.command()
@@ -20,8 +34,13 @@ from podd.downloader import downloader
     default=False,
     help="Specify that the input is a file of RSS feed URLs.",
 )
+@click.option(
+    "--root",
+    default=None,
+    help="Download root to store podcast in, rather than the placement policy's.",
+)
 @click.argument("feed")
-def add(feed: str, catalog: bool, file: bool):
+def add(feed: str, catalog: bool, file: bool, root: str):
     """Add podcast subscription using supplied RSS feed URL.
 
     If the --catalog flag is set, then all available episodes will be downloaded,
@@ -29,55 +48,508 @@ def add(feed: str, catalog: bool, file: bool):
     episode to be downloaded.
 
     If the --file flag is set, then you can supply a filename as the `feed` argument
-    to be able to add multiple podcasts at once.  Simply put each RSS feed URL on its
-    own line and Podd will attempt to add each URL.
+    to be able to add multiple podcasts at once.  Either put each RSS feed URL on its
+    own line or supply an OPML file exported from another podcatcher, and Podd will
+    attempt to add each URL.  Feeds are fetched in parallel.
+
+    If there are several download roots, see `podd root`, each podcast is placed
+    in one of them by the placement policy, unless --root is set.
 
     """
     if file:
-        with open(feed) as file:
-            urls = [l.strip() for l in file if l.strip()]
-        with Feed() as podcast:
-            for url in urls:
-                podcast.add(url, newest_only=not catalog)
+        with Feed(profile_database()) as podcast:
+            podcast.add_many(read_feed_list(feed), newest_only=not catalog, root=root)
     else:
-        Feed().add(feed, newest_only=not catalog)
+        Feed(profile_database()).add(feed, newest_only=not catalog, root=root)
+
+
+@click.command()
+@click.argument("state", required=False, type=click.Choice(["on", "off"]))
+def archive(state: str):
+    """Archive feeds fetched by `podd dl`, for `podd replay`.
+
+    Each distinct feed body is stored once, gzipped, in the cache directory,
+    along with the response headers of every fetch.  Without STATE, prints
+    whether archiving is on and how big the archive is.
+    """
+    with Options(profile_database()) as options:
+        if state:
+            return options.set_archive_option(state == "on")
+        enabled = options.get_archive()
+    blobs, size = FeedArchive().usage()
+    click.echo(f"Feed archive is {'on' if enabled else 'off'}")
+    click.echo(f"{blobs} feed bodies, {size} bytes")
+
+
+@click.command()
+@click.option(
+    "--episodes",
+    type=int,
+    default=0,
+    help="Max back catalog episodes per podcast per run, 0 for unlimited.",
+)
+@click.option(
+    "--size",
+    default="0",
+    help="Max back catalog bytes per podcast per run, e.g., `500M`, 0 for unlimited.",
+)
+def backlog(episodes: int, size: str):
+    """Limit back catalog downloads per run.
+
+    Podcasts added with --catalog have their back catalog downloaded a little
+    at a time, newest first, after every podcast's new episodes.
+    """
+    Options(profile_database()).set_backlog_option(episodes, size)
 
 
 @click.command()
 @click.argument("directory")
 def dir(directory: str):
     """Set download directory."""
-    Options().set_directory_option(directory)
+    Options(profile_database()).set_directory_option(directory)
 
 
 @click.command()
-def dl():
-    """Download all new episodes."""
-    downloader()
+@click.option(
+    "--order",
+    type=click.Choice(list(POLICIES)),
+    default="feed",
+    help="Order in which new episodes are downloaded.",
+)
+@click.option(
+    "--inline-tags",
+    is_flag=True,
+    default=False,
+    help="Tag mp3 files while downloading, rather than rewriting them afterwards.",
+)
+@click.option(
+    "--enqueue",
+    is_flag=True,
+    default=False,
+    help="Only queue new episodes, for `podd worker` processes to download.",
+)
+@click.option(
+    "--all-profiles",
+    is_flag=True,
+    default=False,
+    help="Download new episodes of the default profile and every other profile.",
+)
+def dl(order: str, inline_tags: bool, enqueue: bool, all_profiles: bool):
+    """Download all new episodes.
+
+    --order newest downloads the most recently published episodes first,
+    --order smallest downloads the smallest files first and --order round-robin
+    takes one episode from each podcast in turn.
+
+    --inline-tags writes mp3 tags in front of the audio as it's downloaded, so
+    each file is written to disk only once.
+
+    --enqueue refreshes subscriptions and adds new episodes to the job queue,
+    in download order, without downloading them.  See `podd worker`.
+
+    --all-profiles processes every profile in one run, see `podd profile`.
+    Feeds shared by several profiles are only fetched once, and downloads share
+    one set of workers and the default profile's bandwidth limit.
+    """
+    databases = [profile_database()]
+    if all_profiles:
+        with Options() as options:
+            databases = [Config.database] + [db for _, db in options.get_profiles()]
+        for database in databases[1:]:
+            upgrade_database(database)
+    downloader(
+        order=order, inline_tags=inline_tags, enqueue=enqueue, databases=databases
+    )
 
 
 @click.command()
 def email():
     """Setup email notifications."""
-    Options().email_notification_setup()
+    Options(profile_database()).email_notification_setup()
+
+
+@click.command()
+@click.option(
+    "--schedule",
+    default="",
+    help="Time-of-day overrides, e.g., `09:00-17:00=250k,22:00-06:00=0`.",
+)
+@click.argument("rate")
+def limit(rate: str, schedule: str):
+    """Limit total download bandwidth.
+
+    RATE is in bytes per second and may be suffixed with k, m or g, e.g., `500k`.
+    Use 0 to remove the limit.  The limit is shared by all download workers.
+    """
+    Options(profile_database()).set_bandwidth_option(rate, schedule)
 
 
 @click.command()
-def ls():
-    """Print current subscriptions."""
-    Feed().print_subscriptions()
+@click.argument("filename")
+def export(filename: str):
+    """Export subscriptions to an OPML file."""
+    with Feed(profile_database()) as podcast:
+        podcasts = podcast.get_podcasts()
+    write_opml(podcasts, filename)
+    click.echo(f"Exported {len(podcasts)} subscriptions to {filename}")
+
+
+@click.command()
+@click.option(
+    "--stats",
+    is_flag=True,
+    default=False,
+    help="Print episode counts, dates and bytes on disk of each podcast.",
+)
+@click.option(
+    "--format",
+    "output",
+    type=click.Choice(["text", "json", "csv"]),
+    default="text",
+    help="Output format of --stats.",
+)
+def ls(stats: bool, output: str):
+    """Print current subscriptions.
+
+    --stats prints how many episodes of each podcast are known and kept on
+    disk, how many bytes they take and when the latest was published and
+    downloaded, as recorded in the database.  Nothing is fetched and no
+    directory is read, so it's cheap enough to poll, e.g., with --format json.
+    Timestamps are UTC.
+    """
+    if not stats:
+        return Feed(profile_database()).print_subscriptions()
+    with Feed(profile_database()) as podcasts:
+        subscriptions = podcasts.get_subscription_stats()
+    if output == "json":
+        return click.echo(json.dumps([sub._asdict() for sub in subscriptions]))
+    if output == "csv":
+        stream = click.get_text_stream("stdout")
+        writer = csv.writer(stream, lineterminator="\n")
+        writer.writerow(Subscription._fields)
+        writer.writerows(subscriptions)
+        return
+    for sub in subscriptions:
+        click.echo(
+            f"{sub.name}: {sub.episodes} episodes, {sub.on_disk} on disk, "
+            f"{sub.bytes_on_disk} bytes, last published "
+            f"{sub.last_published or 'never'}, last downloaded "
+            f"{sub.last_downloaded or 'never'}"
+        )
 
 
 @click.command()
 def opt():
     """Print currently set options."""
-    Options().print_options()
+    Options(profile_database()).print_options()
+
+
+@click.command()
+@click.option(
+    "--dry-run", is_flag=True, default=False, help="Only report what would be fixed."
+)
+@click.option(
+    "--offline",
+    is_flag=True,
+    default=False,
+    help="Don't fetch feeds, only check files that are already recorded.",
+)
+@click.option(
+    "--redownload",
+    is_flag=True,
+    default=False,
+    help="Download episodes whose files are missing again.",
+)
+@click.option(
+    "--delete-truncated",
+    is_flag=True,
+    default=False,
+    help="Delete truncated files, rather than leaving them until they're replaced.",
+)
+def reconcile(dry_run: bool, offline: bool, redownload: bool, delete_truncated: bool):
+    """Fix database after files were lost or downloads were interrupted.
+
+    Recorded files that are gone are marked as such, and files matching a feed
+    entry that were never recorded are recorded.  Files smaller than when they
+    were recorded are listed and forgotten, so they're downloaded again.  They're
+    kept until the download overwrites them, unless --delete-truncated is
+    passed.  Audio files that don't match anything are listed, but left alone.
+    """
+    report = Reconciler(
+        feeds=not offline,
+        redownload=redownload,
+        delete=delete_truncated,
+        db_file=profile_database(),
+    ).run(dry_run)
+    for location in report.truncated:
+        click.echo(f"Truncated file: {location}")
+    for location in report.unknown:
+        click.echo(f"Unknown file: {location}")
+    for directory in report.unavailable:
+        click.echo(f"Unable to read {directory}")
+    prefix = "Would have " if dry_run else ""
+    click.echo(
+        f"{prefix}recorded {len(report.recorded)} and backfilled "
+        f"{len(report.backfilled)} files, {len(report.missing)} missing, "
+        f"{len(report.truncated)} truncated, {len(report.unknown)} unknown."
+    )
+
+
+@click.command()
+@click.option("--podcast", default="", help="Only replay podcasts matching this name.")
+@click.option(
+    "--before", default="", help="Replay the last fetch before, e.g., 2019-06-01."
+)
+@click.option(
+    "--repeat", type=int, default=1, help="Replay this many times, keep the fastest."
+)
+def replay(podcast: str, before: str, repeat: int):
+    """Refresh subscriptions against archived feeds, without the network.
+
+    Feeds are parsed and compared with the database as `podd dl` would, but
+    nothing is downloaded or saved.  Prints how many new episodes each podcast
+    has, and how long parsing and comparing took, see `podd archive`.
+    """
+    try:
+        cutoff = timegm(time.strptime(before, "%Y-%m-%d")) if before else None
+    except ValueError:
+        raise click.BadParameter(f"Invalid date {before}", param_hint="--before")
+    runs = [
+        replay_feeds(profile_database(), podcast=podcast, before=cutoff)
+        for _ in range(max(repeat, 1))
+    ]
+    parse_total = diff_total = 0
+    for results in zip(*runs):
+        name, _, fetched, episodes, _, _ = results[0]
+        if fetched is None:
+            click.echo(f"{name}: not archived")
+            continue
+        parse = min(result.parse_seconds for result in results)
+        diff = min(result.diff_seconds for result in results)
+        parse_total, diff_total = parse_total + parse, diff_total + diff
+        click.echo(
+            f"{name}: {episodes} new episodes, fetched "
+            f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(fetched))}, "
+            f"parsed in {parse * 1000:.1f} ms, compared in {diff * 1000:.1f} ms"
+        )
+    click.echo(
+        f"Replayed {len(runs[0])} podcasts, parsing took {parse_total:.3f} s, "
+        f"comparing {diff_total:.3f} s"
+    )
+
+
+@click.command()
+@click.option(
+    "--episodes", type=int, help="Max episodes kept per podcast, 0 for unlimited."
+)
+@click.option(
+    "--days", type=int, help="Max age in days of kept episodes, 0 for unlimited."
+)
+@click.option("--size", help="Max bytes kept per podcast, e.g., `2G`, 0 for unlimited.")
+@click.option("--quota", help="Max bytes kept in total, e.g., `100G`, 0 for unlimited.")
+@click.option("--podcast", default="", help="Only change podcast matching this name.")
+@click.option(
+    "--inherit",
+    is_flag=True,
+    default=False,
+    help="Make --podcast follow the global policy again.",
+)
+@click.option(
+    "--prune", is_flag=True, default=False, help="Delete old episodes right away."
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    default=False,
+    help="With --prune, only list episodes that would be deleted.",
+)
+def retain(
+    episodes: int,
+    days: int,
+    size: str,
+    quota: str,
+    podcast: str,
+    inherit: bool,
+    prune: bool,
+    dry_run: bool,
+):
+    """Limit how many downloaded episodes are kept.
+
+    Old episodes are deleted after each download run, their records are kept,
+    so they aren't downloaded again.  Options that aren't given are unchanged.
+    Each podcast always keeps at least its newest episode, the --quota may
+    delete any episode, oldest first.
+    """
+    changes = (episodes, days, size, quota)
+    if any(change is not None for change in changes) or inherit:
+        if not Options(profile_database()).set_retention_option(
+            episodes, days, size, quota, podcast, inherit
+        ):
+            return
+    if prune:
+        evicted = Retention(profile_database()).run(dry_run)
+        for eviction in evicted:
+            click.echo(f"{'Would delete' if dry_run else 'Deleted'} {eviction.path}")
+        click.echo(
+            f"{len(evicted)} episodes, {sum(e.size or 0 for e in evicted)} bytes"
+        )
+
+
+@click.command()
+@click.option(
+    "--remove",
+    is_flag=True,
+    default=False,
+    help="Remove DIRECTORY from download roots.",
+)
+@click.option(
+    "--policy",
+    type=click.Choice(list(PLACEMENT_POLICIES)),
+    help="How new podcasts are placed in download roots.",
+)
+@click.argument("directory", required=False)
+def root(directory: str, remove: bool, policy: str):
+    """Manage download roots, e.g., one on each disk.
+
+    New podcasts are placed in the root with the most free space, or in each
+    root in turn with --policy round-robin.  Downloads to different roots are
+    interleaved, so concurrent downloads are spread over disks.  Without
+    arguments, lists download roots, the first being the download directory.
+    """
+    with Options(profile_database()) as options:
+        if directory:
+            options.set_root_option(directory, remove)
+        if policy:
+            options.set_placement_option(policy)
+        if not directory and not policy:
+            for location in options.get_roots():
+                free = free_space(location)
+                click.echo(f"{location} ({free if free >= 0 else '?'} bytes free)")
+
+
+@click.command()
+@click.option(
+    "--remove",
+    is_flag=True,
+    default=False,
+    help="Forget profile NAME, its database and downloads are kept.",
+)
+@click.option(
+    "--database",
+    "database_file",
+    default=None,
+    help="Database file of the profile, by default NAME.db next to the default one.",
+)
+@click.argument("name", required=False)
+@click.argument("directory", required=False)
+def profile(name: str, directory: str, remove: bool, database_file: str):
+    """Manage profiles, each with its own database and download directory.
+
+    Each profile has its own subscriptions and settings.  Other commands use a
+    profile with `podd --profile NAME`, and `podd dl --all-profiles` processes
+    every profile in one run.  A new database is created for the profile, with
+    DIRECTORY as its download directory, unless --database points to an
+    existing one.  Without arguments, lists profiles.
+    """
+    with Options() as options:
+        if not name:
+            click.echo(f"(default): {Config.database}")
+            for profile_name, location in options.get_profiles():
+                click.echo(f"{profile_name}: {location}")
+            return
+        if remove:
+            options.set_profile_option(name, remove=True)
+            return
+    location = pathlib.Path(
+        database_file or pathlib.Path(Config.database).parent / f"{name}.db"
+    ).absolute()
+    if not location.exists() and not directory:
+        raise click.UsageError("DIRECTORY is required to create a new profile.")
+    with Options() as options:
+        if not options.set_profile_option(name, str(location)):
+            return
+    if location.exists():
+        upgrade_database(str(location))
+        if directory:
+            Options(str(location)).set_directory_option(directory)
+    else:
+        pathlib.Path(directory).mkdir(parents=True, exist_ok=True)
+        create_database(str(location), pathlib.Path(directory))
 
 
 @click.command()
 def rm():
     """Interactive subscription deletion menu."""
-    Feed().remove()
+    Feed(profile_database()).remove()
+
+
+@click.command()
+@click.option("--podcast", default="", help="Only search podcasts matching this name.")
+@click.option(
+    "--since", default="", help="Only list episodes downloaded since, e.g., 2019-06-01."
+)
+@click.option("--limit", type=int, default=20, help="Max number of results.")
+@click.argument("query", required=False, default="")
+def search(query: str, podcast: str, since: str, limit: int):
+    """Search episode titles and summaries.
+
+    Without a QUERY, lists downloaded episodes, most recent first.  Only the
+    local database is searched, feeds aren't fetched.
+    """
+    with Feed(profile_database()) as podcasts:
+        results = podcasts.search(query, podcast, since, limit)
+    if not results:
+        return click.echo("No episodes found.")
+    for name, title, published, downloaded, path in results:
+        click.echo(f"{(published or '')[:10]:10} {name} - {title}")
+        if downloaded:
+            click.echo(f"{'':10} Downloaded {downloaded} to {path}")
+
+
+@click.command()
+@click.option(
+    "--sort",
+    type=click.Choice(sorted(FEED_STATS_ORDER)),
+    default="time",
+    help="Report podcasts slowest, largest or failing most first.",
+)
+@click.option("--limit", type=int, default=10, help="Max number of podcasts.")
+@click.option(
+    "--history", is_flag=True, default=False, help="List individual refreshes."
+)
+@click.argument("podcast", required=False, default="")
+def stats(podcast: str, sort: str, limit: int, history: bool):
+    """Report which subscriptions make refreshing slow.
+
+    Every `podd dl` records how large each feed was, how long fetching and
+    parsing it took, how many entries it had and whether it failed, keeping
+    the latest 100 refreshes of each podcast.  Lists the averages of the worst
+    podcasts, with the average of their latest refreshes to show trends.  With
+    --history, lists refreshes of podcasts matching PODCAST instead.
+    """
+    with Feed(profile_database()) as podcasts:
+        if history:
+            rows = podcasts.get_feed_history(podcast, limit)
+        else:
+            rows = podcasts.get_feed_report(sort, podcast, limit)
+    if not rows:
+        return click.echo("No refreshes recorded, see `podd dl`.")
+    if history:
+        for name, fetched, size, fetch, parse, entries, failed in rows:
+            if failed:
+                click.echo(f"{fetched} {name}: failed after {fetch:.2f} s")
+                continue
+            click.echo(
+                f"{fetched} {name}: {size / 1024:.0f} KiB, fetched in {fetch:.2f} s, "
+                f"parsed in {parse:.2f} s, {entries} entries"
+            )
+        return
+    for name, runs, size, fetch, parse, entries, failures, total, recent in rows:
+        click.echo(
+            f"{name}: {total:.2f} s ({fetch:.2f} s fetch, {parse:.2f} s parse), "
+            f"latest {recent:.2f} s, {size / 1024:.0f} KiB, {entries:.0f} entries, "
+            f"{failures:.0%} of {runs} refreshes failed"
+        )
 
 
 @click.command()
@@ -86,17 +558,109 @@ def v():
     click.echo(Config.version)
 
 
+@click.command()
+@click.option(
+    "--hash",
+    "hashes",
+    is_flag=True,
+    default=False,
+    help="Hash files, and compare them with hashes stored by earlier runs.",
+)
+@click.option("--dry-run", is_flag=True, default=False, help="Only report bad files.")
+@click.option(
+    "--processes", type=int, default=None, help="Files checked at once, one per core."
+)
+def verify(hashes: bool, dry_run: bool, processes: int):
+    """Find truncated or corrupt episodes, and queue them for download.
+
+    Every recorded file is checked against its size when it was downloaded, and
+    its audio headers are parsed.  Files smaller than their feed advertises are
+    listed, but left alone.  With `--hash`, files are hashed as well, a file whose
+    hash differs from the one stored by an earlier `--hash` run has changed.  Bad
+    files are queued for `podd worker`, and kept until they've been replaced.
+    """
+    report = Verifier(hashes, processes, db_file=profile_database()).run(dry_run)
+    for verdict in report.short:
+        click.echo(f"Shorter than advertised: {verdict.filename}")
+    for verdict in report.bad:
+        click.echo(f"{verdict.problem.capitalize()} file: {verdict.filename}")
+    summary = (
+        f"Checked {report.checked} files, {len(report.bad)} bad, "
+        f"{len(report.short)} short"
+    )
+    if hashes:
+        summary += f", stored {report.hashed} new hashes"
+    if not dry_run and report.bad:
+        summary += f", queued {report.queued} for download, see `podd worker`"
+    click.echo(f"{summary}.")
+
+
+@click.command()
+@click.option("--threads", type=int, default=3, help="Episodes downloaded at once.")
+@click.option(
+    "--inline-tags",
+    is_flag=True,
+    default=False,
+    help="Tag mp3 files while downloading, rather than rewriting them afterwards.",
+)
+@click.option(
+    "--purge",
+    is_flag=True,
+    default=False,
+    help="Delete finished jobs once the queue is empty.",
+)
+def worker(threads: int, inline_tags: bool, purge: bool):
+    """Download episodes queued by `podd dl --enqueue`.
+
+    Several workers can run at once, e.g., one per core.  Jobs of a worker that
+    is stopped are picked up by others once their lease expires, nothing is
+    downloaded or recorded twice.  Exits once the queue is empty.
+    """
+    run_worker(
+        threads=threads,
+        inline_tags=inline_tags,
+        purge=purge,
+        database=profile_database(),
+    )
+
+
+def profile_database() -> str:
+    """Return database of the profile chosen with `podd --profile`."""
+    return click.get_current_context().obj or Config.database
+
+
 @click.group()
-def cli_group():
+@click.option("--profile", default=None, help="Profile to use, see `podd profile`.")
+@click.pass_context
+def cli_group(ctx: click.Context, profile: str):
     """Group cli commands"""
-    pass
+    if profile:
+        with Options() as options:
+            profiles = dict(options.get_profiles())
+        if profile not in profiles:
+            raise click.BadParameter(f"No profile {profile}", param_hint="--profile")
+        upgrade_database(profiles[profile])
+        ctx.obj = profiles[profile]
 
 
 cli_group.add_command(add)
+cli_group.add_command(archive)
+cli_group.add_command(backlog)
 cli_group.add_command(dir)
 cli_group.add_command(dl)
 cli_group.add_command(email)
+cli_group.add_command(export)
+cli_group.add_command(limit)
 cli_group.add_command(ls)
 cli_group.add_command(opt)
+cli_group.add_command(profile)
+cli_group.add_command(reconcile)
+cli_group.add_command(replay)
+cli_group.add_command(retain)
+cli_group.add_command(root)
 cli_group.add_command(rm)
+cli_group.add_command(search)
+cli_group.add_command(stats)
 cli_group.add_command(v)
+cli_group.add_command(verify)
+cli_group.add_command(worker)
@@ -1,17 +1,88 @@
 """Define the database API."""
 
 import getpass
+from multiprocessing.dummy import Pool as ThreadPool
 import pathlib
 import smtplib
 import sqlite3
 from types import TracebackType
+import typing as tp
 
 import feedparser as fp
 import keyring
 from keyring.errors import KeyringError
 
 from podd.settings import Config
+from podd.fetch import FeedStats, enclosure, fetch_feed, timestamp
 from podd.logger import logger
+from podd.ratelimit import parse_rate, parse_schedule
+from podd.storage import PLACEMENT_POLICIES, choose_root
+
+INSERT_EPISODE = (
+    "INSERT INTO episodes "
+    "(feed_id, podcast_id, title, summary, published, url, length, size, path, "
+    "downloaded, sha256) "
+    "SELECT :feed_id, id, :title, :summary, :published, :url, :length, :size, "
+    ":path, :downloaded, :sha256 FROM main.podcasts WHERE url = :podcast_url"
+)
+
+# Refreshes of each podcast kept in `feed_stats`, older ones are deleted
+FEED_STATS_HISTORY = 100
+# Refreshes averaged for the recent column of `get_feed_report`
+FEED_STATS_RECENT = 5
+# Orders of `get_feed_report`, worst first
+FEED_STATS_ORDER = {
+    "time": "avg(fetch_seconds + parse_seconds)",
+    "fetch": "avg(fetch_seconds)",
+    "parse": "avg(parse_seconds)",
+    "size": "avg(size)",
+    "failures": "avg(failed)",
+}
+
+
+class Subscription(tp.NamedTuple):
+    """Overview of a podcast, see `Database.get_subscription_stats`."""
+
+    name: str
+    url: str
+    directory: str
+    episodes: int  # Episodes recorded, downloaded or not
+    on_disk: int  # Episodes whose files are kept
+    bytes_on_disk: int
+    last_published: str or None  # UTC timestamps, see `timestamp`
+    last_downloaded: str or None
+
+
+class Addition(tp.NamedTuple):
+    """Outcome of adding a feed, see `Feed.add_many`."""
+
+    url: str
+    name: str or None
+    directory: str or None  # Download directory, if the podcast was added
+    status: str  # "added", "exists", "empty" or "invalid"
+
+
+def entry_record(podcast_url: str, entry: fp.FeedParserDict) -> dict:
+    """Return catalog metadata of a feed entry that wasn't downloaded.
+
+    :param podcast_url: RSS feed URL
+    :param entry: single FeedParserDict from fp.parse(url).entries list
+    :return: dict of parameters for `INSERT_EPISODE`
+    """
+    url, length = enclosure(entry)
+    return dict(
+        podcast_url=podcast_url,
+        feed_id=entry.id,
+        title=entry.get("title"),
+        summary=entry.get("summary"),
+        published=timestamp(entry.get("published_parsed")),
+        url=url,
+        length=length,
+        size=None,
+        path=None,
+        downloaded=None,
+        sha256=None,
+    )
 
 
 class Database:
@@ -79,6 +150,21 @@ class Database:
             " (SELECT id FROM podcasts p WHERE p.url = ?)",
             (url,),
         )
+        self.cursor.execute(
+            "DELETE FROM backlog WHERE podcast_id IN"
+            " (SELECT id FROM podcasts p WHERE p.url = ?)",
+            (url,),
+        )
+        self.cursor.execute(
+            "DELETE FROM jobs WHERE podcast_id IN"
+            " (SELECT id FROM podcasts p WHERE p.url = ?)",
+            (url,),
+        )
+        self.cursor.execute(
+            "DELETE FROM feed_stats WHERE podcast_id IN"
+            " (SELECT id FROM podcasts p WHERE p.url = ?)",
+            (url,),
+        )
         self.cursor.execute("DELETE FROM  podcasts WHERE url = ?", (url,))
         self._conn.commit()
 
@@ -90,20 +176,131 @@ class Database:
         self.cursor.execute("SELECT name, url, directory FROM main.podcasts")
         return self.cursor.fetchall()
 
-    def add_episode(self, podcast_url: str, feed_id: str) -> None:
+    def get_subscription_stats(self) -> tp.List[Subscription]:
+        """Return overview of every podcast, by name.
+
+        A single aggregate query over the `episodes_overview` covering index,
+        neither the filesystem nor feeds are touched.  Files whose size wasn't
+        recorded yet, see `Retention`, count as 0 bytes.
+        :return: list of Subscriptions
+        """
+        self.cursor.execute(
+            "SELECT p.name, p.url, p.directory, count(e.id), count(e.downloaded), "
+            "coalesce(sum(e.size), 0), max(e.published), max(e.downloaded) "
+            "FROM podcasts p LEFT JOIN episodes e ON e.podcast_id = p.id "
+            "GROUP BY p.id ORDER BY p.name"
+        )
+        return [Subscription(*row) for row in self.cursor.fetchall()]
+
+    def add_episode(
+        self,
+        podcast_url: str,
+        feed_id: str,
+        title: str = None,
+        summary: str = None,
+        published: str = None,
+        url: str = None,
+        length: int = None,
+        size: int = None,
+        path: str = None,
+        downloaded: str = None,
+        sha256: str = None,
+    ) -> None:
         """Save episode to database.
 
+        Everything but `podcast_url` and `feed_id` is catalog metadata, which is
+        used by `search`.  See `Episode.record`.
         :param podcast_url: RSS feed URL
         :param feed_id: id generated by rss feed for each episode
+        :param title: episode title
+        :param summary: episode summary
+        :param published: publication timestamp, `YYYY-MM-DD HH:MM:SS` UTC
+        :param url: audio file URL
+        :param length: audio file size advertised by the feed
+        :param size: bytes written to disk
+        :param path: downloaded file location
+        :param downloaded: download timestamp, `YYYY-MM-DD HH:MM:SS` UTC
+        :param sha256: hex digest of the audio file as served
         :return: None
         """
         self.cursor.execute(
-            "INSERT INTO episodes (feed_id, podcast_id) "
-            "SELECT ?, id FROM main.podcasts WHERE url = ?",
+            INSERT_EPISODE,
+            dict(
+                podcast_url=podcast_url,
+                feed_id=feed_id,
+                title=title,
+                summary=summary,
+                published=published,
+                url=url,
+                length=length,
+                size=size,
+                path=path,
+                downloaded=downloaded,
+                sha256=sha256,
+            ),
+        )
+        self.cursor.execute(
+            "DELETE FROM backlog WHERE feed_id = ? AND podcast_id IN"
+            " (SELECT id FROM podcasts p WHERE p.url = ?)",
             (feed_id, podcast_url),
         )
         self._conn.commit()
 
+    def add_episodes(self, podcast_url: str, entries: list) -> None:
+        """Save feed entries to database as already seen episodes.
+
+        :param podcast_url: RSS feed URL
+        :param entries: list of FeedParserDict entries
+        :return: None
+        """
+        self.cursor.executemany(
+            INSERT_EPISODE, (entry_record(podcast_url, e) for e in entries)
+        )
+        self._conn.commit()
+
+    def search(
+        self, query: str = "", podcast: str = "", since: str = "", limit: int = 20
+    ) -> list:
+        """Search episode catalog.
+
+        Searching is done by sqlite's full-text index, nothing is fetched.
+        :param query: words to look for in titles and summaries, if empty, only
+        downloaded episodes are listed, newest download first
+        :param podcast: only search podcasts whose name contains this
+        :param since: only list episodes downloaded on or after this date
+        :param limit: max number of results
+        :return: list of tuples of podcast name, title, published timestamp,
+        download timestamp and file location
+        """
+        conditions, params = [], []
+        if query:
+            source = (
+                "episodes_fts f JOIN episodes e ON e.id = f.rowid "
+                "JOIN podcasts p ON p.id = e.podcast_id"
+            )
+            conditions.append("episodes_fts MATCH ?")
+            # Quote every word so that user input is never read as FTS5 syntax
+            params.append(
+                " ".join('"' + w.replace('"', '""') + '"' for w in query.split())
+            )
+            order = "f.rank"
+        else:
+            source = "episodes e JOIN podcasts p ON p.id = e.podcast_id"
+            conditions.append("e.downloaded IS NOT NULL")
+            order = "e.downloaded DESC"
+        if podcast:
+            conditions.append("p.name LIKE ?")
+            params.append(f"%{podcast}%")
+        if since:
+            conditions.append("e.downloaded >= ?")
+            params.append(since)
+        self.cursor.execute(
+            f"SELECT p.name, e.title, e.published, e.downloaded, e.path FROM {source} "
+            f"WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT ?",
+            (*params, limit),
+        )
+        return self.cursor.fetchall()
+
     def get_episodes(self, url: str) -> set:
         """Return episodes from a single podcast.
 
@@ -117,6 +314,428 @@ class Database:
         )
         return {item[0] for item in self.cursor.fetchall()}
 
+    def known_episodes(self, url: str, feed_ids: list) -> set:
+        """Return which feed ids of a podcast are recorded.
+
+        :param url: rss feed url
+        :param feed_ids: list of feed ids
+        :return: set of recorded feed ids
+        """
+        known = set()
+        for i in range(0, len(feed_ids), 500):
+            chunk = feed_ids[i : i + 500]
+            self.cursor.execute(
+                "SELECT feed_id FROM episodes "
+                "JOIN podcasts p ON episodes.podcast_id = p.id AND p.url = ? "
+                f"WHERE feed_id IN ({','.join('?' * len(chunk))})",
+                (url, *chunk),
+            )
+            known.update(row[0] for row in self.cursor.fetchall())
+        return known
+
+    def get_episode_ids(self, url: str, after: int = 0) -> list:
+        """Return episodes of a podcast recorded after a given episode.
+
+        :param url: rss feed url
+        :param after: episode id, only episodes with greater ids are returned
+        :return: list of tuples of episode id and feed id, by id
+        """
+        self.cursor.execute(
+            "SELECT episodes.id, feed_id FROM episodes "
+            "JOIN podcasts p ON episodes.podcast_id = p.id AND p.url = ? "
+            "WHERE episodes.id > ? ORDER BY episodes.id",
+            (url, after),
+        )
+        return self.cursor.fetchall()
+
+    def get_seen_token(self, create: bool = True) -> str or None:
+        """Return token identifying the recorded feed ids, see `SeenIds`.
+
+        The token is cleared whenever episodes are deleted, a new one is made here.
+        :param create: make a new token if there is none
+        :return: 16 hex digits, or None if there is no token and `create` isn't set
+        """
+        if create:
+            self.cursor.execute(
+                "UPDATE settings SET seen_token = lower(hex(randomblob(8))) "
+                "WHERE id = 1 AND seen_token IS NULL"
+            )
+            if self.cursor.rowcount:
+                self._conn.commit()
+        self.cursor.execute("SELECT seen_token FROM settings WHERE id = 1")
+        return self.cursor.fetchone()[0]
+
+    def get_files(self, urls: list) -> dict:
+        """Return previously downloaded files of audio file URLs.
+
+        Used to avoid fetching the same file twice, e.g., when a show is
+        cross-posted to several feeds or a feed regenerates its ids.
+        :param urls: audio file URLs
+        :return: dict of URL to tuple of file location and hex digest
+        """
+        files, urls = {}, list(set(urls))
+        for i in range(0, len(urls), 500):
+            chunk = urls[i : i + 500]
+            self.cursor.execute(
+                "SELECT url, path, sha256 FROM episodes WHERE path IS NOT NULL "
+                f"AND sha256 IS NOT NULL AND url IN ({','.join('?' * len(chunk))}) "
+                "ORDER BY downloaded DESC",
+                chunk,
+            )
+            for url, location, digest in self.cursor.fetchall():
+                files.setdefault(url, (location, digest))  # Newest download
+        return files
+
+    def get_file_by_hash(self, sha256: str, exclude: str = None) -> str or None:
+        """Return location of a previously downloaded file with given content.
+
+        :param sha256: hex digest of the audio file as served
+        :param exclude: file location to ignore, i.e., the file being checked
+        :return: location of an existing file, or None if content isn't known
+        """
+        self.cursor.execute(
+            "SELECT path FROM episodes WHERE sha256 = ? AND path IS NOT NULL "
+            "AND path IS NOT ? ORDER BY downloaded DESC",
+            (sha256, exclude),
+        )
+        paths = (row[0] for row in self.cursor.fetchall())
+        return next((path for path in paths if pathlib.Path(path).exists()), None)
+
+    def get_episode_files(self) -> list:
+        """Return every episode's file location.
+
+        :return: list of tuples of episode id, podcast RSS feed url, feed id, file
+        location and size, location and size are None if nothing was downloaded
+        """
+        self.cursor.execute(
+            "SELECT e.id, p.url, e.feed_id, e.path, e.size FROM episodes e "
+            "JOIN podcasts p ON e.podcast_id = p.id"
+        )
+        return self.cursor.fetchall()
+
+    def add_episode_records(self, records: list) -> None:
+        """Save several episodes in a single transaction.
+
+        :param records: list of dicts of parameters for `INSERT_EPISODE`, see
+        `Episode.record`
+        :return: None
+        """
+        self.cursor.executemany(INSERT_EPISODE, records)
+        self.cursor.executemany(
+            "DELETE FROM backlog WHERE feed_id = :feed_id AND podcast_id IN"
+            " (SELECT id FROM podcasts p WHERE p.url = :podcast_url)",
+            records,
+        )
+        self._conn.commit()
+
+    def set_episode_files(self, files: list) -> None:
+        """Update file locations of several episodes in a single transaction.
+
+        Catalog metadata that's missing, e.g., from episodes saved by older
+        versions, is filled in as well.
+        :param files: list of dicts of episode `id`, `path`, `size`, `downloaded`
+        and the other parameters of `INSERT_EPISODE`, which may be None
+        :return: None
+        """
+        self.cursor.executemany(
+            "UPDATE episodes SET path = :path, size = :size, downloaded = :downloaded, "
+            "title = COALESCE(title, :title), summary = COALESCE(summary, :summary), "
+            "published = COALESCE(published, :published), url = COALESCE(url, :url), "
+            "length = COALESCE(length, :length), sha256 = :sha256, "
+            "file_sha256 = NULL WHERE id = :id",
+            files,
+        )
+        self._conn.commit()
+
+    def clear_episode_files(self, ids: list) -> None:
+        """Mark several episodes' files as deleted in a single transaction.
+
+        The episodes themselves are kept, so they aren't downloaded again.
+        :param ids: episode ids
+        :return: None
+        """
+        self.cursor.executemany(
+            "UPDATE episodes SET path = NULL, size = NULL, downloaded = NULL, "
+            "sha256 = NULL, file_sha256 = NULL WHERE id = ?",
+            ((i,) for i in ids),
+        )
+        self._conn.commit()
+
+    def set_episode_sizes(self, sizes: list) -> None:
+        """Save sizes of files recorded without one.
+
+        :param sizes: list of tuples of size and episode id
+        :return: None
+        """
+        self.cursor.executemany("UPDATE episodes SET size = ? WHERE id = ?", sizes)
+        self._conn.commit()
+
+    def get_files_on_disk(self) -> list:
+        """Return downloaded files that haven't been deleted, newest first.
+
+        :return: list of tuples of episode id, podcast RSS feed url, file location,
+        size and download timestamp
+        """
+        self.cursor.execute(
+            "SELECT e.id, p.url, e.path, e.size, e.downloaded FROM episodes e "
+            "JOIN podcasts p ON e.podcast_id = p.id WHERE e.path IS NOT NULL "
+            "ORDER BY e.podcast_id, e.downloaded DESC, e.id DESC"
+        )
+        return self.cursor.fetchall()
+
+    def get_episode_checks(self) -> list:
+        """Return what's known about each downloaded file, to verify it.
+
+        :return: list of tuples of episode id, file location, length advertised by
+        the feed, size when recorded and hash stored by `set_file_hashes`
+        """
+        self.cursor.execute(
+            "SELECT id, path, length, size, file_sha256 FROM episodes "
+            "WHERE path IS NOT NULL ORDER BY path"
+        )
+        return self.cursor.fetchall()
+
+    def set_file_hashes(self, hashes: list) -> None:
+        """Save hashes of files as they are on disk, i.e., after tagging.
+
+        :param hashes: list of tuples of hex digest and episode id
+        :return: None
+        """
+        self.cursor.executemany(
+            "UPDATE episodes SET file_sha256 = ? WHERE id = ?", hashes
+        )
+        self._conn.commit()
+
+    def get_episode_records(self, ids: list) -> list:
+        """Return what's needed to download several episodes again.
+
+        :param ids: episode ids, at most `BATCH_SIZE`, see `batches`
+        :return: list of tuples of episode id, podcast name, RSS feed url, file
+        location, feed id, title, summary, publication timestamp, audio file URL and
+        length, episodes recorded without an audio file URL are left out
+        """
+        self.cursor.execute(
+            "SELECT e.id, p.name, p.url, e.path, e.feed_id, e.title, e.summary, "
+            "e.published, e.url, e.length FROM episodes e "
+            "JOIN podcasts p ON e.podcast_id = p.id "
+            f"WHERE e.url IS NOT NULL AND e.id IN ({', '.join('?' * len(ids))})",
+            ids,
+        )
+        return self.cursor.fetchall()
+
+    def forget_episodes(self, ids: list) -> None:
+        """Delete several episodes in a single transaction.
+
+        Forgotten episodes are downloaded again if they're still in their feed.
+        :param ids: episode ids
+        :return: None
+        """
+        self.cursor.executemany(
+            "DELETE FROM episodes WHERE id = ?", ((i,) for i in ids)
+        )
+        self._conn.commit()
+
+    def add_backlog(self, podcast_url: str, feed_ids: list) -> None:
+        """Save back catalog episodes to database.
+
+        Back catalog episodes are downloaded a few at a time, see
+        `Podcast._limit_backlog`.
+        :param podcast_url: RSS feed URL
+        :param feed_ids: ids generated by rss feed for each episode
+        :return: None
+        """
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO backlog (feed_id, podcast_id) "
+            "SELECT ?, id FROM main.podcasts WHERE url = ?",
+            ((feed_id, podcast_url) for feed_id in feed_ids),
+        )
+        self._conn.commit()
+
+    def get_backlog(self, url: str) -> set:
+        """Return back catalog episodes from a single podcast.
+
+        :param url: rss feed url
+        :return: set of episode ids waiting in the backlog
+        """
+        self.cursor.execute(
+            "SELECT feed_id FROM backlog "
+            "JOIN podcasts p ON backlog.podcast_id = p.id AND p.url = ?",
+            (url,),
+        )
+        return {item[0] for item in self.cursor.fetchall()}
+
+    def add_feed_stats(
+        self, stats: tp.Iterable[FeedStats], history: int = FEED_STATS_HISTORY
+    ) -> None:
+        """Save measurements of refreshed feeds, see `timed_fetch`.
+
+        Only the latest `history` refreshes of each podcast are kept.
+        :param stats: iterable of FeedStats, of subscribed feeds
+        :param history: refreshes kept per podcast
+        :return: None
+        """
+        stats = list(stats)
+        self.cursor.executemany(
+            "INSERT INTO feed_stats (podcast_id, fetched, size, fetch_seconds, "
+            "parse_seconds, entries, failed) "
+            "SELECT id, ?, ?, ?, ?, ?, ? FROM main.podcasts WHERE url = ?",
+            ((*stat[1:], stat.url) for stat in stats),
+        )
+        self.cursor.executemany(
+            "DELETE FROM feed_stats WHERE podcast_id = "
+            "(SELECT id FROM podcasts WHERE url = ?1) AND id <= "
+            "(SELECT s.id FROM feed_stats s JOIN podcasts p ON s.podcast_id = p.id "
+            "WHERE p.url = ?1 ORDER BY s.id DESC LIMIT 1 OFFSET ?2)",
+            ((stat.url, history) for stat in stats),
+        )
+        self._conn.commit()
+
+    def get_feed_report(
+        self, order: str = "time", podcast: str = "", limit: int = 10
+    ) -> list:
+        """Return per-podcast averages of recorded refreshes, worst first.
+
+        :param order: key of `FEED_STATS_ORDER`
+        :param podcast: only report podcasts whose name contains this
+        :param limit: max number of podcasts
+        :return: list of tuples of podcast name, refreshes, average bytes, fetch
+        seconds, parse seconds and entries, failure rate, and average total
+        seconds of all and of the latest `FEED_STATS_RECENT` refreshes.  Bytes
+        and entries are averaged over refreshes that didn't fail
+        """
+        self.cursor.execute(
+            "WITH ranked AS (SELECT *, row_number() OVER "
+            "(PARTITION BY podcast_id ORDER BY id DESC) AS n FROM feed_stats) "
+            "SELECT p.name, count(*), "
+            "coalesce(avg(CASE WHEN NOT failed THEN size END), 0), "
+            "avg(fetch_seconds), avg(parse_seconds), "
+            "coalesce(avg(CASE WHEN NOT failed THEN entries END), 0), avg(failed), "
+            "avg(fetch_seconds + parse_seconds), "
+            "avg(CASE WHEN n <= ? THEN fetch_seconds + parse_seconds END) "
+            "FROM ranked s JOIN podcasts p ON p.id = s.podcast_id "
+            "WHERE p.name LIKE ? GROUP BY p.id "
+            f"ORDER BY {FEED_STATS_ORDER[order]} DESC LIMIT ?",
+            (FEED_STATS_RECENT, f"%{podcast}%", limit),
+        )
+        return self.cursor.fetchall()
+
+    def get_feed_history(self, podcast: str = "", limit: int = 20) -> list:
+        """Return recorded refreshes, newest first.
+
+        :param podcast: only list podcasts whose name contains this
+        :param limit: max number of refreshes
+        :return: list of tuples of podcast name, fetch timestamp, bytes, fetch
+        seconds, parse seconds, entries and whether the refresh failed
+        """
+        self.cursor.execute(
+            "SELECT p.name, fetched, size, fetch_seconds, parse_seconds, entries, "
+            "failed FROM feed_stats s JOIN podcasts p ON p.id = s.podcast_id "
+            "WHERE p.name LIKE ? ORDER BY s.id DESC LIMIT ?",
+            (f"%{podcast}%", limit),
+        )
+        return self.cursor.fetchall()
+
+    def get_backlog_budget(self) -> tuple:
+        """Return per-run backlog budget.
+
+        :return: tuple of episodes and bytes per podcast per run, 0 is unlimited
+        """
+        self.cursor.execute(
+            "SELECT backlog_episodes, backlog_bytes FROM settings WHERE id = 1"
+        )
+        return self.cursor.fetchone()
+
+    def get_retention(self) -> tuple:
+        """Return global retention policy.
+
+        :return: tuple of episodes, days and bytes kept per podcast, and bytes
+        kept in total, 0 is unlimited
+        """
+        self.cursor.execute(
+            "SELECT retain_episodes, retain_days, retain_bytes, storage_quota "
+            "FROM settings WHERE id = 1"
+        )
+        return self.cursor.fetchone()
+
+    def get_podcast_retention(self) -> dict:
+        """Return each podcast's retention policy.
+
+        Podcasts without their own policy get the global one.
+        :return: dict of RSS feed url to tuple of episodes, days and bytes kept,
+        0 is unlimited
+        """
+        self.cursor.execute(
+            "SELECT p.url, COALESCE(p.retain_episodes, s.retain_episodes), "
+            "COALESCE(p.retain_days, s.retain_days), "
+            "COALESCE(p.retain_bytes, s.retain_bytes) "
+            "FROM podcasts p JOIN settings s ON s.id = 1"
+        )
+        return {url: tuple(policy) for url, *policy in self.cursor.fetchall()}
+
+    def set_podcast_retention(
+        self, url: str, episodes: int = None, days: int = None, max_bytes: int = None
+    ) -> None:
+        """Save podcast's retention policy.
+
+        :param url: RSS feed url
+        :param episodes: episodes kept, 0 is unlimited, None leaves it unchanged
+        :param days: days kept, 0 is unlimited, None leaves it unchanged
+        :param max_bytes: bytes kept, 0 is unlimited, None leaves it unchanged
+        :return: None
+        """
+        self.cursor.execute(
+            "UPDATE podcasts SET retain_episodes = COALESCE(?, retain_episodes), "
+            "retain_days = COALESCE(?, retain_days), "
+            "retain_bytes = COALESCE(?, retain_bytes) WHERE url = ?",
+            (episodes, days, max_bytes, url),
+        )
+        self._conn.commit()
+
+    def reset_podcast_retention(self, url: str) -> None:
+        """Make podcast follow the global retention policy.
+
+        :param url: RSS feed url
+        :return: None
+        """
+        self.cursor.execute(
+            "UPDATE podcasts SET retain_episodes = NULL, retain_days = NULL, "
+            "retain_bytes = NULL WHERE url = ?",
+            (url,),
+        )
+        self._conn.commit()
+
+    def get_roots(self) -> list:
+        """Return download roots.
+
+        :return: list of directories, the download directory first, followed by
+        the extra roots added with `Options.set_root_option`
+        """
+        self.cursor.execute(
+            "SELECT download_directory FROM settings WHERE id = 1 "
+            "UNION ALL SELECT * FROM (SELECT path FROM roots ORDER BY id)"
+        )
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def get_profiles(self) -> list:
+        """Return profiles, see `Options.set_profile_option`.
+
+        :return: list of tuples of name and database file, in the order added
+        """
+        self.cursor.execute("SELECT name, database FROM profiles ORDER BY id")
+        return self.cursor.fetchall()
+
+    def get_placement(self) -> tuple:
+        """Return placement policy and most recently added podcast's directory.
+
+        :return: tuple of key of `PLACEMENT_POLICIES` and directory, which is
+        None if there are no podcasts
+        """
+        self.cursor.execute("SELECT placement FROM settings WHERE id = 1")
+        (policy,) = self.cursor.fetchone()
+        self.cursor.execute("SELECT directory FROM podcasts ORDER BY id DESC LIMIT 1")
+        last = self.cursor.fetchone()
+        return policy, last[0] if last else None
+
     def get_options(self) -> tuple:
         """Return options.
 
@@ -130,6 +749,24 @@ class Database:
         )
         return self.cursor.fetchone()
 
+    def get_bandwidth(self) -> tuple:
+        """Return bandwidth limit options.
+
+        :return: tuple of bytes per second limit and time-of-day schedule
+        """
+        self.cursor.execute(
+            "SELECT bandwidth_limit, bandwidth_schedule FROM settings WHERE id = 1"
+        )
+        return self.cursor.fetchone()
+
+    def get_archive(self) -> bool:
+        """Return whether fetched feeds are archived, see `FeedArchive`.
+
+        :return: bool
+        """
+        self.cursor.execute("SELECT archive_feeds FROM settings WHERE id = 1")
+        return bool(self.cursor.fetchone()[0])
+
     def get_credentials(self) -> tuple:
         """Return credentials.
 
@@ -170,7 +807,7 @@ class Feed(Database):
     to database, viewing current subscription feeds, etc
     """
 
-    def add(self, url, newest_only: bool = False) -> None:
+    def add(self, url, newest_only: bool = False, root: str = None) -> None:
         """Add podcast to database.
 
         Parses and validates rss feed urls, adds to database, creates
@@ -179,10 +816,11 @@ class Feed(Database):
           accomplished by adding all episodes, except for the newest, to the episode
           table in the database.
         :param url: rss feed url
+        :param root: download root to pin podcast to, by default one is chosen by
+        the placement policy
         :return: None
         """
         try:
-            dl_dir, *_ = self.get_options()
             feed = fp.parse(url)
             self._logger.info(f"Parsing {url}")
             episodes = feed.entries
@@ -191,22 +829,109 @@ class Feed(Database):
                 self._logger.warning(msg)
             else:
                 podcast_name = feed.feed.title
-                podcast_dir = pathlib.Path(dl_dir).joinpath(podcast_name)
-                podcast_dir.mkdir(parents=True, exist_ok=True)
-                self.add_podcast(
-                    name=podcast_name, url=feed.href, directory=str(podcast_dir)
-                )
+                historical = self._historical_entries(feed)
                 # url=feed.href covers cases when rss feeds redirect to a diff URL.
                 # That was a fun one to debug.
                 if newest_only:
-                    self._new_podcast_only(feed=feed)
+                    seeded = [entry_record(feed.href, epi) for epi in historical]
+                    backlog = []
+                else:
+                    seeded, backlog = [], [(epi.id, feed.href) for epi in historical]
+                podcast_dir = self._podcast_directory(podcast_name, root)
+                podcast_dir.mkdir(parents=True, exist_ok=True)
+                self._logger.info(f"Adding {podcast_name} {feed.href} at {podcast_dir}")
+                self._save_podcasts(
+                    [(podcast_name, feed.href, str(podcast_dir))], seeded, backlog
+                )
                 msg = f"{podcast_name} added"
                 self._logger.info(msg)
         except sqlite3.IntegrityError:
+            self._conn.rollback()
             msg = f"{podcast_name} already in database."
             self._logger.warning(msg)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            msg = f"Unable to read entries of {url}"
+            self._logger.exception(msg)
         print(msg)
 
+    def add_many(
+        self,
+        urls: list,
+        newest_only: bool = False,
+        threads: int = 8,
+        root: str = None,
+        pool: ThreadPool = None,
+        verbose: bool = True,
+    ) -> tp.List[Addition]:
+        """Add several podcasts to database at once.
+
+        Feeds are fetched and validated concurrently, so a dead URL only holds up
+        its own thread.  Feeds whose entries can't be made sense of, e.g., lack
+        publication dates, are skipped as invalid.  Podcasts, along with their
+        seeded episodes or backlog, are then saved in a single transaction.
+        :param urls: list of rss feed urls
+        :param newest_only: bool, see `Feed.add`
+        :param threads: number of feeds to fetch at once
+        :param root: download root to pin podcasts to, see `Feed.add`
+        :param pool: ThreadPool to fetch feeds with, instead of one made for this call
+        :param verbose: print outcome of each feed
+        :return: list of Additions, one per url
+        """
+        last_directory = None
+        known = {url for _, url, _ in self.get_podcasts()}
+        if pool is None:
+            fetcher = ThreadPool(threads)
+            feeds = fetcher.map(fetch_feed, urls)
+            fetcher.close()
+            fetcher.join()
+        else:
+            feeds = pool.map(fetch_feed, urls)
+        podcasts, seeded, backlog, additions = [], [], [], []
+        for url, feed in zip(urls, feeds):
+            if not feed.entries:
+                msg = f"No episodes at {url}"
+                self._logger.warning(msg)
+                additions.append(Addition(url, None, None, "empty"))
+                if verbose:
+                    print(msg)
+                continue
+            podcast_name = feed.feed.get("title", feed.href)
+            if feed.href in known:
+                msg = f"{podcast_name} already in database."
+                self._logger.warning(msg)
+                additions.append(Addition(url, podcast_name, None, "exists"))
+                if verbose:
+                    print(msg)
+                continue
+            try:
+                historical = self._historical_entries(feed)
+                if newest_only:
+                    records = [entry_record(feed.href, epi) for epi in historical]
+                else:
+                    records = [(epi.id, feed.href) for epi in historical]
+            except (AttributeError, KeyError, TypeError, ValueError):
+                msg = f"Unable to read entries of {podcast_name} at {url}"
+                self._logger.exception(msg)
+                additions.append(Addition(url, podcast_name, None, "invalid"))
+                if verbose:
+                    print(msg)
+                continue
+            known.add(feed.href)
+            podcast_dir = self._podcast_directory(podcast_name, root, last_directory)
+            podcast_dir.mkdir(parents=True, exist_ok=True)
+            last_directory = str(podcast_dir)
+            podcasts.append((podcast_name, feed.href, str(podcast_dir)))
+            additions.append(Addition(url, podcast_name, str(podcast_dir), "added"))
+            (seeded if newest_only else backlog).extend(records)
+        self._save_podcasts(podcasts, seeded, backlog)
+        for podcast_name, url, directory in podcasts:
+            self._logger.info(f"Added {podcast_name} {url} at {directory}")
+            if verbose:
+                print(f"{podcast_name} added")
+        if verbose:
+            print(f"Added {len(podcasts)} of {len(urls)} feeds.")
+        return additions
+
     def remove(self) -> None:
         """Define podcast deletion menu.
 
@@ -234,22 +959,56 @@ class Feed(Database):
         except KeyboardInterrupt:
             print("\nCanceled")
 
-    def _new_podcast_only(self, feed: fp.FeedParserDict) -> None:
-        """Add all episodes (Except for latest) to database.
+    def _podcast_directory(
+        self, podcast_name: str, root: str = None, last_directory: str = None
+    ) -> pathlib.Path:
+        """Return download directory for new podcast.
+
+        :param podcast_name: podcast name
+        :param root: download root to pin podcast to, by default one is chosen by
+        the placement policy
+        :param last_directory: directory of the podcast added just before this
+        one, if it hasn't been saved yet
+        :return: directory within root
+        """
+        if root is None:
+            policy, last = self.get_placement()
+            root = choose_root(self.get_roots(), policy, last_directory or last)
+        return pathlib.Path(root).joinpath(podcast_name)
+
+    @staticmethod
+    def _historical_entries(feed: fp.FeedParserDict) -> list:
+        """Return all entries except for the latest one.
 
-        Used when adding a new podcast to the database.
+        Feeds list their latest entry first, unless their dates say otherwise.
         :param feed: FeedParserDict of a single feed
-        :return: None
+        :return: list of FeedParserDict entries
         """
         episodes = feed.entries
-        first = episodes[0].published_parsed
-        last = episodes[-1].published_parsed
-        if first < last:  # Last is the latest episode, i.e., feed is reversed
-            episodes = episodes[:-1]
-        else:
-            episodes = episodes[1:]
-        for epi in episodes:
-            self.add_episode(podcast_url=feed.href, feed_id=epi.id)
+        first = episodes[0].get("published_parsed")
+        last = episodes[-1].get("published_parsed")
+        if first and last and first < last:  # Last is the latest, feed is reversed
+            return episodes[:-1]
+        return episodes[1:]
+
+    def _save_podcasts(self, podcasts: list, seeded: list, backlog: list) -> None:
+        """Save new podcasts along with their episodes in a single transaction.
+
+        :param podcasts: list of tuples of name, rss feed url and directory
+        :param seeded: list of dicts of parameters for `INSERT_EPISODE`
+        :param backlog: list of tuples of feed id and rss feed url
+        :return: None
+        """
+        self.cursor.executemany(
+            "INSERT INTO podcasts (name, url, directory) VALUES (?,?,?)", podcasts
+        )
+        self.cursor.executemany(INSERT_EPISODE, seeded)
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO backlog (feed_id, podcast_id) "
+            "SELECT ?, id FROM main.podcasts WHERE url = ?",
+            backlog,
+        )
+        self._conn.commit()
 
     def print_subscriptions(self) -> None:
         """
@@ -295,10 +1054,10 @@ class Options(Database):
     def email_notification_setup(self, initial_setup: bool = False) -> None:
         """Get and store email credentials.
 
-       Interacts with user, gets sender email address and password, as well as recipient address
-       :param initial_setup: bool if True, prints additional info
-       :return: namedtuple of sender address and password and recipient address
-       """
+        Interacts with user, gets sender email address and password, as well as recipient address
+        :param initial_setup: bool if True, prints additional info
+        :return: namedtuple of sender address and password and recipient address
+        """
 
         def credential_validation() -> bool:
             """
@@ -377,10 +1136,251 @@ class Options(Database):
         print(f"Email notifications: {email_notification_status[notification_status]}")
         if notification_status:
             print(f"Email notifications sent to: {recipient_address}")
+        limit, schedule = self.get_bandwidth()
+        print(f"Bandwidth limit: {f'{limit} bytes/s' if limit else 'None'}")
+        if schedule:
+            print(f"Bandwidth schedule: {schedule}")
+        episodes, max_bytes = self.get_backlog_budget()
+        print(
+            f"Backlog budget: {episodes or 'unlimited'} episodes, "
+            f"{max_bytes or 'unlimited'} bytes per podcast per run"
+        )
+        episodes, days, max_bytes, quota = self.get_retention()
+        print(
+            f"Retention: {episodes or 'unlimited'} episodes, "
+            f"{days or 'unlimited'} days, {max_bytes or 'unlimited'} bytes per podcast, "
+            f"{quota or 'unlimited'} bytes in total"
+        )
+        roots = self.get_roots()
+        if len(roots) > 1:
+            policy, _ = self.get_placement()
+            print(f"Extra download roots: {', '.join(roots[1:])}")
+            print(f"Placement policy: {policy}")
+        print(f"Feed archive: {'On' if self.get_archive() else 'Off'}")
         print(f"Database file: {self._db_file}")
         print("-------------")
         return download_directory, notification_status, recipient_address
 
+    def set_bandwidth_option(self, rate: str, schedule: str = "") -> bool:
+        """
+        Sets the aggregate download bandwidth limit
+        :param rate: string, bytes per second, e.g., `500k` or `2M`, 0 for unlimited
+        :param schedule: string, time-of-day overrides, e.g., `09:00-17:00=250k`
+        :return: bool, True if options were valid and saved
+        """
+        try:
+            limit = parse_rate(rate)
+            parse_schedule(schedule)
+        except ValueError as err:
+            msg = f"Invalid bandwidth option: {err}"
+            print(msg)
+            self._logger.warning(msg)
+            return False
+        self.change_option("bandwidth_limit", limit)
+        self.change_option("bandwidth_schedule", schedule)
+        msg = (
+            f"Bandwidth limited to {limit} bytes/s" if limit else "Bandwidth unlimited"
+        )
+        if schedule:
+            msg += f", schedule: {schedule}"
+        print(msg)
+        self._logger.info(msg)
+        return True
+
+    def set_backlog_option(self, episodes: int, size: str) -> bool:
+        """
+        Sets how much of each podcast's back catalog is downloaded per run
+        :param episodes: int, max backlog episodes per podcast per run, 0 for unlimited
+        :param size: string, max backlog bytes per podcast per run, e.g., `500M`
+        :return: bool, True if options were valid and saved
+        """
+        try:
+            max_bytes = parse_rate(size)
+            if episodes < 0:
+                raise ValueError(f"Negative episode count {episodes}")
+        except ValueError as err:
+            msg = f"Invalid backlog option: {err}"
+            print(msg)
+            self._logger.warning(msg)
+            return False
+        self.change_option("backlog_episodes", episodes)
+        self.change_option("backlog_bytes", max_bytes)
+        msg = (
+            f"Backlog budget set to {episodes or 'unlimited'} episodes and "
+            f"{max_bytes or 'unlimited'} bytes per podcast per run"
+        )
+        print(msg)
+        self._logger.info(msg)
+        return True
+
+    def set_retention_option(
+        self,
+        episodes: int = None,
+        days: int = None,
+        size: str = None,
+        quota: str = None,
+        podcast: str = "",
+        inherit: bool = False,
+    ) -> bool:
+        """
+        Sets how many downloaded episodes are kept, options left as None are unchanged
+        :param episodes: int, max episodes per podcast, 0 for unlimited
+        :param days: int, max age in days of downloaded episodes, 0 for unlimited
+        :param size: string, max bytes per podcast, e.g., `2G`, 0 for unlimited
+        :param quota: string, max bytes in total, e.g., `100G`, 0 for unlimited
+        :param podcast: string, if set, only the podcast with a matching name is
+        changed, rather than the global policy
+        :param inherit: bool, make `podcast` follow the global policy again
+        :return: bool, True if options were valid and saved
+        """
+        try:
+            max_bytes = parse_rate(size) if size is not None else None
+            max_total = parse_rate(quota) if quota is not None else None
+            for name, value in (("episode count", episodes), ("day count", days)):
+                if value is not None and value < 0:
+                    raise ValueError(f"Negative {name} {value}")
+            if podcast:
+                if max_total is not None:
+                    raise ValueError("The storage quota can't be set per podcast")
+                matches = [
+                    (name, url)
+                    for name, url, _ in self.get_podcasts()
+                    if podcast.lower() in name.lower()
+                ]
+                if len(matches) != 1:
+                    raise ValueError(
+                        f"{len(matches)} podcasts match `{podcast}`, expected one"
+                    )
+        except ValueError as err:
+            msg = f"Invalid retention option: {err}"
+            print(msg)
+            self._logger.warning(msg)
+            return False
+        if podcast:
+            name, url = matches[0]
+            if inherit:
+                self.reset_podcast_retention(url)
+            self.set_podcast_retention(url, episodes, days, max_bytes)
+            episodes, days, max_bytes = self.get_podcast_retention()[url]
+            msg = (
+                f"{name} keeps {episodes or 'unlimited'} episodes, "
+                f"{days or 'unlimited'} days and {max_bytes or 'unlimited'} bytes"
+            )
+        else:
+            for option, value in (
+                ("retain_episodes", episodes),
+                ("retain_days", days),
+                ("retain_bytes", max_bytes),
+                ("storage_quota", max_total),
+            ):
+                if value is not None:
+                    self.change_option(option, value)
+            episodes, days, max_bytes, max_total = self.get_retention()
+            msg = (
+                f"Each podcast keeps {episodes or 'unlimited'} episodes, "
+                f"{days or 'unlimited'} days and {max_bytes or 'unlimited'} bytes, "
+                f"{max_total or 'unlimited'} bytes are kept in total"
+            )
+        print(msg)
+        self._logger.info(msg)
+        return True
+
+    def set_root_option(self, directory: str, remove: bool = False) -> bool:
+        """
+        Adds or removes an extra download root, e.g., on another disk
+        Podcasts already stored in a removed root stay where they are
+        :param directory: string, abs path to download root
+        :param remove: bool, remove root rather than adding it
+        :return: bool, True if root was added or removed
+        """
+        if remove:
+            self.cursor.execute("DELETE FROM roots WHERE path = ?", (directory,))
+            self._conn.commit()
+            removed = self.cursor.rowcount > 0
+            msg = f"{'Removed' if removed else 'No'} download root {directory}"
+            print(msg)
+            self._logger.info(msg)
+            return removed
+        try:
+            pathlib.Path(directory).mkdir(exist_ok=True, parents=True)
+            if directory in self.get_roots():
+                raise sqlite3.IntegrityError(directory)
+            self.cursor.execute("INSERT INTO roots (path) VALUES (?)", (directory,))
+            self._conn.commit()
+        except (OSError, sqlite3.IntegrityError) as err:
+            msg = f"Unable to add download root `{directory}`: {err.__class__.__name__}"
+            print(msg)
+            self._logger.warning(msg)
+            return False
+        msg = f"Added download root {directory}"
+        print(msg)
+        self._logger.info(msg)
+        return True
+
+    def set_profile_option(
+        self, name: str, database: str = None, remove: bool = False
+    ) -> bool:
+        """
+        Adds or removes a profile, i.e., another database with its own
+        subscriptions, settings and download root
+        The profile's database isn't created or deleted here
+        :param name: string, profile name
+        :param database: string, abs path to the profile's database file
+        :param remove: bool, forget profile rather than adding it
+        :return: bool, True if profile was added or removed
+        """
+        if remove:
+            self.cursor.execute("DELETE FROM profiles WHERE name = ?", (name,))
+            self._conn.commit()
+            removed = self.cursor.rowcount > 0
+            msg = f"{'Removed' if removed else 'No'} profile {name}"
+            print(msg)
+            self._logger.info(msg)
+            return removed
+        try:
+            if (
+                pathlib.Path(database).resolve()
+                == pathlib.Path(self._db_file).resolve()
+            ):
+                raise sqlite3.IntegrityError(database)
+            self.cursor.execute(
+                "INSERT INTO profiles (name, database) VALUES (?, ?)", (name, database)
+            )
+            self._conn.commit()
+        except sqlite3.IntegrityError as err:
+            msg = f"Unable to add profile `{name}`: {err.__class__.__name__}"
+            print(msg)
+            self._logger.warning(msg)
+            return False
+        msg = f"Added profile {name} at {database}"
+        print(msg)
+        self._logger.info(msg)
+        return True
+
+    def set_placement_option(self, policy: str) -> bool:
+        """
+        Sets how new podcasts are placed in download roots
+        :param policy: string, key of `PLACEMENT_POLICIES`
+        :return: bool, True if policy was valid and saved
+        """
+        if policy not in PLACEMENT_POLICIES:
+            msg = f"Invalid placement policy `{policy}`"
+            print(msg)
+            self._logger.warning(msg)
+            return False
+        self.change_option("placement", policy)
+        print(f"New podcasts are placed by {policy}")
+        return True
+
+    def set_archive_option(self, value: bool) -> None:
+        """
+        Turns archiving of fetched feeds on or off
+        :param value: bool, archive feeds fetched by `podd dl`
+        :return: None
+        """
+        self.change_option("archive_feeds", int(value))
+        print(f"Feed archive {'on' if value else 'off'}")
+
     def set_directory_option(self, directory) -> bool:
         """
         Sets the base download directory, where each individual podcast
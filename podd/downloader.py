@@ -1,98 +1,534 @@
 """Contain update and download functions."""
 
+from collections import Counter
+from contextlib import contextmanager
+from functools import partial
+from itertools import count
+from multiprocessing import Pool as ProcessPool, get_context
 from multiprocessing.dummy import Pool as ThreadPool
-from typing import List
+from os import cpu_count
+import pathlib
+from threading import Lock
+import typing as tp
 
+import feedparser as fp
+
+from podd.archive import FeedArchive
+from podd.artwork import ArtworkCache
 from podd.database import Database
+from podd.fetch import timed_fetch
+from podd.jobs import JobQueue, Worker
 from podd.message import Message
+from podd.notify import Notifier
 from podd.podcast import Episode, Podcast
+from podd.ratelimit import TokenBucket
+from podd.redirects import RedirectCache
+from podd.retention import Retention
+from podd.scheduling import schedule
+from podd.settings import Config
+from podd.tagging import tag_file
+
+# Max number of processes tagging downloaded files
+TAGGING_PROCESSES = 4
+
+
+class Progress(tp.NamedTuple):
+    """Event passed to progress callbacks as each podcast or episode is done."""
+
+    stage: str  # "refresh" or "download"
+    podcast: str
+    episode: str or None  # Episode title, None when refreshing
+    done: int
+    total: int
+    error: bool = False
 
 
-def downloader() -> None:
+class DownloadReport(tp.NamedTuple):
+    """Outcome of `threaded_downloader`."""
+
+    downloaded: tp.List[Episode]
+    failed: tp.List[Episode]
+    tag_jobs: int
+    tag_failures: Counter
+
+
+def downloader(
+    order: str = "feed",
+    inline_tags: bool = False,
+    enqueue: bool = False,
+    databases: tp.List[str] = None,
+) -> None:
     """Download all new episodes.
 
-    Refreshes subscriptions, downloads new episodes, sends email messages.
+    Refreshes subscriptions, downloads new episodes, deletes old episodes outside
+    the retention policies, sends email messages.
+    Notifications are handed to a Notifier, which connects to the mail server
+    and sends any previously spooled messages while episodes are downloading.
+
+    Several profiles can be processed by one run.  Feeds they share are fetched
+    once, and every profile's episodes are downloaded by the same pools, within
+    the bandwidth limit of the first profile.  Feeds are archived if the first
+    profile has archiving on, see `FeedArchive`.  Backlog budgets, retention
+    policies and notifications are each profile's own.
+    :param order: name of scheduling policy used to order downloads
+    :param inline_tags: tag mp3 files while downloading them
+    :param enqueue: only refresh subscriptions, and add new episodes to the job
+    queue for `worker` processes to download
+    :param databases: databases of the profiles to process, by default only
+    `Config.database`
     :return: None.
     """
-    with Database() as _db:
+    databases = databases or [Config.database]
+    subscriptions = {}
+    for database in databases:
+        with Database(database) as _db:
+            subscriptions[database] = _db.get_podcasts(), _db.get_backlog_budget()
+    with Database(databases[0]) as _db:
+        archive = FeedArchive() if _db.get_archive() else None
+    with _pool() as pool:
+        refreshed = refresh_profiles(subscriptions, pool, print_progress, archive)
+        if enqueue:
+            for database, podcasts in refreshed.items():
+                with JobQueue(database) as queue:
+                    added = queue.enqueue(
+                        schedule([ep for pod in podcasts for ep in pod.episodes], order)
+                    )
+                    print(
+                        f"Queued {added} episodes, "
+                        f"{queue.counts().get('pending', 0)} pending"
+                    )
+            return
+        with Database(databases[0]) as _db:
+            limiter = bandwidth_limiter(*_db.get_bandwidth())
+        artwork, redirects, tagger = ArtworkCache(), RedirectCache(), None
+        if any(pod.episodes for podcasts in refreshed.values() for pod in podcasts):
+            tagger = tagging_pool()
+        try:
+            for database, podcasts in refreshed.items():
+                if len(databases) > 1:
+                    print(f"-- {database} --")
+                download_profile(
+                    database,
+                    podcasts,
+                    order,
+                    inline_tags,
+                    limiter,
+                    pool,
+                    tagger,
+                    artwork,
+                    redirects,
+                )
+        finally:
+            if tagger is not None:
+                tagger.close()
+                tagger.join()
+
+
+def download_profile(
+    database: str,
+    podcasts: tp.List[Podcast],
+    order: str = "feed",
+    inline_tags: bool = False,
+    limiter: TokenBucket = None,
+    pool: ThreadPool = None,
+    tagger: ProcessPool = None,
+    artwork: ArtworkCache = None,
+    redirects: RedirectCache = None,
+) -> None:
+    """Download new episodes of one profile, then apply its retention policies.
+
+    :param database: profile's database
+    :param podcasts: refreshed Podcasts of the profile
+    :param order: name of scheduling policy used to order downloads
+    :param inline_tags: tag mp3 files while downloading them
+    :param limiter: TokenBucket shared by every profile
+    :param pool: ThreadPool shared by every profile, see `threaded_downloader`
+    :param tagger: process pool shared by every profile
+    :param artwork: ArtworkCache shared by every profile
+    :param redirects: RedirectCache shared by every profile
+    :return: None
+    """
+    with Database(database) as _db:
         _, send_notifications, _ = _db.get_options()
         if send_notifications:
             sender, password, recipient = _db.get_credentials()
             if not password:
                 send_notifications = False
-                print('Unable to fetch password from keyring, notifications disabled.')
-        podcasts, eps_to_download = threaded_update(_db.get_podcasts())
-    if podcasts and eps_to_download:
-        threaded_downloader(eps_to_download)
+                print("Unable to fetch password from keyring, notifications disabled.")
+    notifier = None
+    if send_notifications:
+        notifier = Notifier(sender, password, spool=spool_directory(database)).start()
+    podcasts = [podcast for podcast in podcasts if podcast.episodes]
+    if podcasts:
+        report = threaded_downloader(
+            schedule([ep for pod in podcasts for ep in pod.episodes], order),
+            limiter,
+            inline_tags,
+            database,
+            pool,
+            tagger,
+            artwork,
+            print_progress,
+            redirects,
+        )
+        print(tagging_summary(report.tag_jobs, report.tag_failures))
+        evicted = Retention(database).run()
+        if evicted:
+            print(retention_summary(evicted))
         if send_notifications:
             message_packet = [
                 p.good_episodes for p in podcasts if p.good_episodes is not None
             ]
             if message_packet:
-                Message(message_packet, sender, password, recipient).send()
+                Message(message_packet, sender, password, recipient).send(notifier)
     else:
         print("No new episodes")
+    if notifier is not None:
+        notifier.close()
 
 
-def threaded_update(subscriptions: list) -> tuple:
-    """Create a ThreadPool to get new episodes to download from rss feed.
+def spool_directory(database: str) -> pathlib.Path:
+    """Return directory of unsent notifications of a profile.
+
+    Profiles are kept apart, so a message is only sent with the credentials
+    of the profile it belongs to.
+    :param database: profile's database
+    :return: directory
+    """
+    if pathlib.Path(database) == pathlib.Path(Config.database):
+        return Config.spool_directory
+    return Config.spool_directory / pathlib.Path(database).stem
+
+
+def worker(
+    threads: int = 3,
+    inline_tags: bool = False,
+    purge: bool = False,
+    database: str = Config.database,
+) -> None:
+    """Download queued episodes until the job queue is empty.
+
+    Any number of workers can run at once, see `JobQueue`.  The bandwidth limit
+    applies to each worker separately.  Old episodes outside the retention
+    policies are deleted afterwards.
+    :param threads: number of episodes downloaded at once
+    :param inline_tags: tag mp3 files while downloading them
+    :param purge: delete finished jobs once the queue is empty
+    :param database: database holding the job queue
+    :return: None
+    """
+    with Database(database) as _db:
+        limiter = bandwidth_limiter(*_db.get_bandwidth())
+    work = Worker(threads, limiter, inline_tags, database, print_job)
+    work.run()
+    print(f"Downloaded {len(work.done)} episodes, {len(work.failed)} failed")
+    if purge:
+        with JobQueue(database) as queue:
+            print(f"Purged {queue.purge()} finished jobs")
+    if work.done:
+        evicted = Retention(database).run()
+        if evicted:
+            print(retention_summary(evicted))
+
+
+def bandwidth_limiter(limit: int, bandwidth_schedule: str) -> TokenBucket or None:
+    """Create TokenBucket shared by download threads, if bandwidth is limited.
+
+    :param limit: bytes per second, 0 is unlimited
+    :param bandwidth_schedule: time-of-day overrides, see `parse_schedule`
+    :return: TokenBucket, or None if bandwidth isn't limited
+    """
+    if limit or bandwidth_schedule:
+        return TokenBucket(limit, bandwidth_schedule)
+    return None
+
+
+def refresh_podcasts(
+    subscriptions: list,
+    backlog_budget: tuple = (0, 0),
+    database: str = Config.database,
+    pool: ThreadPool = None,
+    progress: tp.Callable[[Progress], None] = None,
+    feeds: tp.Dict[str, fp.FeedParserDict] = None,
+) -> tp.List[Podcast]:
+    """Fetch rss feeds of subscriptions, finding new episodes of each podcast.
 
     :param subscriptions: list of tuples of names, rss feed urls and download
     directories of individual podcasts
-    :return: 2-tuple of lists of jinja_packets and a list of episodes to download.
+    :param backlog_budget: max back catalog episodes and bytes per podcast
+    :param database: database holding the subscriptions
+    :param pool: ThreadPool to fetch feeds with, by default one is made for this call
+    :param progress: called with a `Progress` as each feed is refreshed
+    :param feeds: dict of rss feed url to feeds that were already fetched
+    :return: list of Podcasts, in the order of subscriptions
     """
+    counter, lock = count(1), Lock()
 
-    def update_worker(subscription: tuple) -> Podcast or None:
+    def update_worker(subscription: tuple) -> Podcast:
         """Get update for single podcast.
 
         Function used by ThreadPool to update RSS feed.
         :param subscription: tuple of name, rss feed url and download directory
-        :return:
+        :return: Podcast
         """
         name, url, dl_dir = subscription
-        print(f"{name}...")
-        with Podcast(url, dl_dir) as pod:
-            if pod.episodes:
-                return pod
+        feed = feeds.get(url) if feeds else None
+        with Podcast(url, dl_dir, backlog_budget, database, feed) as pod:
+            if progress:
+                with lock:
+                    done = next(counter)
+                progress(Progress("refresh", name, None, done, len(subscriptions)))
+            return pod
+
+    with _pool(pool) as workers:
+        return workers.map(update_worker, subscriptions)
+
+
+def refresh_profiles(
+    subscriptions: tp.Dict[str, tuple],
+    pool: ThreadPool = None,
+    progress: tp.Callable[[Progress], None] = None,
+    archive: FeedArchive = None,
+) -> tp.Dict[str, tp.List[Podcast]]:
+    """Refresh subscriptions of several profiles, fetching each feed only once.
+
+    How long fetching and parsing each feed took is saved to every profile
+    subscribed to it, see `podd stats`.
+    :param subscriptions: dict of each profile's database to a tuple of its
+    subscriptions and backlog budget, see `refresh_podcasts`
+    :param pool: ThreadPool to fetch feeds with, by default one is made for this call
+    :param progress: called with a `Progress` as each subscription is refreshed
+    :param archive: FeedArchive fetched feeds are stored in, if any
+    :return: dict of database to list of Podcasts, see `refresh_podcasts`
+    """
+    urls = list(
+        dict.fromkeys(url for subs, _ in subscriptions.values() for _, url, _ in subs)
+    )
+    with _pool(pool) as workers:
+        fetched = workers.map(partial(timed_fetch, archive=archive), urls)
+        feeds = {url: feed for url, (feed, _) in zip(urls, fetched)}
+        for database in subscriptions:
+            with Database(database) as _db:
+                _db.add_feed_stats(stats for _, stats in fetched)
+        return {
+            database: refresh_podcasts(subs, budget, database, workers, progress, feeds)
+            for database, (subs, budget) in subscriptions.items()
+        }
+
+
+def threaded_update(
+    subscriptions: list,
+    backlog_budget: tuple = (0, 0),
+    database: str = Config.database,
+    pool: ThreadPool = None,
+    progress: tp.Callable[[Progress], None] = None,
+) -> tuple:
+    """Create a ThreadPool to get new episodes to download from rss feed.
 
+    :param subscriptions: list of tuples of names, rss feed urls and download
+    directories of individual podcasts
+    :param backlog_budget: max back catalog episodes and bytes per podcast
+    :param database: database holding the subscriptions
+    :param pool: ThreadPool to fetch feeds with, see `refresh_podcasts`
+    :param progress: called with a `Progress` as each feed is refreshed
+    :return: 2-tuple of list of Podcasts with new episodes and list of episodes
+    to download.
+    """
     podcasts, episodes = [], []
-    pool = ThreadPool(3)
-    results = pool.map(update_worker, subscriptions)
-    pool.close()
-    pool.join()
-    for podcast in results:
-        if podcast:
+    for podcast in refresh_podcasts(
+        subscriptions, backlog_budget, database, pool, progress
+    ):
+        if podcast.episodes:
             podcasts.append(podcast)
             episodes.extend(podcast.episodes)
     return podcasts, episodes
 
 
-def threaded_downloader(eps_to_download: List[Episode]) -> None:
+def threaded_downloader(
+    eps_to_download: tp.List[Episode],
+    limiter: TokenBucket = None,
+    inline_tags: bool = False,
+    database: str = Config.database,
+    pool: ThreadPool = None,
+    tagger: ProcessPool = None,
+    artwork: ArtworkCache = None,
+    progress: tp.Callable[[Progress], None] = None,
+    redirects: RedirectCache = None,
+) -> DownloadReport:
     """Create thread-pool to download episodes.
 
+    Episodes are handed out one at a time, in the order given, so that the
+    scheduling policy is respected by the pool.  Downloaded files are tagged by
+    a separate pool of processes, with each podcast's artwork as cover art.
+    Downloads identical to a file already on disk are replaced by a hard link.
+    Pools that aren't given are made for this call, and closed afterwards.
     :param eps_to_download: list of Episodes to be downloaded
-    :return: None
+    :param limiter: TokenBucket shared by every worker, caps total bandwidth
+    :param inline_tags: tag mp3 files while downloading them
+    :param database: database the downloaded episodes are recorded in
+    :param pool: ThreadPool to download with
+    :param tagger: process pool to tag files with
+    :param artwork: ArtworkCache holding cover art
+    :param progress: called with a `Progress` as each episode is downloaded
+    :param redirects: RedirectCache of enclosure URLs, saved once downloads are done
+    :return: DownloadReport
     """
 
     def download_worker(episode: Episode) -> Episode:
-        """Download and tag episode.
+        """Download episode and queue it for tagging.
 
-        Function used by ThreadPool.map to download each episode.
+        Function used by ThreadPool.imap to download each episode.  Tagging is
+        handed to the tagging processes, so the download slot is freed right away.
         :param: episode Episode obj
-        :return: Noned
+        :return: Episode
         """
-        print(f"Downloading {episode.podcast_name} - {episode.title}")
-        episode.download()
-        episode.tag()
-        if not episode.error:
-            return episode
-
-    if eps_to_download:
-        pool = ThreadPool(3)
-        results = pool.map(download_worker, eps_to_download)
+        episode.artwork = artwork.path(episode.podcast_image)
+        episode.download(limiter, inline_tags, redirects)
+        if not episode.error and episode.sha256:
+            deduplicate(episode)
+        job = episode.tag_job()
+        if job:
+            tagging.append((episode, tagger.apply_async(tag_file, (job,))))
+        if progress:
+            with lock:
+                done = next(counter)
+            progress(
+                Progress(
+                    "download",
+                    episode.podcast_name,
+                    episode.title,
+                    done,
+                    len(eps_to_download),
+                    bool(episode.error),
+                )
+            )
+        return episode
+
+    def deduplicate(episode: Episode) -> None:
+        """Link episode to an identical file downloaded before, if there is one.
+
+        :param episode: downloaded Episode
+        :return: None
+        """
+        with lock:
+            known = downloaded.setdefault(episode.sha256, episode.filename)
+        if known == episode.filename:
+            with Database(database) as _db:
+                known = _db.get_file_by_hash(episode.sha256, exclude=episode.filename)
+        if known:
+            episode.link(known)
+
+    if not eps_to_download:
+        return DownloadReport([], [], 0, Counter())
+    artwork = artwork or ArtworkCache()
+    redirects = redirects if redirects is not None else RedirectCache()
+    downloaded, lock = {}, Lock()  # Hash of each file downloaded this run
+    counter = count(1)
+    tagging = []
+    own_tagger = tagger is None
+    if own_tagger:
+        tagger = tagging_pool()
+    with _pool(pool) as workers:
+        results = list(workers.imap(download_worker, eps_to_download, chunksize=1))
+    redirects.save()
+    if own_tagger:
+        tagger.close()
+    failures = Counter()
+    for episode, result in tagging:
+        try:
+            failure = result.get()
+        except Exception as exc:  # e.g., a tagging process died
+            failure = f"tagging error ({exc.__class__.__name__})"
+        episode.tag_result(failure)
+        if failure:
+            failures[failure] += 1
+    if own_tagger:
+        tagger.join()
+    good = [epi for epi in results if not epi.error]
+    with Database(database) as _db:
+        for epi in good:
+            _db.add_episode(
+                podcast_url=epi.podcast_url,
+                feed_id=epi.entry.id,
+                **epi.record(),
+            )
+    return DownloadReport(
+        good, [epi for epi in results if epi.error], len(tagging), failures
+    )
+
+
+def tagging_pool(processes: int = None) -> ProcessPool:
+    """Create process pool to tag files with, see `tag_file`.
+
+    Processes are spawned rather than forked, as download and notification
+    threads may already be running, and forking copies their locks.
+    :param processes: number of processes, by default up to `TAGGING_PROCESSES`
+    :return: process pool
+    """
+    processes = processes or min(TAGGING_PROCESSES, cpu_count() or 1)
+    return get_context("spawn").Pool(processes)
+
+
+@contextmanager
+def _pool(pool: ThreadPool = None, threads: int = 3) -> tp.Iterator[ThreadPool]:
+    """Use `pool`, or a ThreadPool that's closed on exit if there is none."""
+    if pool is not None:
+        yield pool
+        return
+    pool = ThreadPool(threads)
+    try:
+        yield pool
+    finally:
         pool.close()
         pool.join()
-        with Database() as _db:
-            for epi in results:
-                if epi:
-                    _db.add_episode(podcast_url=epi.podcast_url, feed_id=epi.entry.id)
+
+
+def print_progress(event: Progress) -> None:
+    """Print progress of `podd dl`.
+
+    :param event: Progress
+    :return: None
+    """
+    if event.stage == "refresh":
+        print(f"{event.podcast}...")
+    elif event.error:
+        print(f"Failed to download {event.podcast} - {event.episode}")
+    else:
+        print(f"Downloaded {event.podcast} - {event.episode}")
+
+
+def print_job(episode: Episode) -> None:
+    """Print progress of `podd worker`.
+
+    :param episode: Episode whose job has been recorded
+    :return: None
+    """
+    if episode.error:
+        print(f"Failed to download {episode.podcast_name} - {episode.title}")
+    else:
+        print(f"Downloaded {episode.podcast_name} - {episode.title}")
+
+
+def retention_summary(evicted: list) -> str:
+    """Summarize retention stage.
+
+    :param evicted: list of Evictions
+    :return: summary line, e.g., `Deleted 3 old episodes, freeing 120000000 bytes`
+    """
+    plural = "" if len(evicted) == 1 else "s"
+    freed = sum(eviction.size or 0 for eviction in evicted)
+    return f"Deleted {len(evicted)} old episode{plural}, freeing {freed} bytes"
+
+
+def tagging_summary(jobs: int, failures: Counter) -> str:
+    """Summarize tagging stage.
+
+    :param jobs: number of tagging jobs
+    :param failures: Counter of kinds of tagging failures
+    :return: summary line, e.g., `Tagged 9 of 10 episodes (unknown filetype: 1)`
+    """
+    summary = f"Tagged {jobs - sum(failures.values())} of {jobs} episodes"
+    if failures:
+        kinds = ", ".join(f"{kind}: {count}" for kind, count in failures.most_common())
+        summary += f" ({kinds})"
+    return summary
@@ -0,0 +1,108 @@
+"""Fetch RSS feeds and parse their entries."""
+
+import time
+import typing as tp
+
+import feedparser as fp
+from requests import get
+from requests.exceptions import RequestException
+
+# Seconds to wait for a feed server before giving up on it
+FEED_TIMEOUT = 30
+
+
+class FeedStats(tp.NamedTuple):
+    """Measurements of a single fetch of a feed, see `timed_fetch`."""
+
+    url: str
+    fetched: str  # UTC timestamp, see `timestamp`
+    size: int  # Bytes of the body
+    fetch_seconds: float
+    parse_seconds: float
+    entries: int
+    failed: bool
+
+
+def fetch_feed(
+    url: str, timeout: int = FEED_TIMEOUT, archive=None
+) -> fp.FeedParserDict:
+    """Fetch and parse RSS feed.
+
+    Unlike `fp.parse(url)`, gives up on unresponsive servers after `timeout`
+    seconds.  Failures are reported the same way feedparser reports them, i.e.,
+    `bozo` is set and there are no entries.
+    :param url: rss feed url
+    :param timeout: seconds to wait for the server
+    :param archive: FeedArchive the raw body is stored in, if any
+    :return: FeedParserDict, `href` is set to the final URL after redirects
+    """
+    return timed_fetch(url, timeout, archive)[0]
+
+
+def timed_fetch(
+    url: str, timeout: int = FEED_TIMEOUT, archive=None
+) -> tp.Tuple[fp.FeedParserDict, FeedStats]:
+    """Fetch and parse RSS feed, measuring how long each took.
+
+    :param url: rss feed url
+    :param timeout: seconds to wait for the server
+    :param archive: FeedArchive the raw body is stored in, if any
+    :return: tuple of FeedParserDict, see `fetch_feed`, and FeedStats
+    """
+    fetched, start = timestamp(time.gmtime()), time.perf_counter()
+    try:
+        resp = get(url, timeout=timeout)
+        resp.raise_for_status()
+    except RequestException as err:
+        feed = fp.FeedParserDict(
+            feed=fp.FeedParserDict(), entries=[], href=url, bozo=1, bozo_exception=err
+        )
+        stats = FeedStats(url, fetched, 0, time.perf_counter() - start, 0.0, 0, True)
+        return feed, stats
+    fetch_seconds = time.perf_counter() - start
+    headers = {k.lower(): v for k, v in resp.headers.items()}
+    if archive is not None:
+        archive.store(url, resp.content, headers, resp.url)
+    start = time.perf_counter()
+    feed = fp.parse(resp.content, response_headers=headers)
+    parse_seconds = time.perf_counter() - start
+    feed["href"] = resp.url
+    stats = FeedStats(
+        url,
+        fetched,
+        len(resp.content),
+        fetch_seconds,
+        parse_seconds,
+        len(feed.entries),
+        bool(feed.get("bozo") and not feed.entries),
+    )
+    return feed, stats
+
+
+def enclosure(entry: fp.FeedParserDict) -> tp.Tuple[str, int]:
+    """Find the audio file attached to a feed entry.
+
+    Feeds are free to leave `length` out or fill it with junk, so anything that
+    isn't a positive integer is treated as unknown.
+    :param entry: single FeedParserDict from fp.parse(url).entries list
+    :return: tuple of audio file URL and size in bytes, either may be None
+    """
+    for link in entry.get("links", []):
+        if "audio/" in link.get("type", ""):
+            try:
+                length = int(link.get("length", 0))
+            except (TypeError, ValueError):
+                length = 0
+            return link.get("href"), length if length > 0 else None
+    return None, None
+
+
+def timestamp(moment: time.struct_time = None) -> str or None:
+    """Format UTC time the way sqlite's date and time functions expect it.
+
+    :param moment: e.g., an entry's `published_parsed`
+    :return: string, `YYYY-MM-DD HH:MM:SS`, or None if `moment` is None
+    """
+    if moment is None:
+        return None
+    return time.strftime("%Y-%m-%d %H:%M:%S", moment)
@@ -0,0 +1,387 @@
+"""Implement durable download queue shared by worker processes."""
+
+import json
+import os
+import socket
+from threading import Event, Lock, Thread
+import time
+import typing as tp
+from uuid import uuid4
+
+import feedparser as fp
+
+from podd.artwork import ArtworkCache
+from podd.database import INSERT_EPISODE, Database
+from podd.logger import logger
+from podd.podcast import Episode
+from podd.ratelimit import TokenBucket
+from podd.redirects import RedirectCache
+from podd.settings import Config
+
+# Seconds a claimed job is reserved for its worker, renewed while downloading
+LEASE_SECONDS = 300
+# Failed downloads are retried until they've been attempted this many times
+MAX_ATTEMPTS = 3
+# Feed entry fields needed to recreate an Episode
+ENTRY_FIELDS = (
+    "id",
+    "title",
+    "summary",
+    "links",
+    "image",
+    "published_parsed",
+    "itunes_episode",
+    "itunes_season",
+)
+
+
+def episode_payload(episode: Episode) -> str:
+    """Serialize episode, so it can be downloaded by another process.
+
+    :param episode: Episode
+    :return: JSON string
+    """
+    entry = {key: episode.entry[key] for key in ENTRY_FIELDS if key in episode.entry}
+    if entry.get("published_parsed"):
+        entry["published_parsed"] = list(entry["published_parsed"])
+    return json.dumps(
+        dict(
+            directory=episode._dl_dir,
+            entry=entry,
+            podcast_name=episode.podcast_name,
+            podcast_url=episode.podcast_url,
+            podcast_image=episode.podcast_image,
+            backlog=episode.backlog,
+            known=episode.known,
+            filename=episode.filename,
+            replaces=episode.replaces,
+        )
+    )
+
+
+def episode_from_payload(payload: str) -> Episode:
+    """Recreate episode serialized by `episode_payload`.
+
+    :param payload: JSON string
+    :return: Episode
+    """
+
+    def feedparser_dict(value):
+        if isinstance(value, dict):
+            return fp.FeedParserDict({k: feedparser_dict(v) for k, v in value.items()})
+        if isinstance(value, list):
+            return [feedparser_dict(v) for v in value]
+        return value
+
+    data = json.loads(payload)
+    entry = feedparser_dict(data["entry"])
+    if entry.get("published_parsed"):
+        entry["published_parsed"] = time.struct_time(entry["published_parsed"])
+    episode = Episode(
+        data["directory"],
+        entry,
+        data["podcast_name"],
+        data["podcast_url"],
+        data["podcast_image"],
+    )
+    episode.backlog = data["backlog"]
+    episode.known = tuple(data["known"]) if data["known"] else None
+    if data.get("replaces"):
+        episode.filename = data["filename"]
+        episode.replaces = data["replaces"]
+    return episode
+
+
+class JobQueue(Database):
+    """Persistent queue of episodes to download.
+
+    Jobs are `pending` until a worker claims one, which makes it `leased` until
+    `LEASE_SECONDS` after the worker last renewed it.  A job whose lease expires,
+    e.g., because its worker was killed, can be claimed by another worker.
+    Finished jobs are `done`, and are saved along with their episode in a single
+    transaction, so an episode can't be recorded twice.  Jobs that keep failing,
+    or keep losing their lease, are `failed` after `MAX_ATTEMPTS` attempts, and
+    are retried if they're enqueued again.  Jobs are claimed in the order they were enqueued.
+    """
+
+    def __init__(self, db_file: str = Config.database):
+        """Init method.
+
+        :param db_file: database holding the queue
+        """
+        super().__init__(db_file)
+        # Lets workers read while another one writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+
+    def enqueue(self, episodes: tp.List[Episode]) -> int:
+        """Add episodes to the queue, in download order.
+
+        Episodes that are already queued are left alone, unless they failed, or
+        were done but have since been forgotten, e.g., by `podd reconcile`, or
+        are queued again to replace their file, see `Verifier`.
+        :param episodes: list of Episodes
+        :return: number of jobs added or retried
+        """
+        before = self._conn.total_changes
+        self.cursor.executemany(
+            "INSERT INTO jobs (podcast_id, feed_id, payload) "
+            "SELECT id, ?, ? FROM podcasts WHERE url = ? "
+            "ON CONFLICT (podcast_id, feed_id) DO UPDATE SET state = 'pending', "
+            "payload = excluded.payload, attempts = 0, error = NULL "
+            "WHERE state = 'failed' OR (state = 'done' AND (? OR NOT EXISTS "
+            "(SELECT 1 FROM episodes e WHERE e.podcast_id = jobs.podcast_id "
+            "AND e.feed_id = jobs.feed_id)))",
+            (
+                (
+                    ep.entry.id,
+                    episode_payload(ep),
+                    ep.podcast_url,
+                    ep.replaces is not None,
+                )
+                for ep in episodes
+            ),
+        )
+        self._conn.commit()
+        return self._conn.total_changes - before
+
+    def claim(self, worker: str) -> tp.Tuple[int, str, Episode] or None:
+        """Lease the oldest job that's pending or whose lease expired.
+
+        :param worker: name of worker claiming the job
+        :return: tuple of job id, lease and Episode, or None if there are no jobs
+        """
+        lease, now = f"{worker}:{uuid4().hex}", time.time()
+        self.cursor.execute(
+            "UPDATE jobs SET state = 'failed', lease = NULL, lease_expires = NULL, "
+            "error = COALESCE(error, 'lease expired') "
+            "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, MAX_ATTEMPTS),
+        )
+        self.cursor.execute(
+            "UPDATE jobs SET state = 'leased', lease = ?, lease_expires = ?, "
+            "attempts = attempts + 1 WHERE id = (SELECT id FROM jobs "
+            "WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?) "
+            "ORDER BY id LIMIT 1)",
+            (lease, now + LEASE_SECONDS, now),
+        )
+        self._conn.commit()
+        self.cursor.execute("SELECT id, payload FROM jobs WHERE lease = ?", (lease,))
+        row = self.cursor.fetchone()
+        if row is None:
+            return None
+        return row[0], lease, episode_from_payload(row[1])
+
+    def renew(self, leases: tp.List[str]) -> None:
+        """Extend leases of jobs that are still being worked on.
+
+        :param leases: leases returned by `claim`
+        :return: None
+        """
+        expires = time.time() + LEASE_SECONDS
+        self.cursor.executemany(
+            "UPDATE jobs SET lease_expires = ? WHERE lease = ? AND state = 'leased'",
+            ((expires, lease) for lease in leases),
+        )
+        self._conn.commit()
+
+    def complete(self, job_id: int, lease: str, episode: Episode) -> bool:
+        """Mark job as done and record its episode.
+
+        The record of the episode it replaces, if any, is deleted.
+
+        :param job_id: job id
+        :param lease: lease returned by `claim`
+        :param episode: downloaded Episode
+        :return: False if the lease was lost to another worker
+        """
+        self.cursor.execute(
+            "UPDATE jobs SET state = 'done', lease_expires = NULL "
+            "WHERE id = ? AND lease = ? AND state = 'leased'",
+            (job_id, lease),
+        )
+        if self.cursor.rowcount != 1:
+            self._conn.rollback()
+            return False
+        if episode.replaces:
+            self.cursor.execute(
+                "DELETE FROM episodes WHERE id = ?", (episode.replaces,)
+            )
+        self.cursor.execute(
+            INSERT_EPISODE,
+            dict(
+                podcast_url=episode.podcast_url,
+                feed_id=episode.entry.id,
+                **episode.record(),
+            ),
+        )
+        self.cursor.execute(
+            "DELETE FROM backlog WHERE feed_id = ? AND podcast_id IN"
+            " (SELECT id FROM podcasts p WHERE p.url = ?)",
+            (episode.entry.id, episode.podcast_url),
+        )
+        self._conn.commit()
+        return True
+
+    def fail(self, job_id: int, lease: str, error: str) -> None:
+        """Return job to the queue, or give up on it after `MAX_ATTEMPTS`.
+
+        :param job_id: job id
+        :param lease: lease returned by `claim`
+        :param error: description of the failure
+        :return: None
+        """
+        self.cursor.execute(
+            "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' "
+            "ELSE 'pending' END, lease = NULL, lease_expires = NULL, error = ? "
+            "WHERE id = ? AND lease = ? AND state = 'leased'",
+            (MAX_ATTEMPTS, error, job_id, lease),
+        )
+        self._conn.commit()
+
+    def counts(self) -> tp.Dict[str, int]:
+        """Return number of jobs in each state.
+
+        :return: dict of state to number of jobs
+        """
+        self.cursor.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+        return dict(self.cursor.fetchall())
+
+    def purge(self) -> int:
+        """Delete finished jobs.
+
+        :return: number of jobs deleted
+        """
+        self.cursor.execute("DELETE FROM jobs WHERE state = 'done'")
+        self._conn.commit()
+        return self.cursor.rowcount
+
+
+class Worker:
+    """Download queued episodes until the queue is empty.
+
+    Each thread claims, downloads, tags and records one episode at a time, so
+    any number of workers, in any number of processes, can share a queue.
+    Leases of episodes being downloaded are renewed in the background.
+    """
+
+    def __init__(
+        self,
+        threads: int = 3,
+        limiter: TokenBucket = None,
+        inline_tags: bool = False,
+        db_file: str = Config.database,
+        progress: tp.Callable[[Episode], None] = None,
+    ):
+        """Init method.
+
+        :param threads: number of episodes downloaded at once
+        :param limiter: TokenBucket shared by this worker's threads
+        :param inline_tags: tag mp3 files while downloading them
+        :param db_file: database holding the queue
+        :param progress: called with each episode once its job has been recorded,
+        `error` is set if the download failed
+        """
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.threads = threads
+        self.limiter = limiter
+        self.inline_tags = inline_tags
+        self.db_file = db_file
+        self.progress = progress
+        self.done: tp.List[Episode] = []
+        self.failed: tp.List[Episode] = []
+        self._leases: tp.Set[str] = set()
+        self._lock = Lock()
+        self._stop = Event()
+        self._artwork: ArtworkCache = None
+        self._redirects: RedirectCache = None
+        self._logger = logger(f"{self.__class__.__name__}")
+
+    def __repr__(self):
+        """`repr` method."""
+        return f"{self.__class__.__name__}({self.threads}, {self.db_file})"
+
+    def run(self) -> None:
+        """Work until there are no jobs left.
+
+        :return: None
+        """
+        self._artwork = ArtworkCache()
+        self._redirects = RedirectCache()
+        self._stop.clear()
+        heartbeat = Thread(target=self._renew, daemon=True)
+        heartbeat.start()
+        threads = [Thread(target=self._work) for _ in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self._stop.set()
+        heartbeat.join()
+        self._redirects.save()
+
+    def _work(self) -> None:
+        """Claim and process jobs until the queue is empty."""
+        while True:
+            with JobQueue(self.db_file) as queue:
+                claimed = queue.claim(self.name)
+            if claimed is None:
+                return
+            job_id, lease, episode = claimed
+            with self._lock:
+                self._leases.add(lease)
+            error = "download failed"
+            try:
+                self._process(episode)
+            except Exception as exc:  # Fail the job, rather than the thread
+                self._logger.exception(f"Unable to process {episode.filename}")
+                episode.error = True
+                error = f"{exc.__class__.__name__}: {exc}"
+            finally:
+                with self._lock:
+                    self._leases.discard(lease)
+            with JobQueue(self.db_file) as queue:
+                if episode.error:
+                    queue.fail(job_id, lease, error)
+                    self.failed.append(episode)
+                elif queue.complete(job_id, lease, episode):
+                    self.done.append(episode)
+            if self.progress:
+                self.progress(episode)
+
+    def _process(self, episode: Episode) -> None:
+        """Download, deduplicate and tag episode.
+
+        Replacements are downloaded next to the file they replace, which is only
+        overwritten once the replacement has been downloaded and tagged.
+        """
+        self._logger.info(f"Downloading {episode.podcast_name} - {episode.title}")
+        target = episode.filename
+        if episode.replaces:
+            root, extension = os.path.splitext(target)
+            episode.filename = f"{root}.part{extension}"
+        episode.artwork = self._artwork.path(episode.podcast_image)
+        try:
+            episode.download(self.limiter, self.inline_tags, self._redirects)
+            if not episode.error and episode.sha256:
+                with Database(self.db_file) as _db:
+                    known = _db.get_file_by_hash(episode.sha256, exclude=target)
+                if known:
+                    episode.link(known)
+            episode.tag()
+            if episode.replaces and not episode.error:
+                os.replace(episode.filename, target)
+        finally:
+            if episode.replaces:
+                if episode.filename != target and os.path.exists(episode.filename):
+                    os.remove(episode.filename)
+                episode.filename = target
+
+    def _renew(self) -> None:
+        """Renew leases of jobs in progress until stopped."""
+        while not self._stop.wait(LEASE_SECONDS / 3):
+            with self._lock:
+                leases = list(self._leases)
+            if leases:
+                with JobQueue(self.db_file) as queue:
+                    queue.renew(leases)
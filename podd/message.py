@@ -1,27 +1,56 @@
 """Implement email message functionality."""
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-import smtplib
+from functools import lru_cache
 from typing import List, Tuple
 
-from jinja2 import Environment, PackageLoader, select_autoescape
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    PackageLoader,
+    Template,
+    select_autoescape,
+)
 
+from podd.notify import Notifier
 from podd.podcast import Episode
 from podd.settings import Config
 from podd.logger import logger
 
 
+@lru_cache(maxsize=None)
+def get_template(name: str) -> Template:
+    """Return compiled template.
+
+    Templates are compiled once per process, and the compiled bytecode is cached
+    in `Config.template_cache_directory`, so later runs don't compile them at all.
+    Templates ending in `.txt` get the same autoescaping rendered text emails
+    have always had.
+    :param name: template filename, e.g., `base.html`
+    :return: Template
+    """
+    Config.template_cache_directory.mkdir(parents=True, exist_ok=True)
+    extensions = ["html", "xml"] if not name.endswith(".txt") else [".txt"]
+    env = Environment(
+        loader=PackageLoader("podd", "templates"),
+        autoescape=select_autoescape(extensions),
+        bytecode_cache=FileSystemBytecodeCache(str(Config.template_cache_directory)),
+        auto_reload=False,
+    )
+    return env.get_template(name)
+
+
 class Message:
     """Render and send emails."""
 
     __slots__ = [
         "logger",
         "podcasts",
-        "text",
-        "html",
         "sender",
         "password",
         "recipient",
+        "_html",
+        "_text",
     ]
 
     def __init__(
@@ -41,25 +70,34 @@ class Message:
         self.recipient = recipient
         self.logger = logger(f"{self.__class__.__name__}")
         self.podcasts = podcasts
-        self.text = self.render_text()
-        self.html = self.render_html()
+        self._html: str = None
+        self._text: str = None
 
     def __repr__(self):
         """`repr` method."""
         return f"{self.__class__.__name__}({self.podcasts}, {self.sender}, {self.password}, {self.recipient})"
 
+    @property
+    def html(self) -> str:
+        """Rendered HTML email, rendered on first access."""
+        if self._html is None:
+            self._html = self.render_html()
+        return self._html
+
+    @property
+    def text(self) -> str:
+        """Rendered text email, rendered on first access."""
+        if self._text is None:
+            self._text = self.render_text()
+        return self._text
+
     def render_html(self):
         """Render HTML email.
 
         Uses self.podcasts to render an html page
         :return: rendered html
         """
-        env = Environment(
-            loader=PackageLoader("podd", "templates"),
-            autoescape=select_autoescape(["html", "xml"]),
-        )
-        template = env.get_template("base.html")
-        return template.render(podcasts=self.podcasts)
+        return get_template("base.html").render(podcasts=self.podcasts)
 
     def render_text(self):
         """Render text email.
@@ -67,19 +105,12 @@ class Message:
         Uses self.podcasts to render a text page
         :return: rendered text page
         """
-        env = Environment(
-            loader=PackageLoader("podd", "templates"),
-            autoescape=select_autoescape([".txt"]),
-        )
-        template = env.get_template("base.txt")
-        return template.render(podcasts=self.podcasts)
-
-    def send(self) -> None:
-        """Create and send email message.
-
-        Creates an email using the above rendered html and text, logs into
-        the email server (I'm using Gmail) and sends said email.
-        :return: None
+        return get_template("base.txt").render(podcasts=self.podcasts)
+
+    def mime(self) -> MIMEMultipart:
+        """Create email message.
+
+        :return: multipart message with text and html alternatives
         """
         msg = MIMEMultipart("alternative")
         msg["Subject"] = "Podcast Download Report"
@@ -87,15 +118,19 @@ class Message:
         msg["To"] = self.recipient
         msg.attach(MIMEText(self.text, "plain"))
         msg.attach(MIMEText(self.html, "html"))
-        server = smtplib.SMTP(host=Config.host, port=Config.port)
-        server.starttls()
-        try:
-            server.login(user=self.sender, password=self.password)
-            server.sendmail(self.sender, self.recipient, msg.as_string())
-            server.quit()
-        except smtplib.SMTPAuthenticationError:
-            msg = "Login failed: Username and/or password not accepted"
-            self.logger.exception(msg)
-            print(msg)
-
-        self.logger.info(f"Message sent to {self.recipient}")
+        return msg
+
+    def send(self, notifier: Notifier = None) -> None:
+        """Send email message.
+
+        Queues the message on `notifier`, which delivers it in the background.
+        Without one, a Notifier is started just for this message, and this
+        blocks until it has been sent or spooled.
+        :param notifier: running Notifier
+        :return: None
+        """
+        if notifier is not None:
+            notifier.submit(self.mime())
+            return
+        with Notifier(self.sender, self.password) as notifier:
+            notifier.submit(self.mime())
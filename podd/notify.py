@@ -0,0 +1,217 @@
+"""Send email notifications in the background."""
+
+from email import message_from_binary_file, policy
+from email.message import Message as EmailMessage
+import os
+import pathlib
+from queue import Empty, Queue
+import smtplib
+from threading import Event, Thread
+from time import time
+from uuid import uuid4
+
+from podd.logger import logger
+from podd.settings import Config
+
+# Unsendable messages are spooled after this many attempts
+RETRIES = 3
+# Seconds `close` waits for queued messages to be delivered
+CLOSE_TIMEOUT = 60.0
+
+
+class Notifier:
+    """Deliver email messages from a background thread.
+
+    Messages are queued with `submit` and sent over a single authenticated SMTP
+    connection, which is opened by the delivery thread as soon as the notifier
+    is started, so the handshake happens while downloads run, and is reused for
+    every message after that.  Failed deliveries are retried with a fresh
+    connection, messages that still can't be sent are spooled to disk and sent
+    the next time a Notifier is started.
+    """
+
+    def __init__(
+        self,
+        sender: str,
+        password: str,
+        host: str = Config.host,
+        port: int = Config.port,
+        starttls: bool = True,
+        spool: pathlib.Path = Config.spool_directory,
+        retries: int = RETRIES,
+        backoff: float = 2.0,
+    ):
+        """Init method.
+
+        :param sender: address to log in with
+        :param password: password to log in with, if None, doesn't log in
+        :param host: SMTP server
+        :param port: SMTP port
+        :param starttls: whether to upgrade the connection with STARTTLS
+        :param spool: directory to keep unsent messages in
+        :param retries: delivery attempts before a message is spooled
+        :param backoff: seconds to wait before the first retry, doubles each retry
+        """
+        self.sender = sender
+        self.password = password
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.spool = pathlib.Path(spool)
+        self.retries = retries
+        self.backoff = backoff
+        self.sent = 0
+        self.spooled = 0
+        self._queue = Queue()
+        self._server: smtplib.SMTP = None
+        self._idle = False  # Connection was opened in advance and may have timed out
+        self._stop = Event()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._logger = logger(f"{self.__class__.__name__}")
+
+    def __enter__(self):
+        """Context method, starts notifier."""
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context method, sends queued messages and stops notifier."""
+        self.close()
+
+    def __repr__(self):
+        """`repr` method."""
+        return f"{self.__class__.__name__}({self.sender}, {self.host}, {self.port})"
+
+    def start(self) -> "Notifier":
+        """Start delivery thread and queue previously spooled messages.
+
+        :return: self
+        """
+        self.spool.mkdir(parents=True, exist_ok=True)
+        for path in sorted(self.spool.glob("*.eml")):
+            with open(path, "rb") as file:
+                message = message_from_binary_file(file, policy=policy.SMTP)
+            self._queue.put((message, path))
+        self._thread.start()
+        return self
+
+    def submit(self, message: EmailMessage) -> None:
+        """Queue message for delivery.
+
+        :param message: email message, with `From` and `To` headers set
+        :return: None
+        """
+        self._queue.put((message, None))
+
+    def close(self, timeout: float = CLOSE_TIMEOUT) -> None:
+        """Wait for queued messages to be delivered or spooled, then disconnect.
+
+        Once `timeout` runs out, pending retries are abandoned and messages that
+        are still queued are spooled, to be sent next time.
+        :param timeout: max seconds to wait, None to wait until every message is
+        delivered or spooled
+        :return: None
+        """
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            return
+        self._stop.set()
+        self._logger.warning(f"Delivery took over {timeout} seconds, spooling queue")
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except Empty:
+                break
+            if item is not None and not item[1]:
+                self._spool(item[0])
+        self._queue.put(None)
+
+    def _run(self) -> None:
+        """Deliver queued messages until `close` is called."""
+        try:
+            self._connect()
+            self._idle = True
+        except (smtplib.SMTPException, OSError):
+            self._logger.exception("Unable to connect, retrying on delivery")
+            self._disconnect()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            message, spooled = item
+            if self._deliver(message):
+                self.sent += 1
+                if spooled:
+                    try:
+                        os.remove(spooled)
+                    except OSError:
+                        self._logger.exception(f"Unable to remove {spooled}")
+            elif not spooled:
+                self._spool(message)
+        self._disconnect()
+
+    def _deliver(self, message: EmailMessage) -> bool:
+        """Send message, reconnecting and retrying on failure.
+
+        :return: True if message was sent
+        """
+        delay = self.backoff
+        for attempt in range(1, self.retries + 1):
+            try:
+                self._connect().send_message(message)
+                self._logger.info(f"Message sent to {message['To']}")
+                return True
+            except smtplib.SMTPAuthenticationError:
+                msg = "Login failed: Username and/or password not accepted"
+                self._logger.exception(msg)
+                print(msg)
+                return False
+            except (smtplib.SMTPException, OSError):
+                self._logger.exception(f"Delivery attempt {attempt} failed")
+                self._disconnect()
+                if attempt < self.retries:
+                    if self._stop.wait(delay):
+                        break
+                    delay *= 2
+        return False
+
+    def _connect(self) -> smtplib.SMTP:
+        """Return open SMTP connection, opening and logging in if needed."""
+        if self._idle:
+            self._idle = False
+            try:
+                self._server.noop()
+            except (smtplib.SMTPException, OSError):
+                self._disconnect()  # Server hung up while downloads ran
+        if self._server is None:
+            server = smtplib.SMTP(host=self.host, port=self.port, timeout=30)
+            if self.starttls:
+                server.starttls()
+            if self.password:
+                server.login(user=self.sender, password=self.password)
+            self._server = server
+        return self._server
+
+    def _disconnect(self) -> None:
+        """Close SMTP connection, if open."""
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+    def _spool(self, message: EmailMessage) -> None:
+        """Save undeliverable message, to be sent next time."""
+        path = self.spool / f"{int(time())}-{uuid4().hex}.eml"
+        try:
+            path.write_bytes(message.as_bytes())
+        except OSError:
+            msg = f"Unable to send message to {message['To']}, or save it to {path}"
+            self._logger.exception(msg)
+            print(msg)
+            return
+        self.spooled += 1
+        msg = f"Unable to send message to {message['To']}, saved to {path}"
+        self._logger.warning(msg)
+        print(msg)
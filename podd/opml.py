@@ -0,0 +1,52 @@
+"""Read and write subscription lists."""
+
+import typing as tp
+from xml.etree import ElementTree as ET
+
+
+def read_feed_list(filename: str) -> tp.List[str]:
+    """Read RSS feed URLs from a file.
+
+    The file can either be an OPML document, as exported by most podcatchers, or
+    a plain text file with a single URL per line.
+    :param filename: path to file
+    :return: list of RSS feed URLs, in file order, without duplicates
+    """
+    with open(filename, "rb") as file:
+        content = file.read()
+    if content.lstrip().startswith(b"<"):
+        urls = read_opml(content)
+    else:
+        urls = [l.strip() for l in content.decode().splitlines() if l.strip()]
+    return list(dict.fromkeys(urls))
+
+
+def read_opml(content: bytes) -> tp.List[str]:
+    """Parse RSS feed URLs out of an OPML document.
+
+    :param content: OPML document
+    :return: list of the `xmlUrl` attributes of every outline element
+    """
+    root = ET.fromstring(content)
+    return [
+        outline.get("xmlUrl").strip()
+        for outline in root.iter("outline")
+        if outline.get("xmlUrl")
+    ]
+
+
+def write_opml(podcasts: tp.List[tuple], filename: str) -> None:
+    """Write subscriptions to an OPML document.
+
+    :param podcasts: list of tuples of podcast name, url and download directory,
+    as returned by `Database.get_podcasts`
+    :param filename: path to file
+    :return: None
+    """
+    root = ET.Element("opml", version="2.0")
+    head = ET.SubElement(root, "head")
+    ET.SubElement(head, "title").text = "Podd subscriptions"
+    body = ET.SubElement(root, "body")
+    for name, url, _ in podcasts:
+        ET.SubElement(body, "outline", type="rss", text=name, title=name, xmlUrl=url)
+    ET.ElementTree(root).write(filename, encoding="utf-8", xml_declaration=True)
@@ -1,27 +1,32 @@
 """Define podcast & episode objects."""
 
+from hashlib import sha256
 from http import client
+import os
 from os import path
-import re
+import shutil
 from ssl import CertificateError
+from time import gmtime
 import typing as tp
 from urllib.error import HTTPError, URLError
 
 import feedparser as fp
-import mutagen
-from mutagen.easyid3 import EasyID3
-from mutagen.id3 import ID3NoHeaderError
-from mutagen.mp4 import MP4
-from requests import get
-from requests.exceptions import ConnectionError
+from requests import Response, get
+from requests.exceptions import RequestException
 
 from podd.database import Database
+from podd.fetch import enclosure, timestamp
 from podd.logger import logger
-from podd.utilities import compile_regex
+from podd.ratelimit import TokenBucket
+from podd.redirects import RedirectCache
+from podd.seen import seen_ids
+from podd.settings import Config
+from podd.tagging import InlineID3, TagJob, id3_tags, tag_file
+from podd.utilities import EpisodeNumber, episode_number
 
 # Some podcast feeds send a silly amount of headers, crashing downloader func. Default is 100
 client._MAXHEADERS = 1000
-PATTERNS: tp.List[re.compile] = compile_regex()
+CHUNK_SIZE = 64 * 1024
 
 
 class Podcast:
@@ -37,6 +42,7 @@ class Podcast:
     __slots__ = [
         "_url",
         "_dl_dir",
+        "_database",
         "_logger",
         "_name",
         "_image",
@@ -44,26 +50,53 @@ class Podcast:
         "episodes",
     ]
 
-    def __init__(self, url: str, directory: str):
+    def __init__(
+        self,
+        url: str,
+        directory: str,
+        backlog_budget: tp.Tuple[int, int] = (0, 0),
+        database: str = Config.database,
+        feed: fp.FeedParserDict = None,
+        read_only: bool = False,
+    ):
         """init method.
 
         :param url: rss feed url for this podcast
         :param directory: download directory for this podcast
+        :param backlog_budget: max back catalog episodes and bytes to download this
+        run, 0 meaning unlimited
+        :param database: database holding this podcast
+        :param feed: parsed rss feed, if it's already been fetched, e.g., for
+        another profile subscribed to the same feed
+        :param read_only: write nothing, not even the filters of `SeenIds`, see
+        `podd replay`
         """
         self._url = url
         self._dl_dir = directory
+        self._database = database
         self._logger = logger(f"{self.__class__.__name__}")
         self.episodes: tp.List[Episode] = []
-        _old_eps = Database().get_episodes(self._url)
-        _feed: fp.FeedParserDict = fp.parse(self._url)
+        with Database(self._database) as _db:
+            _backlog = _db.get_backlog(self._url)
+        _feed: fp.FeedParserDict = feed if feed is not None else fp.parse(self._url)
         self._name = _feed.feed.get("title", default=self._url)
         try:
             self._image = _feed.feed.image.href
         except (KeyError, AttributeError):
             self._logger.exception(f"No image for {self._url}")
             self._image = None
+        _old_eps = seen_ids(self._database, read_only).known(
+            self._url, [item.id for item in _feed.entries]
+        )
         self._new_entries = [item for item in _feed.entries if item.id not in _old_eps]
         self._episode_parser()
+        if self.episodes:
+            with Database(self._database) as _db:
+                _known = _db.get_files([ep.url for ep in self.episodes])
+            for episode in self.episodes:
+                episode.known = _known.get(episode.url)
+        if _backlog:
+            self._limit_backlog(_backlog, *backlog_budget)
 
     def __enter__(self):
         """Context method."""
@@ -86,7 +119,7 @@ class Podcast:
         """Create Episodes from feedparser entries."""
         if self._new_entries:
             self.episodes = [
-                Episode(self._dl_dir, entry, self._name, self._url)
+                Episode(self._dl_dir, entry, self._name, self._url, self._image)
                 for entry in self._new_entries
             ]
             plural = "" if len(self.episodes) == 1 else "s"
@@ -96,6 +129,47 @@ class Podcast:
         else:
             self._logger.debug(f"No episodes for {self._name}")
 
+    def _limit_backlog(self, backlog: set, max_episodes: int, max_bytes: int) -> None:
+        """Limit how many back catalog episodes are downloaded this run.
+
+        Episodes put in the backlog by `podd add --catalog` are drained newest
+        first, at most `max_episodes` episodes and `max_bytes` bytes per run, 0
+        meaning unlimited.  At least one backlog episode is let through per run, so
+        an episode larger than `max_bytes` can't stall the catalog forever.
+        :param backlog: set of feed ids in this podcast's backlog
+        :param max_episodes: max backlog episodes to download this run
+        :param max_bytes: max backlog bytes to download this run
+        :return: None
+        """
+        fresh, held = [], []
+        for episode in self.episodes:
+            episode.backlog = episode.entry.id in backlog
+            (held if episode.backlog else fresh).append(episode)
+        held.sort(key=lambda ep: tuple(ep.published or ()), reverse=True)
+        allowed, total = [], 0
+        for episode in held:
+            size = episode.length or 0
+            if max_episodes and len(allowed) >= max_episodes:
+                break
+            if max_bytes and allowed and total + size > max_bytes:
+                break
+            allowed.append(episode)
+            total += size
+        self.episodes = fresh + allowed
+        self._logger.debug(
+            f"{len(allowed)} of {len(held)} backlog episodes of {self._name} this run"
+        )
+
+    @property
+    def name(self) -> str:
+        """Podcast title, or feed url if the feed has no title."""
+        return self._name
+
+    @property
+    def url(self) -> str:
+        """Rss feed url."""
+        return self._url
+
     @property
     def good_episodes(self):
         """Obtain which episodes were successfully downloaded."""
@@ -126,8 +200,18 @@ class Episode:
         "summary",
         "image",
         "url",
+        "length",
+        "published",
         "filename",
         "error",
+        "backlog",
+        "tagged",
+        "podcast_image",
+        "artwork",
+        "number",
+        "known",
+        "sha256",
+        "replaces",
     ]
 
     def __init__(
@@ -136,25 +220,38 @@ class Episode:
         entry: fp.FeedParserDict,
         podcast_name: str,
         podcast_url: str,
+        podcast_image: str = None,
     ):
         """`init` method.
 
         :param directory: download directory
         :param entry: single FeedParserDict from fp.parse(url).entries list
         :param podcast_name:
+        :param podcast_image: URL of podcast artwork, embedded as cover art
         """
         self._dl_dir = directory
         self.error: bool = None
+        self.backlog = False
+        self.tagged = False
         self.entry = entry
         self.podcast_name = podcast_name
         self._logger = logger(f"{self.__class__.__name__}")
         self.podcast_url = podcast_url
+        self.podcast_image = podcast_image
+        self.artwork: str = None  # Local copy of podcast_image, see `ArtworkCache`
+        # Location and hash of a previous download of the same URL, see `link`
+        self.known: tp.Tuple[str, str] = None
+        self.sha256: str = None
+        # Id of a recorded episode whose file this download replaces, see `Verifier`
+        self.replaces: int = None
         self.title = self.entry.get("title", "No title available.").replace(
             "/", "-"
         )  # '/' screws up filenames
         self.summary = self.entry.get("summary", "No summary available.")
         self.image = self._image_url()
-        self.url = self._audio_file_url()
+        self.url, self.length = enclosure(self.entry)
+        self.published = self.entry.get("published_parsed")
+        self.number: EpisodeNumber = episode_number(self.title, self.entry)
         self.filename = self._file_parser()
 
     def __repr__(self):
@@ -167,58 +264,212 @@ class Episode:
     def __str__(self):
         return f"<Episode {self.title}>"
 
-    def download(self) -> None:
+    def download(
+        self,
+        limiter: TokenBucket = None,
+        inline_tags: bool = False,
+        redirects: RedirectCache = None,
+    ) -> None:
         """Download episode.
 
-        Attempts to download episode
+        Attempts to download episode, unless the same URL has been downloaded
+        before, in which case that file is linked instead.  The content hash of
+        the file as served is computed while it's being written.
+        :param limiter: TokenBucket shared by all download workers, if bandwidth
+        is limited
+        :param inline_tags: if set, mp3 files are tagged while they are written,
+        see `InlineID3`
+        :param redirects: RedirectCache shared by all download workers, known
+        redirects of the episode's URL are skipped
         :return: None
         """
+        if self.known and self.link(*self.known):
+            return
         try:
-            resp = get(self.url, stream=True)
+            resp = self._request(redirects)
             if resp.ok:
+                digest = sha256()
+                chunks = self._throttle(resp.iter_content(CHUNK_SIZE), limiter)
+                chunks = self._hash(chunks, digest)
+                inline = None
+                if inline_tags and self.filename.endswith(".mp3"):
+                    inline = InlineID3(
+                        id3_tags(
+                            self.title,
+                            self.podcast_name,
+                            *self.number,
+                            artwork=self.artwork,
+                        )
+                    )
+                    chunks = inline.stream(chunks)
                 with open(self.filename, "wb") as file:
-                    for chunk in resp:
+                    for chunk in chunks:
                         file.write(chunk)
-            self._logger.info(f"Downloaded {self.filename}")
+                self.sha256 = digest.hexdigest()
+                if inline and inline.tagged:
+                    self.tagged = True
+                    self._logger.info(f"Tagged {self.filename} while downloading")
+                self._logger.info(f"Downloaded {self.filename}")
+            else:
+                msg = (
+                    f"Error {resp.status_code} URL: {self.url} "
+                    f"Filename: {self.filename}"
+                )
+                self._logger.error(msg)
+                self.error = True
         except FileNotFoundError:
             msg = f"Unable to open file or directory at {self.filename}."
             self._logger.exception(msg)
             self.error = True
-            print(msg)
         except (
             ConnectionRefusedError,
             HTTPError,
             URLError,
             CertificateError,
-            ConnectionError,
+            RequestException,
         ) as error:
             msg = f"Error {error} URL: {self.url} Filename: {self.filename}"
             self._logger.exception(msg)
             self.error = True
-            print(msg)
+
+    def _request(self, redirects: RedirectCache = None) -> Response:
+        """Request audio file, going straight to its known redirect target.
+
+        If the target fails, the cached redirects are forgotten and the
+        episode's URL is requested instead, and its redirects learned again.
+        :param redirects: RedirectCache, if any
+        :return: streamed Response
+        """
+        target = redirects.resolve(self.url) if redirects is not None else self.url
+        if target != self.url:
+            try:
+                resp = get(target, stream=True)
+                if resp.ok:
+                    return resp
+                resp.close()
+            except RequestException:
+                pass
+            self._logger.info(f"Redirect target {target} of {self.url} failed")
+            redirects.forget(self.url)
+        resp = get(self.url, stream=True)
+        if redirects is not None and resp.history:
+            redirects.learn([hop.url for hop in resp.history] + [resp.url])
+        return resp
 
     def tag(self) -> None:
         """Tag downloaded file with metadata.
 
-        Uses mutagen's File class to try to discover what type of audio file
-        is being tagged, then uses either mp3 or mp4 tagger on file, if type
-        is either mp3 or mp4.  Otherwise, passes
+        Tags in the calling thread, `threaded_downloader` hands tagging jobs to
+        a process pool instead.  See `tag_file`.
         :return: None
         """
-        if self.error:
-            return
+        job = self.tag_job()
+        if job:
+            self.tag_result(tag_file(job))
+
+    def tag_job(self) -> TagJob or None:
+        """Create tagging job, so tagging can be done by a separate process.
+
+        :return: TagJob, or None if there is nothing to tag
+        """
+        if self.error or self.tagged:
+            return None
+        return TagJob(
+            self.filename,
+            self.title,
+            self.podcast_name,
+            self.number.episode,
+            self.artwork,
+            self.number.season,
+        )
+
+    def tag_result(self, failure: str or None) -> None:
+        """Record outcome of tagging job.
+
+        :param failure: None if tagged, otherwise kind of failure, see `tag_file`
+        :return: None
+        """
+        if failure:
+            self._logger.warning(f"Unable to tag {self.filename}: {failure}")
+        else:
+            self.tagged = True
+            self._logger.info(f"Tagged {self.filename}")
+
+    @staticmethod
+    def _throttle(
+        chunks: tp.Iterable[bytes], limiter: TokenBucket = None
+    ) -> tp.Iterator[bytes]:
+        """Yield chunks no faster than `limiter` allows."""
+        for chunk in chunks:
+            if limiter:
+                limiter.consume(len(chunk))
+            yield chunk
+
+    @staticmethod
+    def _hash(chunks: tp.Iterable[bytes], digest) -> tp.Iterator[bytes]:
+        """Yield chunks, updating `digest` with each one."""
+        for chunk in chunks:
+            digest.update(chunk)
+            yield chunk
+
+    def link(self, source: str, digest: str = None) -> bool:
+        """Use an identical, previously downloaded file instead of this download.
+
+        Files of the same podcast are hard-linked, replacing `self.filename` if it
+        exists.  Both names share the same file from then on, so the episode is
+        marked as tagged, keeping `source`'s tags.  Files of other podcasts carry
+        that podcast's tags, so they're copied instead, breaking any link left by
+        older versions, and the copy is tagged.
+        :param source: location of identical file
+        :param digest: hex digest of `source`, if known
+        :return: True if `self.filename` is now `source`, or a copy of it
+        """
+        if not path.exists(source):
+            return False
+        shared = path.dirname(source) == path.dirname(self.filename)
         try:
-            filetype = mutagen.File(self.filename).pprint()
-            if "mp3" in filetype:
-                self._mp3_tagger()
-            elif "mp4" in filetype:
-                self._mp4_tagger()
-            else:
-                self._logger.warning(
-                    f"Unable to determine filetype for {self.filename}, cannot tag"
-                )
-        except (AttributeError, mutagen.MutagenError):
-            self._logger.exception(f"Unable to tag {self.filename}")
+            if not (
+                shared
+                and path.exists(self.filename)
+                and path.samefile(source, self.filename)
+            ):
+                temp = f"{self.filename}.link"
+                if path.exists(temp):
+                    os.remove(temp)
+                if shared:
+                    os.link(source, temp)
+                else:
+                    shutil.copyfile(source, temp)
+                os.replace(temp, self.filename)
+        except OSError:  # e.g., different file systems
+            self._logger.exception(f"Unable to link {source} to {self.filename}")
+            return False
+        self.sha256 = digest or self.sha256
+        if shared:
+            self.tagged = True
+            self._logger.info(f"Linked {self.filename} to identical {source}")
+        else:
+            self.tagged = False
+            self._logger.info(f"Copied identical {source} to {self.filename}")
+        return True
+
+    def record(self) -> dict:
+        """Return catalog metadata to be saved along with the episode.
+
+        :return: dict of keyword arguments for `Database.add_episode`
+        """
+        size = path.getsize(self.filename) if path.exists(self.filename) else None
+        return dict(
+            title=self.title,
+            summary=self.summary,
+            published=timestamp(self.published),
+            url=self.url,
+            length=self.length,
+            size=size,
+            path=self.filename,
+            downloaded=timestamp(gmtime()),
+            sha256=self.sha256,
+        )
 
     def _image_url(self):
         """Parse image url.
@@ -237,18 +488,6 @@ class Episode:
             )
         return image
 
-    def _audio_file_url(self) -> str:
-        """Parse audio file url.
-
-        :return: link for episode's audio file URL.
-        """
-        url = None
-        for link in self.entry.links:
-            if "audio/" in link.type:
-                url = link.href
-                break
-        return url
-
     def _file_parser(self) -> path:
         """Create absolute filename.
 
@@ -265,59 +504,3 @@ class Episode:
             f"Unable to determine extension for {self.url}, defaulting to `.mp3`"
         )
         return path.join(self._dl_dir, "".join([self.title, ".mp3"]))
-
-    def _mp3_tagger(self) -> None:
-        """Tag mp3 files.
-
-        Uses mutagen to write tags to mp3 file
-        :return: None
-        """
-        try:
-            tag = EasyID3(self.filename)
-        except ID3NoHeaderError:
-            self._logger.info(f"Adding header to {self.filename}")
-            tag = mutagen.File(self.filename, easy=True)
-            tag.add_tags()
-
-        ep_num = self._episode_num_parser()
-        tag["title"] = self.title
-        tag["artist"] = self.podcast_name
-        tag["album"] = self.podcast_name
-        tag["albumartist"] = self.podcast_name
-        tag["genre"] = "Podcast"
-        if ep_num:
-            tag["tracknumber"] = ep_num
-        tag.save(self.filename)
-        self._logger.info(f"Tagged {self.filename}")
-
-    def _mp4_tagger(self) -> None:
-        """Tag mp4 files.
-
-        Per https://mutagen.readthedocs.io/en/latest/api/mp4.html#mutagen.mp4.MP4Tags,
-        track numbers are tuples of ints, first being track number, the second is
-        the total number of tracks, e.g.,  Album X has 10 tracks, we want to tag the
-        3rd track, so `tag['trkn'] = (3, 10)`, the weird syntax is because mutagen
-        supports multiple keys per track number.  I wish the documentation was
-        clearer.  One was chosen as the track count as I had to choose some number:
-        leaving it blank isn't an option.
-
-        :return: None
-        """
-        ep_num = self._episode_num_parser()
-        tag = MP4(self.filename).tags
-        tag["\xa9nam"] = self.title
-        tag["\xa9ART"] = self.podcast_name  # Artist
-        tag["\xa9alb"] = self.podcast_name  # Album
-        tag["aART"] = self.podcast_name  # Album artist
-        tag["\xa9gen"] = "Podcast"  # Genre
-        if ep_num:
-            tag['trkn'] = (ep_num, 1),  # I know this is weird: see docstring
-        tag.save(self.filename)
-        self._logger.info(f"Tagged {self.filename}")
-
-    def _episode_num_parser(self) -> str or None:
-        """Attempt to parse episode number from title."""
-        for pattern in PATTERNS:
-            match = pattern.search(self.title)
-            if match:
-                return match.groups()[0]
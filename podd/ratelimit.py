@@ -0,0 +1,105 @@
+"""Implement a bandwidth limiter shared by download workers."""
+
+from datetime import datetime, time
+from threading import Lock
+from time import monotonic, sleep
+import typing as tp
+
+UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+
+def parse_rate(rate: str) -> int:
+    """Convert human readable rate into bytes per second.
+
+    Accepts plain integers or numbers suffixed with k, m or g, e.g., `500k`, `2M`.
+    :param rate: rate string
+    :return: bytes per second, 0 meaning unlimited
+    """
+    rate = rate.strip().lower()
+    if rate.endswith("/s"):
+        rate = rate[:-2]
+    if rate.endswith("b"):
+        rate = rate[:-1]
+    unit = rate[-1] if rate and rate[-1] in "kmg" else ""
+    value = int(float(rate[: len(rate) - len(unit)]) * UNITS[unit])
+    if value < 0:
+        raise ValueError(f"Negative rate {rate}")
+    return value
+
+
+def parse_schedule(schedule: str) -> tp.List[tp.Tuple[time, time, int]]:
+    """Parse time-of-day schedule.
+
+    A schedule is a comma separated list of `HH:MM-HH:MM=RATE` windows, e.g.,
+    `09:00-17:00=500k,22:00-06:00=0`.  Windows may wrap around midnight. A rate of
+    0 means unlimited.
+    :param schedule: schedule string
+    :return: list of tuples of window start, window end and bytes per second
+    """
+    windows = []
+    for window in filter(None, (w.strip() for w in schedule.split(","))):
+        span, rate = window.split("=")
+        start, end = (time.fromisoformat(t.strip()) for t in span.split("-"))
+        windows.append((start, end, parse_rate(rate)))
+    return windows
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    Every download worker calls `consume` with the number of bytes it just read,
+    and is put to sleep long enough to keep the aggregate throughput of all workers
+    at `rate` bytes per second.  Bursts of up to one second's worth of bytes are
+    allowed.
+    """
+
+    def __init__(self, rate: int, schedule: str = ""):
+        """Init method.
+
+        :param rate: default bytes per second, 0 meaning unlimited
+        :param schedule: time-of-day schedule that overrides `rate`, see
+        `parse_schedule`
+        """
+        self.rate = rate
+        self.schedule = parse_schedule(schedule)
+        self._lock = Lock()
+        self._tokens = float(rate)
+        self._last = monotonic()
+
+    def __repr__(self):
+        """`repr` method."""
+        return f"{self.__class__.__name__}({self.rate}, {self.schedule})"
+
+    def current_rate(self, now: datetime = None) -> int:
+        """Return rate in effect at `now`.
+
+        :param now: defaults to the current local time
+        :return: bytes per second, 0 meaning unlimited
+        """
+        moment = (now or datetime.now()).time()
+        for start, end, rate in self.schedule:
+            if start <= end and start <= moment < end:
+                return rate
+            if start > end and (moment >= start or moment < end):
+                return rate
+        return self.rate
+
+    def consume(self, amount: int) -> None:
+        """Take `amount` tokens, sleeping if the bucket is in debt.
+
+        Tokens are reserved while holding the lock, sleeping happens outside of
+        it so workers don't serialize on each other.
+        :param amount: number of bytes transferred
+        :return: None
+        """
+        rate = self.current_rate()
+        if not rate:
+            return
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(rate, self._tokens + (now - self._last) * rate)
+            self._last = now
+            self._tokens -= amount
+            wait = -self._tokens / rate if self._tokens < 0 else 0
+        if wait:
+            sleep(wait)
@@ -0,0 +1,215 @@
+"""Reconcile podcast directories with the episodes table."""
+
+from multiprocessing.dummy import Pool as ThreadPool
+import os
+from os import path
+from time import gmtime
+import typing as tp
+
+from podd.database import Database
+from podd.fetch import enclosure, fetch_feed, timestamp
+from podd.logger import logger
+from podd.podcast import Episode
+from podd.settings import Config
+from podd.utilities import batches
+
+
+class Reconciliation(tp.NamedTuple):
+    """Outcome of a reconciliation, each field is a list of file locations."""
+
+    recorded: tp.List[str]  # Files that weren't recorded, now are
+    backfilled: tp.List[str]  # Files of episodes recorded without a location
+    missing: tp.List[str]  # Recorded files that are gone
+    truncated: tp.List[str]  # Recorded files smaller than when they were recorded
+    unknown: tp.List[str]  # Audio files that don't belong to any feed entry
+    unavailable: tp.List[str]  # Directories that couldn't be read
+
+
+class Reconciler:
+    """Bring the episodes table back in line with what's on disk.
+
+    Every podcast directory is indexed once with `os.scandir`, after which every
+    check is a dict lookup, so no file is looked at more than once.  Files are
+    matched against recorded locations and, unless `feeds` is False, against the
+    filename each feed entry would be downloaded to.
+    """
+
+    def __init__(
+        self,
+        feeds: bool = True,
+        redownload: bool = False,
+        delete: bool = False,
+        threads: int = 8,
+        db_file: str = Config.database,
+    ):
+        """Init method.
+
+        :param feeds: fetch feeds to match unrecorded files to feed entries
+        :param redownload: forget episodes whose files are missing, so they're
+        downloaded again, rather than just clearing their location
+        :param delete: delete truncated files, rather than leaving them for the
+        next download to replace
+        :param threads: number of feeds to fetch at once
+        :param db_file: database to reconcile
+        """
+        self.feeds = feeds
+        self.redownload = redownload
+        self.delete = delete
+        self.threads = threads
+        self.db_file = db_file
+        self._logger = logger(f"{self.__class__.__name__}")
+
+    def __repr__(self):
+        """`repr` method."""
+        return (
+            f"{self.__class__.__name__}({self.feeds}, {self.redownload}, "
+            f"{self.delete}, {self.threads})"
+        )
+
+    @staticmethod
+    def scan(directories: tp.Iterable[str]) -> tp.Tuple[dict, list]:
+        """Index files in directories.
+
+        :param directories: directories to index, subdirectories aren't
+        :return: tuple of dict of file location to tuple of size and modification
+        time, and list of directories that couldn't be read
+        """
+        index, unavailable = {}, []
+        for directory in directories:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            index[entry.path] = stat.st_size, stat.st_mtime
+            except OSError:
+                unavailable.append(directory)
+        return index, unavailable
+
+    def run(self, dry_run: bool = False) -> Reconciliation:
+        """Compare podcast directories with the database and fix the database.
+
+        Recorded files that are gone have their location cleared, or are
+        forgotten if `redownload` is set.  Truncated files are forgotten, so the
+        next download overwrites them, and are kept until then, unless `delete`
+        is set, as tag editors shrink files too.  Files matching a feed entry are
+        recorded whatever their size, as feeds often get the length wrong, see
+        `check_file`.  Changes are saved in batches.
+        :param dry_run: only report what would be changed
+        :return: Reconciliation
+        """
+        with Database(self.db_file) as _db:
+            podcasts = _db.get_podcasts()
+            records = _db.get_episode_files()
+        directories = {directory for _, _, directory in podcasts}
+        directories.update(path.dirname(row[3]) for row in records if row[3])
+        index, unavailable = self.scan(sorted(directories))
+        unreadable = set(unavailable)
+
+        updates, cleared, forget, missing, truncated = {}, set(), set(), {}, []
+        claimed = set()
+        for ep_id, _, _, location, size in records:
+            if not location or path.dirname(location) in unreadable:
+                continue
+            on_disk = index.get(location)
+            if on_disk is None:
+                missing[ep_id] = location
+                if self.redownload:
+                    forget.add(ep_id)
+                else:
+                    cleared.add(ep_id)
+            elif size and on_disk[0] < size:
+                truncated.append(location)
+                forget.add(ep_id)
+                del index[location]
+            else:
+                claimed.add(location)
+
+        recorded, backfilled = [], []
+        if self.feeds and podcasts:
+            known = {
+                (url, feed_id): (ep_id, loc) for ep_id, url, feed_id, loc, _ in records
+            }
+            for (name, url, directory), entry in self._entries(podcasts):
+                episode = Episode(directory, entry, name, url)
+                on_disk = index.get(episode.filename)
+                if on_disk is None or episode.filename in claimed:
+                    continue
+                ep_id, location = known.get((url, entry.id), (None, None))
+                if location in claimed:
+                    continue  # Recorded under another name
+                claimed.add(episode.filename)
+                record = episode.record()
+                record["downloaded"] = timestamp(gmtime(on_disk[1]))
+                if ep_id is None:
+                    recorded.append(dict(record, podcast_url=url, feed_id=entry.id))
+                else:
+                    missing.pop(ep_id, None)
+                    forget.discard(ep_id)
+                    cleared.discard(ep_id)
+                    updates[ep_id] = dict(record, id=ep_id)
+                    backfilled.append(episode.filename)
+
+        unknown = sorted(
+            location
+            for location in index
+            if location not in claimed
+            and path.splitext(location)[1].lower() in Episode.types
+        )
+        report = Reconciliation(
+            recorded=[record["path"] for record in recorded],
+            backfilled=backfilled,
+            missing=sorted(missing.values()),
+            truncated=truncated,
+            unknown=unknown,
+            unavailable=unavailable,
+        )
+        if not dry_run:
+            self._apply(
+                list(updates.values()), sorted(cleared), recorded, sorted(forget)
+            )
+            if self.delete:
+                self._delete(truncated)
+        return report
+
+    def _entries(
+        self, podcasts: tp.List[tp.Tuple[str, str, str]]
+    ) -> tp.Iterator[tp.Tuple[tuple, tp.Any]]:
+        """Fetch feeds concurrently, yield each podcast along with each entry."""
+        pool = ThreadPool(self.threads)
+        feeds = pool.map(fetch_feed, [url for _, url, _ in podcasts])
+        pool.close()
+        pool.join()
+        for podcast, feed in zip(podcasts, feeds):
+            if feed.get("bozo") and not feed.entries:
+                self._logger.warning(f"Unable to fetch {podcast[1]}")
+            for entry in feed.entries:
+                if "id" in entry and enclosure(entry)[0]:
+                    yield podcast, entry
+
+    def _delete(self, truncated: list) -> None:
+        """Delete truncated files."""
+        for location in truncated:
+            try:
+                os.remove(location)
+                self._logger.info(f"Deleted truncated file {location}")
+            except OSError:
+                self._logger.exception(f"Unable to delete {location}")
+
+    def _apply(
+        self, updates: list, cleared: list, recorded: list, forget: list
+    ) -> None:
+        """Save changes in batches."""
+        with Database(self.db_file) as _db:
+            for batch in batches(updates):
+                _db.set_episode_files(batch)
+            for batch in batches(cleared):
+                _db.clear_episode_files(batch)
+            for batch in batches(recorded):
+                _db.add_episode_records(batch)
+            for batch in batches(forget):
+                _db.forget_episodes(batch)
+        self._logger.info(
+            f"Updated {len(updates)}, cleared {len(cleared)}, recorded {len(recorded)} "
+            f"and forgot {len(forget)} episodes"
+        )
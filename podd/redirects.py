@@ -0,0 +1,167 @@
+"""Implement cache of enclosure redirects.
+
+Most enclosure URLs go through tracking redirects before reaching the CDN,
+each costing a round trip and often a TLS handshake.  Many trackers embed
+the next URL in their own, e.g., `https://dts.podtrac.com/redirect.mp3/cdn.com/1.mp3`
+redirects to `https://cdn.com/1.mp3`.  Once such a redirect is seen, its
+prefix is remembered, and URLs of later episodes starting with it go straight
+to the embedded URL.
+"""
+
+import json
+import os
+import pathlib
+from threading import Lock
+import time
+import typing as tp
+
+from podd.logger import logger
+from podd.settings import Config
+
+# Seconds a resolved URL is used for, CDN URLs are often signed and expire
+URL_TTL = 6 * 60 * 60
+# Seconds a redirect prefix is used for
+PREFIX_TTL = 30 * 24 * 60 * 60
+# Max number of prefixes stripped from a single URL
+MAX_HOPS = 5
+
+
+class RedirectCache:
+    """Cache of redirect targets, per URL and per redirect prefix.
+
+    Shared by download threads.  Entries are saved to a JSON file by `save`,
+    expired ones are dropped when it's loaded.  Downloads that fail at a
+    cached target should call `forget` and follow the redirects again, see
+    `Episode.download`.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path = Config.redirect_cache,
+        url_ttl: int = URL_TTL,
+        prefix_ttl: int = PREFIX_TTL,
+    ):
+        """Init method.
+
+        :param path: JSON file the cache is kept in
+        :param url_ttl: seconds a resolved URL is used for
+        :param prefix_ttl: seconds a redirect prefix is used for
+        """
+        self._path = pathlib.Path(path)
+        self._url_ttl = url_ttl
+        self._prefix_ttl = prefix_ttl
+        self._logger = logger(f"{self.__class__.__name__}")
+        self._lock = Lock()
+        self._dirty = False
+        # URL to tuple of target and expiry
+        self._urls: tp.Dict[str, tp.Tuple[str, float]] = {}
+        # Prefix to tuple of scheme prepended to the rest of the URL and expiry
+        self._prefixes: tp.Dict[str, tp.Tuple[str, float]] = {}
+        self._load()
+
+    def __repr__(self):
+        """`repr` method."""
+        return f"{self.__class__.__name__}({self._path})"
+
+    def __len__(self):
+        """Return number of cached URLs and prefixes."""
+        return len(self._urls) + len(self._prefixes)
+
+    def resolve(self, url: str) -> str:
+        """Return where URL leads, as far as is known.
+
+        :param url: enclosure URL
+        :return: cached target, or `url` itself if no redirect of it is known
+        """
+        now = time.time()
+        with self._lock:
+            for _ in range(MAX_HOPS):
+                target, expires = self._urls.get(url, (None, 0))
+                if expires > now:
+                    return target
+                prefix = self._prefix(url, now)
+                if prefix is None:
+                    return url
+                scheme = self._prefixes[prefix][0]
+                url = scheme + url[len(prefix) :]
+        return url
+
+    def learn(self, chain: tp.List[str]) -> None:
+        """Remember a redirect chain.
+
+        :param chain: list of URLs, from the requested one to the final one,
+        e.g., `[r.url for r in resp.history] + [resp.url]`
+        :return: None
+        """
+        if len(chain) < 2:
+            return
+        now = time.time()
+        with self._lock:
+            self._urls[chain[0]] = chain[-1], now + self._url_ttl
+            for source, target in zip(chain, chain[1:]):
+                scheme, _, rest = target.partition("://")
+                if source.endswith(f"/{target}"):  # e.g., op3.dev/e/https://...
+                    prefix, scheme = source[: -len(target)], ""
+                elif rest and source.endswith(f"/{rest}"):
+                    prefix, scheme = source[: -len(rest)], f"{scheme}://"
+                else:
+                    continue
+                if prefix.count("/") > 2:  # Not just the scheme and host
+                    self._prefixes[prefix] = scheme, now + self._prefix_ttl
+            self._dirty = True
+
+    def forget(self, url: str) -> None:
+        """Drop cached URL, and any prefixes it was resolved with.
+
+        :param url: enclosure URL
+        :return: None
+        """
+        self._logger.info(f"Forgetting redirects of {url}")
+        with self._lock:
+            for _ in range(MAX_HOPS):
+                self._urls.pop(url, None)
+                prefix = self._prefix(url, time.time())
+                if prefix is None:
+                    break
+                scheme, _ = self._prefixes.pop(prefix)
+                url = scheme + url[len(prefix) :]
+            self._dirty = True
+
+    def save(self) -> None:
+        """Write cache, if anything was learned or forgotten since it was loaded.
+
+        :return: None
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps({"urls": self._urls, "prefixes": self._prefixes})
+            self._dirty = False
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self._path.with_suffix(f".{os.getpid()}.tmp")
+        temp.write_text(data)
+        os.replace(temp, self._path)
+
+    def _prefix(self, url: str, now: float) -> str or None:
+        """Return longest unexpired prefix of URL."""
+        matches = [
+            prefix
+            for prefix, (_, expires) in self._prefixes.items()
+            if expires > now and url.startswith(prefix)
+        ]
+        return max(matches, key=len) if matches else None
+
+    def _load(self) -> None:
+        """Read unexpired entries of cache file, if there is one."""
+        try:
+            data = json.loads(self._path.read_text())
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for store, entries in (
+            (self._urls, data.get("urls", {})),
+            (self._prefixes, data.get("prefixes", {})),
+        ):
+            store.update(
+                (key, tuple(value)) for key, value in entries.items() if value[1] > now
+            )
@@ -0,0 +1,165 @@
+"""Delete old downloads according to retention policies."""
+
+from collections import Counter
+from itertools import groupby
+import os
+from time import gmtime, time
+import typing as tp
+
+from podd.database import Database
+from podd.fetch import timestamp
+from podd.logger import logger
+from podd.settings import Config
+from podd.utilities import batches
+
+
+class Eviction(tp.NamedTuple):
+    """Downloaded file deleted by `Retention`."""
+
+    path: str
+    size: int  # Bytes freed, 0 for a hard link to a file that's still kept
+    reason: str  # `episodes`, `days`, `bytes` or `quota`
+
+
+class Retention:
+    """Enforce retention policies.
+
+    Each podcast keeps its newest downloads, by download time, within its own
+    policy or the global one: at most `episodes` files, none older than `days`,
+    at most `bytes` in total, but always at least its newest file.  Once every
+    podcast is within its policy, the oldest files overall are deleted until
+    everything fits in the storage quota.
+
+    Only files still on disk are looked at, and their sizes come from the
+    database, so the download directories aren't walked.  Each file is stat'ed
+    once, so files hard-linked by `Episode.link` are only counted once.  Evicted
+    episodes keep their database record, so they aren't downloaded again.
+    """
+
+    def __init__(self, db_file: str = Config.database):
+        """Init method.
+
+        :param db_file: database holding the downloads
+        """
+        self.db_file = db_file
+        self._logger = logger(f"{self.__class__.__name__}")
+
+    def __repr__(self):
+        """`repr` method."""
+        return f"{self.__class__.__name__}({self.db_file})"
+
+    def run(self, dry_run: bool = False, now: float = None) -> tp.List[Eviction]:
+        """Delete files outside retention policies.
+
+        :param dry_run: only report what would be deleted
+        :param now: current time in seconds since the epoch, used to work out ages
+        :return: list of Evictions
+        """
+        with Database(self.db_file) as _db:
+            *_, quota = _db.get_retention()
+            policies = _db.get_podcast_retention()
+            if not quota and not any(any(policy) for policy in policies.values()):
+                return []
+            files = _db.get_files_on_disk()
+            files, sizes = self._sizes(files)
+            if sizes and not dry_run:
+                _db.set_episode_sizes(sizes)
+        evictions = self.select(files, policies, quota, now or time())
+        if dry_run or not evictions:
+            return [eviction for _, eviction in evictions]
+        return self._evict(evictions)
+
+    def _sizes(self, files: list) -> tp.Tuple[list, list]:
+        """Identify files, and fill in sizes of files recorded without one.
+
+        Files are identified by device and inode, so hard links share an identity.
+        Sizes are only filled in once, as they're saved afterwards.
+        :return: tuple of files, with their identity appended, and list of tuples
+        of new size and episode id
+        """
+        complete, sizes = [], []
+        for ep_id, url, location, size, downloaded in files:
+            try:
+                stat = os.stat(location)
+                identity = stat.st_dev, stat.st_ino
+            except OSError:  # Gone, `podd reconcile` takes care of it
+                stat, identity = None, location
+            if size is None:
+                size = stat.st_size if stat else 0
+                sizes.append((size, ep_id))
+            complete.append((ep_id, url, location, size, downloaded, identity))
+        return complete, sizes
+
+    @staticmethod
+    def select(
+        files: list, policies: dict, quota: int, now: float
+    ) -> tp.List[tp.Tuple[int, Eviction]]:
+        """Choose files to delete.
+
+        :param files: list of tuples of episode id, podcast RSS feed url, file
+        location, size, download timestamp and identity, see `_sizes`, grouped by
+        podcast, newest first
+        :param policies: dict of podcast RSS feed url to tuple of episodes, days
+        and bytes kept, 0 is unlimited
+        :param quota: bytes kept in total, 0 is unlimited
+        :param now: current time in seconds since the epoch
+        :return: list of tuples of episode id and Eviction
+        """
+        evictions, kept = [], []
+        for url, group in groupby(files, key=lambda row: row[1]):
+            episodes, days, max_bytes = policies.get(url, (0, 0, 0))
+            cutoff = timestamp(gmtime(now - days * 24 * 60 * 60))
+            total, full, counted = 0, False, set()
+            for count, row in enumerate(group):
+                ep_id, _, location, size, downloaded, identity = row
+                added = 0 if identity in counted else size
+                reason = None
+                if episodes and count >= episodes:
+                    reason = "episodes"
+                elif days and downloaded and downloaded < cutoff and count:
+                    reason = "days"
+                elif max_bytes and count and (full or total + added > max_bytes):
+                    reason, full = "bytes", True
+                if reason:
+                    evictions.append((ep_id, location, size, reason, identity))
+                else:
+                    total += added
+                    counted.add(identity)
+                    kept.append((downloaded or "", ep_id, location, size, identity))
+        if quota:
+            links = Counter(identity for *_, identity in kept)
+            sizes = {identity: size for *_, size, identity in kept}
+            total = sum(sizes.values())
+            for _, ep_id, location, size, identity in sorted(kept):
+                if total <= quota:
+                    break
+                evictions.append((ep_id, location, size, "quota", identity))
+                links[identity] -= 1
+                if not links[identity]:
+                    total -= size
+        remaining = Counter(row[-1] for row in files)
+        selected = []
+        for ep_id, location, size, reason, identity in evictions:
+            remaining[identity] -= 1
+            freed = size if not remaining[identity] else 0
+            selected.append((ep_id, Eviction(location, freed, reason)))
+        return selected
+
+    def _evict(self, evictions: tp.List[tp.Tuple[int, Eviction]]) -> tp.List[Eviction]:
+        """Delete files, mark their episodes as deleted in batches."""
+        deleted, ids = [], []
+        for ep_id, eviction in evictions:
+            try:
+                os.remove(eviction.path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                self._logger.exception(f"Unable to delete {eviction.path}")
+                continue
+            self._logger.info(f"Deleted {eviction.path} ({eviction.reason})")
+            deleted.append(eviction)
+            ids.append(ep_id)
+        with Database(self.db_file) as _db:
+            for batch in batches(ids):
+                _db.clear_episode_files(batch)
+        return deleted
@@ -0,0 +1,88 @@
+"""Define download scheduling policies.
+
+A policy takes the episodes found by `threaded_update` and returns them in the
+order in which they should be handed to the download pool.  Whatever the policy,
+back catalog episodes are always scheduled after fresh ones, and episodes going
+to different volumes take turns, so concurrent downloads are spread over disks.
+"""
+
+from collections import OrderedDict
+from itertools import chain, zip_longest
+from os import path
+import typing as tp
+
+from podd.podcast import Episode
+from podd.storage import volume
+
+
+def feed_order(episodes: tp.List[Episode]) -> tp.List[Episode]:
+    """Keep episodes in the order they were found in their feeds."""
+    return list(episodes)
+
+
+def newest_first(episodes: tp.List[Episode]) -> tp.List[Episode]:
+    """Order episodes by publication date, newest first.
+
+    Episodes without a publication date are placed last.
+    """
+    return sorted(
+        episodes,
+        key=lambda ep: (ep.published is not None, tuple(ep.published or ())),
+        reverse=True,
+    )
+
+
+def smallest_first(episodes: tp.List[Episode]) -> tp.List[Episode]:
+    """Order episodes by the file size advertised in the feed, smallest first.
+
+    Episodes without a known size are placed last.
+    """
+    return sorted(episodes, key=lambda ep: (ep.length is None, ep.length or 0))
+
+
+def round_robin(episodes: tp.List[Episode]) -> tp.List[Episode]:
+    """Interleave episodes so that each podcast takes a turn.
+
+    Episodes of the same podcast keep their relative order.
+    """
+    return interleave(episodes, key=lambda ep: ep.podcast_url)
+
+
+def spread_volumes(episodes: tp.List[Episode]) -> tp.List[Episode]:
+    """Interleave episodes so that each volume takes a turn.
+
+    Episodes going to the same volume keep their relative order.
+    """
+    return interleave(episodes, key=lambda ep: volume(path.dirname(ep.filename)))
+
+
+def interleave(episodes: tp.List[Episode], key: tp.Callable) -> tp.List[Episode]:
+    """Interleave groups of episodes, each group keeping its relative order."""
+    groups = OrderedDict()
+    for episode in episodes:
+        groups.setdefault(key(episode), []).append(episode)
+    if len(groups) < 2:
+        return list(episodes)
+    turns = zip_longest(*groups.values())
+    return [ep for ep in chain.from_iterable(turns) if ep is not None]
+
+
+POLICIES: tp.Dict[str, tp.Callable] = {
+    "feed": feed_order,
+    "newest": newest_first,
+    "smallest": smallest_first,
+    "round-robin": round_robin,
+}
+
+
+def schedule(episodes: tp.List[Episode], policy: str = "feed") -> tp.List[Episode]:
+    """Order episodes according to named policy.
+
+    :param episodes: list of Episodes to be downloaded
+    :param policy: key of `POLICIES`
+    :return: list of Episodes in download order
+    """
+    order = POLICIES[policy]
+    fresh = [ep for ep in episodes if not ep.backlog]
+    backlog = [ep for ep in episodes if ep.backlog]
+    return spread_volumes(order(fresh)) + spread_volumes(order(backlog))
@@ -0,0 +1,205 @@
+"""Implement compact store of the feed ids of each podcast's recorded episodes.
+
+Refreshing a podcast only needs to know which feed entries were seen before.
+Rather than loading every recorded feed id into a set, each podcast gets a
+Bloom filter, which answers "definitely new" for most new entries in memory,
+at about 10 bits per recorded episode.  Only entries the filter might have
+seen are looked up in the database, so false positives cost a query, never a
+missed episode.
+"""
+
+from functools import lru_cache
+from hashlib import blake2b, sha256
+import math
+import os
+import pathlib
+import struct
+from threading import Lock
+import typing as tp
+
+from podd.database import Database
+from podd.logger import logger
+from podd.settings import Config
+
+# Target rate of false positives, i.e., entries looked up in the database needlessly
+FALSE_POSITIVE_RATE = 0.01
+# Smallest number of feed ids a filter is sized for
+MIN_CAPACITY = 1024
+# File header: magic, database token, last episode id, count, capacity, hashes
+HEADER = struct.Struct("<8s8sqqqB")
+MAGIC = b"PODDSEEN"
+
+
+class BloomFilter:
+    """Bloom filter of strings, using double hashing of a single blake2b digest."""
+
+    __slots__ = ["capacity", "count", "hashes", "_size", "_bits"]
+
+    def __init__(
+        self,
+        capacity: int,
+        error_rate: float = FALSE_POSITIVE_RATE,
+        bits: bytearray = None,
+        hashes: int = None,
+        count: int = 0,
+    ):
+        """Init method.
+
+        :param capacity: number of items the filter is sized for
+        :param error_rate: false positive rate once `capacity` items are added
+        :param bits: bit array of an existing filter, see `to_bytes`
+        :param hashes: number of hash functions of an existing filter
+        :param count: number of items added to an existing filter
+        """
+        self.capacity = capacity
+        self.count = count
+        size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self._bits = bits if bits is not None else bytearray((size + 7) // 8)
+        self._size = len(self._bits) * 8
+        self.hashes = hashes or max(1, round(self._size / capacity * math.log(2)))
+
+    def __repr__(self):
+        """`repr` method."""
+        return f"{self.__class__.__name__}({self.capacity}, {self.count})"
+
+    def __len__(self):
+        """Return number of items added."""
+        return self.count
+
+    def __contains__(self, item: str) -> bool:
+        """Return False if item was definitely never added."""
+        bits = self._bits
+        for position in self._positions(item):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, item: str) -> None:
+        """Add item."""
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def to_bytes(self) -> bytes:
+        """Return bit array."""
+        return bytes(self._bits)
+
+    def _positions(self, item: str) -> tp.Iterator[int]:
+        """Yield bit positions of item."""
+        digest = blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self._size
+
+
+class SeenIds:
+    """Bloom filters of recorded feed ids, one per podcast.
+
+    Filters are persisted in a directory next to the database, and brought up
+    to date with episodes recorded since they were saved.  Deleting episodes
+    changes the database's `seen_token`, see `upgrade_database`, after which
+    filters are rebuilt from scratch, as are filters that are over capacity.
+    Read-only filters are loaded, but never saved, nor is a token made.
+    """
+
+    def __init__(
+        self,
+        database: str = Config.database,
+        directory: str = None,
+        read_only: bool = False,
+    ):
+        """Init method.
+
+        :param database: database holding the episodes
+        :param directory: where filters are saved, by default `<database>.seen`
+        :param read_only: keep updated filters in memory only, see `podd replay`
+        """
+        self.database = database
+        self.read_only = read_only
+        self._directory = pathlib.Path(
+            directory or pathlib.Path(database).with_suffix(".seen")
+        )
+        self._logger = logger(f"{self.__class__.__name__}")
+        self._filters: tp.Dict[str, tp.Tuple[bytes, int, BloomFilter]] = {}
+        self._lock = Lock()
+        self._locks: tp.Dict[str, Lock] = {}
+
+    def __repr__(self):
+        """`repr` method."""
+        return (
+            f"{self.__class__.__name__}({self.database}, {self._directory}, "
+            f"{self.read_only})"
+        )
+
+    def known(self, url: str, feed_ids: tp.Iterable[str]) -> tp.Set[str]:
+        """Return which feed ids of a podcast are recorded.
+
+        :param url: rss feed url
+        :param feed_ids: ids of feed entries
+        :return: set of feed ids recorded in the database
+        """
+        with self._lock:
+            lock = self._locks.setdefault(url, Lock())
+        with lock, Database(self.database) as _db:
+            bloom = self._update(_db, url)
+            candidates = [feed_id for feed_id in feed_ids if feed_id in bloom]
+            return _db.known_episodes(url, candidates) if candidates else set()
+
+    def _update(self, _db: Database, url: str) -> BloomFilter:
+        """Bring podcast's filter up to date, loading or rebuilding it if needed."""
+        token = bytes.fromhex(_db.get_seen_token(create=not self.read_only) or "")
+        cached = self._filters.get(url) or self._load(url)
+        if cached is None or cached[0] != token:
+            cached = token, 0, None
+        _, last_id, bloom = cached
+        recorded = _db.get_episode_ids(url, after=last_id)
+        if bloom is None or bloom.count + len(recorded) > bloom.capacity:
+            if bloom is not None:
+                recorded = _db.get_episode_ids(url)
+            bloom = BloomFilter(max(MIN_CAPACITY, 2 * len(recorded)))
+            self._logger.debug(f"Rebuilding filter of {url}")
+        for _, feed_id in recorded:
+            bloom.add(feed_id)
+        if (recorded or cached[2] is None) and not self.read_only:
+            last_id = recorded[-1][0] if recorded else last_id
+            self._save(url, token, last_id, bloom)
+        self._filters[url] = token, last_id, bloom
+        return bloom
+
+    def _path(self, url: str) -> pathlib.Path:
+        """Return location of podcast's filter."""
+        return self._directory / f"{sha256(url.encode()).hexdigest()[:32]}.bloom"
+
+    def _load(self, url: str) -> tp.Tuple[bytes, int, BloomFilter] or None:
+        """Read podcast's filter, None if there isn't a valid one."""
+        try:
+            data = self._path(url).read_bytes()
+            magic, token, last_id, count, capacity, hashes = HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return None
+        if magic != MAGIC:
+            return None
+        bits = bytearray(data[HEADER.size :])
+        return (
+            token,
+            last_id,
+            BloomFilter(capacity, bits=bits, hashes=hashes, count=count),
+        )
+
+    def _save(self, url: str, token: bytes, last_id: int, bloom: BloomFilter) -> None:
+        """Write podcast's filter, replacing the previous one atomically."""
+        path = self._path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_suffix(f".{os.getpid()}.tmp")
+        header = HEADER.pack(
+            MAGIC, token, last_id, bloom.count, bloom.capacity, bloom.hashes
+        )
+        temp.write_bytes(header + bloom.to_bytes())
+        os.replace(temp, path)
+
+
+@lru_cache(maxsize=None)
+def seen_ids(database: str = Config.database, read_only: bool = False) -> SeenIds:
+    """Return SeenIds of database, shared by every refresh in this process."""
+    return SeenIds(database, read_only=read_only)
@@ -14,6 +14,12 @@ class Config:
 
     `log_directory` by default is `~/logs/Podd`.  If you specify another path, logs
     will be placed in that directory
+
+    `cache_directory` holds downloaded artwork and compiled email templates,
+    `artwork_cache_size` is the max number of bytes of artwork kept there.
+    Emails that couldn't be sent are kept in `spool_directory` and retried on the next run.
+    Fetched feeds are kept in `feed_archive_directory` when archiving is on, see `podd archive`.
+    Known redirects of enclosure URLs are kept in `redirect_cache`.
     """
 
     host = "smtp.gmail.com"
@@ -21,3 +27,10 @@ class Config:
     database = str(pathlib.Path(__file__).parent / "podcasts.db")
     version = "0.1.18"
     log_directory = pathlib.Path.home() / "logs" / "Podd"
+    cache_directory = pathlib.Path.home() / ".cache" / "Podd"
+    artwork_directory = cache_directory / "artwork"
+    template_cache_directory = cache_directory / "templates"
+    artwork_cache_size = 50 * 1024 * 1024
+    spool_directory = cache_directory / "spool"
+    feed_archive_directory = cache_directory / "feeds"
+    redirect_cache = cache_directory / "redirects.json"
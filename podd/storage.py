@@ -0,0 +1,69 @@
+"""Choose where new podcasts are stored.
+
+Podcasts can be spread over several download roots, e.g., one per disk.  Each
+podcast gets its own directory in one of the roots when it's added, and stays
+there.
+"""
+
+from functools import lru_cache
+import os
+from os import path
+import shutil
+import typing as tp
+
+
+def free_space(root: str) -> int:
+    """Return free bytes on volume holding root, -1 if it can't be read."""
+    try:
+        return shutil.disk_usage(root).free
+    except OSError:
+        return -1
+
+
+def most_free_space(roots: tp.List[str], last_directory: str = None) -> str:
+    """Choose root with the most free space."""
+    return max(roots, key=free_space)
+
+
+def round_robin(roots: tp.List[str], last_directory: str = None) -> str:
+    """Choose root after the one holding the most recently added podcast."""
+    for index, root in enumerate(roots):
+        if last_directory and path.dirname(
+            path.normpath(last_directory)
+        ) == path.normpath(root):
+            return roots[(index + 1) % len(roots)]
+    return roots[0]
+
+
+PLACEMENT_POLICIES: tp.Dict[str, tp.Callable] = {
+    "free-space": most_free_space,
+    "round-robin": round_robin,
+}
+
+
+def choose_root(
+    roots: tp.List[str], policy: str = "free-space", last_directory: str = None
+) -> str:
+    """Choose download root for a new podcast according to named policy.
+
+    :param roots: download roots, the first one is the default download directory
+    :param policy: key of `PLACEMENT_POLICIES`
+    :param last_directory: directory of the most recently added podcast
+    :return: root
+    """
+    if len(roots) == 1:
+        return roots[0]
+    return PLACEMENT_POLICIES[policy](roots, last_directory)
+
+
+@lru_cache(maxsize=None)
+def volume(directory: str) -> int:
+    """Return id of volume holding directory, or its closest existing parent."""
+    while True:
+        try:
+            return os.stat(directory).st_dev
+        except OSError:
+            parent = path.dirname(directory)
+            if parent == directory:
+                return -1
+            directory = parent
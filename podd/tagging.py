@@ -0,0 +1,236 @@
+"""Tag audio files with podcast metadata."""
+
+from io import BytesIO
+import typing as tp
+
+import mutagen
+from mutagen import MutagenError
+from mutagen.id3 import (
+    APIC,
+    ID3,
+    ID3NoHeaderError,
+    TALB,
+    TCON,
+    TIT2,
+    TPE1,
+    TPE2,
+    TPOS,
+    TRCK,
+)
+from mutagen.mp4 import MP4, MP4Cover
+
+# Bytes of padding reserved after inline tags, so re-tagging never rewrites the file
+ID3_PADDING = 4096
+
+
+class TagJob(tp.NamedTuple):
+    """Everything a tagging process needs to know to tag a downloaded file."""
+
+    filename: str
+    title: str
+    podcast_name: str
+    ep_num: str = None
+    artwork: str = None
+    season: str = None
+
+
+def tag_file(job: TagJob) -> str or None:
+    """Tag downloaded file with metadata.
+
+    Uses mutagen's File class to try to discover what type of audio file
+    is being tagged, then uses either mp3 or mp4 tagger on file, if type
+    is either mp3 or mp4.  Only depends on `job`, so it can be run by a process
+    pool.
+    :param job: TagJob
+    :return: None if the file was tagged, otherwise the kind of failure
+    """
+    try:
+        audio = mutagen.File(job.filename)
+        filetype = audio.pprint() if audio is not None else ""
+        if "mp3" in filetype:
+            _mp3_tagger(job)
+        elif "mp4" in filetype:
+            _mp4_tagger(job)
+        else:
+            return "unknown filetype"
+    except (MutagenError, OSError, ValueError) as err:
+        return type(err).__name__
+    return None
+
+
+def _mp3_tagger(job: TagJob) -> None:
+    """Tag mp3 files.
+
+    Uses mutagen to write tags to mp3 file, see `id3_tags`
+    :param job: TagJob
+    :return: None
+    """
+    try:
+        tag = ID3(job.filename)
+    except ID3NoHeaderError:
+        tag = ID3()
+    new_tags = id3_tags(
+        job.title, job.podcast_name, job.ep_num, job.season, job.artwork
+    )
+    for frame in new_tags.values():
+        tag.add(frame)
+    tag.save(job.filename)
+
+
+def _mp4_tagger(job: TagJob) -> None:
+    """Tag mp4 files.
+
+    Per https://mutagen.readthedocs.io/en/latest/api/mp4.html#mutagen.mp4.MP4Tags,
+    track numbers are tuples of ints, first being track number, the second is
+    the total number of tracks, e.g.,  Album X has 10 tracks, we want to tag the
+    3rd track, so `tag['trkn'] = (3, 10)`, the weird syntax is because mutagen
+    supports multiple keys per track number.  I wish the documentation was
+    clearer.  One was chosen as the track count as I had to choose some number:
+    leaving it blank isn't an option.
+
+    :param job: TagJob
+    :return: None
+    """
+    audio = MP4(job.filename)
+    if audio.tags is None:
+        audio.add_tags()
+    tag = audio.tags
+    tag["\xa9nam"] = job.title
+    tag["\xa9ART"] = job.podcast_name  # Artist
+    tag["\xa9alb"] = job.podcast_name  # Album
+    tag["aART"] = job.podcast_name  # Album artist
+    tag["\xa9gen"] = "Podcast"  # Genre
+    if job.ep_num:
+        tag["trkn"] = ((int(job.ep_num), 1),)  # I know this is weird: see docstring
+    if job.season:
+        tag["disk"] = ((int(job.season), 1),)  # Same as track numbers
+    if job.artwork:
+        data = _read_artwork(job.artwork)
+        if data:
+            image_format = (
+                MP4Cover.FORMAT_PNG
+                if _artwork_mime(data) == "image/png"
+                else MP4Cover.FORMAT_JPEG
+            )
+            tag["covr"] = [MP4Cover(data, imageformat=image_format)]
+    audio.save(job.filename)
+
+
+def _read_artwork(path: str) -> bytes or None:
+    """Read cached artwork, which may have been evicted since it was cached."""
+    try:
+        with open(path, "rb") as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+def _artwork_mime(data: bytes) -> str:
+    """Return mime type of image, podcast artwork is either a PNG or a JPEG."""
+    return "image/png" if data.startswith(b"\x89PNG") else "image/jpeg"
+
+
+def id3_tags(
+    title: str,
+    podcast_name: str,
+    ep_num: str = None,
+    season: str = None,
+    artwork: str = None,
+) -> ID3:
+    """Create ID3 tags.
+
+    :param title: episode title
+    :param podcast_name: used as artist, album and album artist
+    :param ep_num: episode number, used as track number
+    :param season: season number, used as disc number
+    :param artwork: path to cover art
+    :return: ID3 tags
+    """
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text=title))
+    tags.add(TPE1(encoding=3, text=podcast_name))
+    tags.add(TALB(encoding=3, text=podcast_name))
+    tags.add(TPE2(encoding=3, text=podcast_name))
+    tags.add(TCON(encoding=3, text="Podcast"))
+    if ep_num:
+        tags.add(TRCK(encoding=3, text=ep_num))
+    if season:
+        tags.add(TPOS(encoding=3, text=season))
+    data = _read_artwork(artwork) if artwork else None
+    if data:
+        tags.add(APIC(encoding=3, mime=_artwork_mime(data), type=3, desc="", data=data))
+    return tags
+
+
+class InlineID3:
+    """Write ID3 tags in front of an mp3 file as it is being downloaded.
+
+    If the stream already starts with an ID3 tag, that tag is read, updated and
+    written back, otherwise a new tag is written before the first audio frame.
+    Either way, the file is written once, instead of being rewritten by mutagen
+    to make room for the tag after the download.  Streams that don't look like
+    mp3s are passed through untouched and `tagged` is left False.
+    """
+
+    def __init__(self, tags: ID3):
+        """Init method.
+
+        :param tags: tags to write, see `id3_tags`
+        """
+        self.tags = tags
+        self.tagged = False
+
+    def stream(self, chunks: tp.Iterable[bytes]) -> tp.Iterator[bytes]:
+        """Yield chunks of tagged file.
+
+        :param chunks: chunks of downloaded file
+        :return: generator of chunks to write to disk
+        """
+        chunks = iter(chunks)
+        head = b""
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= 10:
+                break
+        if head[:3] == b"ID3":
+            size = self._tag_size(head)
+            while len(head) < size:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                head += chunk
+            head = self._merge(head, size)
+        elif len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+            head = self._render(self.tags) + head
+            self.tagged = True
+        yield head
+        yield from chunks
+
+    @staticmethod
+    def _tag_size(header: bytes) -> int:
+        """Return total size of ID3v2 tag, header and footer included."""
+        # Syncsafe integer, 7 bits per byte
+        size = 10 + sum((b & 0x7F) << (7 * (3 - i)) for i, b in enumerate(header[6:10]))
+        if header[5] & 0x10:
+            size += 10
+        return size
+
+    def _merge(self, head: bytes, size: int) -> bytes:
+        """Replace existing tag at the start of `head` with an updated one."""
+        if len(head) < size:  # Download ended inside of the tag
+            return head
+        try:
+            existing = ID3(BytesIO(head[:size]))
+        except MutagenError:
+            return head
+        for frame in self.tags.values():
+            existing.add(frame)
+        self.tagged = True
+        return self._render(existing) + head[size:]
+
+    @staticmethod
+    def _render(tags: ID3) -> bytes:
+        """Return tags as bytes, followed by `ID3_PADDING` bytes of padding."""
+        data = BytesIO()
+        tags.save(data, padding=lambda info: ID3_PADDING)
+        return data.getvalue()
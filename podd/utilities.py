@@ -4,9 +4,113 @@ import pathlib
 import re
 import typing as tp
 
-from podd.database import Options
+from podd.database import Database, Options
 from podd.settings import Config
 
+# Tables added after the initial release.
+TABLES: tp.List[str] = [
+    "CREATE TABLE IF NOT EXISTS backlog "
+    "(id INTEGER PRIMARY KEY, "
+    "feed_id TEXT, "
+    "podcast_id INTEGER NOT NULL, "
+    "UNIQUE (podcast_id, feed_id), "
+    "FOREIGN KEY (podcast_id) REFERENCES podcasts(id))",
+    "CREATE TABLE IF NOT EXISTS jobs "
+    "(id INTEGER PRIMARY KEY, "
+    "podcast_id INTEGER NOT NULL, "
+    "feed_id TEXT, "
+    "state TEXT NOT NULL DEFAULT 'pending', "
+    "payload TEXT NOT NULL, "
+    "attempts INTEGER NOT NULL DEFAULT 0, "
+    "lease TEXT, "
+    "lease_expires REAL, "
+    "error TEXT, "
+    "UNIQUE (podcast_id, feed_id), "
+    "FOREIGN KEY (podcast_id) REFERENCES podcasts(id))",
+    "CREATE TABLE IF NOT EXISTS roots "
+    "(id INTEGER PRIMARY KEY, "
+    "path TEXT UNIQUE NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS profiles "
+    "(id INTEGER PRIMARY KEY, "
+    "name TEXT UNIQUE NOT NULL, "
+    "database TEXT UNIQUE NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS feed_stats "
+    "(id INTEGER PRIMARY KEY, "
+    "podcast_id INTEGER NOT NULL, "
+    "fetched TEXT NOT NULL, "
+    "size INTEGER NOT NULL, "
+    "fetch_seconds REAL NOT NULL, "
+    "parse_seconds REAL NOT NULL, "
+    "entries INTEGER NOT NULL, "
+    "failed BOOLEAN NOT NULL, "
+    "FOREIGN KEY (podcast_id) REFERENCES podcasts(id))",
+]
+
+# Columns added after the initial release.  `upgrade_database` adds any that are
+# missing, so that databases created by older versions keep working.
+COLUMNS: tp.List[tp.Tuple[str, str, str]] = [
+    ("settings", "bandwidth_limit", "INTEGER DEFAULT 0"),
+    ("settings", "bandwidth_schedule", "TEXT DEFAULT ''"),
+    ("settings", "backlog_episodes", "INTEGER DEFAULT 0"),
+    ("settings", "backlog_bytes", "INTEGER DEFAULT 0"),
+    ("settings", "retain_episodes", "INTEGER DEFAULT 0"),
+    ("settings", "retain_days", "INTEGER DEFAULT 0"),
+    ("settings", "retain_bytes", "INTEGER DEFAULT 0"),
+    ("settings", "storage_quota", "INTEGER DEFAULT 0"),
+    ("settings", "placement", "TEXT DEFAULT 'free-space'"),
+    ("settings", "archive_feeds", "BOOLEAN DEFAULT 0"),
+    ("settings", "seen_token", "TEXT"),
+    ("podcasts", "retain_episodes", "INTEGER"),
+    ("podcasts", "retain_days", "INTEGER"),
+    ("podcasts", "retain_bytes", "INTEGER"),
+    ("episodes", "title", "TEXT"),
+    ("episodes", "summary", "TEXT"),
+    ("episodes", "published", "TEXT"),
+    ("episodes", "url", "TEXT"),
+    ("episodes", "length", "INTEGER"),
+    ("episodes", "size", "INTEGER"),
+    ("episodes", "path", "TEXT"),
+    ("episodes", "downloaded", "TEXT"),
+    ("episodes", "sha256", "TEXT"),
+    ("episodes", "file_sha256", "TEXT"),
+]
+
+# Number of rows changed per transaction by batched database updates
+BATCH_SIZE = 1000
+
+# Indexes, full-text search tables and triggers, created once all columns exist.
+INDEXES: tp.List[str] = [
+    "CREATE INDEX IF NOT EXISTS episodes_podcast ON episodes (podcast_id, feed_id)",
+    "CREATE INDEX IF NOT EXISTS episodes_downloaded ON episodes (downloaded)",
+    "CREATE INDEX IF NOT EXISTS episodes_url ON episodes (url)",
+    "CREATE INDEX IF NOT EXISTS episodes_sha256 ON episodes (sha256)",
+    "CREATE INDEX IF NOT EXISTS episodes_on_disk ON episodes (podcast_id, downloaded) "
+    "WHERE path IS NOT NULL",
+    # Covers `get_subscription_stats`, files on disk are the ones with a size
+    "CREATE INDEX IF NOT EXISTS episodes_overview "
+    "ON episodes (podcast_id, published, downloaded, size)",
+    "CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id)",
+    "CREATE INDEX IF NOT EXISTS jobs_lease ON jobs (lease)",
+    "CREATE INDEX IF NOT EXISTS feed_stats_podcast ON feed_stats (podcast_id, id)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS episodes_fts USING fts5"
+    "(title, summary, content='episodes', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS episodes_fts_insert AFTER INSERT ON episodes BEGIN "
+    "INSERT INTO episodes_fts (rowid, title, summary) "
+    "VALUES (new.id, new.title, new.summary); END",
+    "CREATE TRIGGER IF NOT EXISTS episodes_fts_delete AFTER DELETE ON episodes BEGIN "
+    "INSERT INTO episodes_fts (episodes_fts, rowid, title, summary) "
+    "VALUES ('delete', old.id, old.title, old.summary); END",
+    "CREATE TRIGGER IF NOT EXISTS episodes_fts_update "
+    "AFTER UPDATE OF title, summary ON episodes BEGIN "
+    "INSERT INTO episodes_fts (episodes_fts, rowid, title, summary) "
+    "VALUES ('delete', old.id, old.title, old.summary); "
+    "INSERT INTO episodes_fts (rowid, title, summary) "
+    "VALUES (new.id, new.title, new.summary); END",
+    # Invalidates every filter of `SeenIds`, which can't forget feed ids
+    "CREATE TRIGGER IF NOT EXISTS episodes_seen_delete AFTER DELETE ON episodes "
+    "BEGIN UPDATE settings SET seen_token = NULL WHERE id = 1; END",
+]
+
 
 def bootstrap_app(database: str = Config.database) -> None:
     """Create database file, ask user for download and log directories, create said directories.
@@ -17,13 +121,31 @@ def bootstrap_app(database: str = Config.database) -> None:
 
     # Look for database file
     for file in pathlib.Path(database).parent.iterdir():
-        # If database file is found, return early
+        # If database file is found, make sure its schema is current, return early
         if database == str(file):
-            return
+            return upgrade_database(database)
     # Otherwise, bootstrap application:
 
-    # Define database structure
+    # Ensure that log_dir exists
+    Config.log_directory.mkdir(exist_ok=True, parents=True)
+    # Get user input for where to put download directory, add to db
+    dl_dir = get_directory(
+        name="Download directory", default=pathlib.Path.home() / "Podcasts"
+    )
+    create_database(database, dl_dir)
+    # Do email notification setup.
     with Options(database) as _db:
+        _db.email_notification_setup(initial_setup=True)
+
+
+def create_database(database: str, download_directory: pathlib.Path) -> None:
+    """Create database file with current schema and default settings.
+
+    :param database: location of database file
+    :param download_directory: base download directory
+    """
+    # Define database structure
+    with Database(database) as _db:
         cur = _db.cursor
         cur.execute(
             "CREATE TABLE IF NOT EXISTS podcasts "
@@ -47,18 +169,34 @@ def bootstrap_app(database: str = Config.database) -> None:
             "sender_address TEXT,"
             "recipient_address TEXT)"
         )
-        # Ensure that log_dir exists
-        Config.log_directory.mkdir(exist_ok=True, parents=True)
-        # Get user input for where to put download directory, add to db
-        dl_dir = get_directory(
-            name="Download directory", default=pathlib.Path.home() / "Podcasts"
-        )
         cur.execute(
             "INSERT INTO settings (download_directory, notification_status) VALUES (?,?)",
-            (str(dl_dir), False),
+            (str(download_directory), False),
         )
-        # Do email notification setup.
-        _db.email_notification_setup(initial_setup=True)
+    upgrade_database(database)
+
+
+def upgrade_database(database: str = Config.database) -> None:
+    """Add tables and columns introduced after the database was created.
+
+    :param database: location of database file
+    """
+    with Database(database) as _db:
+        cur = _db.cursor
+        for statement in TABLES:
+            cur.execute(statement)
+        for table, column, definition in COLUMNS:
+            cur.execute(f'PRAGMA table_info("{table}")')
+            if column not in {row[1] for row in cur.fetchall()}:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        for statement in INDEXES:
+            cur.execute(statement)
+
+
+def batches(items: list, size: int = BATCH_SIZE) -> tp.Iterator[list]:
+    """Split items into lists of at most `size` items."""
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
 
 
 def get_directory(name: str, default: pathlib.Path) -> pathlib.Path:
@@ -87,8 +225,8 @@ def get_directory(name: str, default: pathlib.Path) -> pathlib.Path:
 def compile_regex() -> tp.List[re.compile]:
     """Return compiled regex patterns.
 
-    These patterns are used to try to match episode numbers in order to tag
-    episodes.
+    These patterns used to be tried one after the other to match episode numbers,
+    they've been replaced by `EPISODE_PATTERN`.
     """
     return [
         re.compile(r"EPISODE #?(\d+)", re.IGNORECASE),
@@ -98,12 +236,54 @@ def compile_regex() -> tp.List[re.compile]:
     ]
 
 
+# Single pass equivalent of trying every `compile_regex` pattern in turn.  As the
+# second pattern matches any number, the third and fourth never get a chance: a
+# title yields the number following "episode", if there is one, else its first
+# number.  The match is anchored, so the "episode" alternative is tried first.
+EPISODE_PATTERN = re.compile(r"^(?:.*?EPISODE #?(\d+)|\D*(\d+))", re.I | re.S)
+
+
+class EpisodeNumber(tp.NamedTuple):
+    """Episode and season numbers, as strings, either may be None."""
+
+    episode: str = None
+    season: str = None
+
+
+def episode_number(title: str, entry: dict = None) -> EpisodeNumber:
+    """Find episode and season numbers.
+
+    Prefers the `itunes:episode` and `itunes:season` elements of the feed entry,
+    falls back to parsing the episode number out of the title.
+    :param title: episode title
+    :param entry: FeedParserDict entry of episode
+    :return: EpisodeNumber
+    """
+    entry = entry or {}
+    episode = str(entry.get("itunes_episode", "")).strip()
+    season = str(entry.get("itunes_season", "")).strip()
+    if not episode.isdigit():
+        match = EPISODE_PATTERN.match(title)
+        episode = (match.group(1) or match.group(2)) if match else None
+    return EpisodeNumber(episode, season if season.isdigit() else None)
+
+
+def episode_numbers(titles: tp.Iterable[str]) -> tp.List[str or None]:
+    """Parse episode numbers out of many titles at once.
+
+    :param titles: episode titles
+    :return: list of episode numbers, None where a title doesn't have one
+    """
+    match = EPISODE_PATTERN.match
+    return [
+        (m.group(1) or m.group(2)) if m else None for m in (match(t) for t in titles)
+    ]
+
+
 def get_episode_number(title: str) -> str or None:
     """Attempt to parse episode number out of a title.
 
-    This is functionally identical
+    This is functionally identical to `Episode` parsing a title without any
+    itunes episode metadata.
     """
-    for pattern in compile_regex():
-        match = pattern.search(title)
-        if match:
-            return match.groups()[0]
+    return episode_number(title).episode
@@ -0,0 +1,216 @@
+"""Verify integrity of downloaded episodes."""
+
+from hashlib import sha256
+import mimetypes
+import mmap
+from multiprocessing import Pool as ProcessPool
+import os
+from os import cpu_count, path
+import time
+import typing as tp
+
+import feedparser as fp
+import mutagen
+from mutagen import MutagenError
+
+from podd.database import Database
+from podd.jobs import JobQueue
+from podd.logger import logger
+from podd.podcast import Episode
+from podd.settings import Config
+from podd.utilities import batches
+
+
+class Check(tp.NamedTuple):
+    """File to verify, passed to `check_file` in a separate process."""
+
+    id: int
+    filename: str
+    length: int or None  # Bytes advertised by the feed
+    size: int or None  # Bytes on disk when the episode was recorded
+    file_sha256: str or None  # Hash of the file stored by an earlier `--hash` run
+    hash: bool  # Whether to hash the file
+
+
+class Verdict(tp.NamedTuple):
+    """Outcome of `check_file`."""
+
+    id: int
+    filename: str
+    problem: str or None  # e.g., `truncated`, None if the file is fine
+    file_sha256: str or None  # Hash of the file, if it was hashed
+    short: bool = False  # Smaller than advertised by the feed, which is often wrong
+
+
+class Verification(tp.NamedTuple):
+    """Outcome of `Verifier.run`."""
+
+    checked: int
+    bad: tp.List[Verdict]
+    short: tp.List[Verdict]  # Files smaller than advertised, left alone
+    hashed: int  # Files whose hash was stored for the first time
+    queued: int  # Episodes queued for `podd worker`
+
+
+def check_file(check: Check) -> Verdict:
+    """Verify a single file.
+
+    Files smaller than when they were recorded are truncated.  Files smaller than
+    advertised by the feed are only flagged as `short`, as feeds often get the
+    length wrong, and inserted ads change it between downloads.  Files mutagen
+    can't make sense of are corrupt.  If `hash` is set, the file is hashed
+    through a memory map, and compared with the stored hash, if there is one.
+    :param check: Check
+    :return: Verdict
+    """
+    try:
+        on_disk = os.stat(check.filename).st_size
+    except OSError:
+        return Verdict(check.id, check.filename, "missing", None)
+    if on_disk < (check.size or 0):
+        return Verdict(check.id, check.filename, "truncated", None)
+    short = on_disk < (check.length or 0)
+    try:
+        audio = mutagen.File(check.filename)
+    except (MutagenError, OSError, ValueError):
+        audio = None
+    if audio is None or not audio.info or audio.info.length <= 0:
+        return Verdict(check.id, check.filename, "corrupt", None, short)
+    digest = None
+    if check.hash:
+        with open(check.filename, "rb") as file, mmap.mmap(
+            file.fileno(), 0, access=mmap.ACCESS_READ
+        ) as data:
+            digest = sha256(data).hexdigest()
+        if check.file_sha256 and digest != check.file_sha256:
+            return Verdict(check.id, check.filename, "changed", digest, short)
+    return Verdict(check.id, check.filename, None, digest, short)
+
+
+class Verifier:
+    """Check every recorded file, and queue bad ones to be downloaded again.
+
+    Files are checked by a pool of processes, as parsing headers and hashing
+    are CPU bound.  Bad files are queued for `podd worker`, see `JobQueue`, and
+    kept until their replacement has been downloaded, see `Worker`.
+    """
+
+    def __init__(
+        self,
+        hashes: bool = False,
+        processes: int = None,
+        db_file: str = Config.database,
+    ):
+        """Init method.
+
+        :param hashes: hash files, storing the hash of files that have none, and
+        comparing the others with their stored hash
+        :param processes: number of files checked at once, by default one per core
+        :param db_file: database to verify
+        """
+        self.hashes = hashes
+        self.processes = processes or cpu_count() or 1
+        self.db_file = db_file
+        self._logger = logger(f"{self.__class__.__name__}")
+
+    def __repr__(self):
+        """`repr` method."""
+        return f"{self.__class__.__name__}({self.hashes}, {self.processes})"
+
+    def run(self, dry_run: bool = False) -> Verification:
+        """Check files, and queue bad ones.
+
+        :param dry_run: only report bad files
+        :return: Verification
+        """
+        with Database(self.db_file) as _db:
+            checks = [Check(*row, self.hashes) for row in _db.get_episode_checks()]
+        bad, short, hashes = [], [], []
+        pool = ProcessPool(min(self.processes, len(checks) or 1))
+        try:
+            for verdict in pool.imap_unordered(check_file, checks, chunksize=8):
+                if verdict.short:
+                    short.append(verdict)
+                    self._logger.warning(f"{verdict.filename} is short")
+                if verdict.problem:
+                    bad.append(verdict)
+                    self._logger.warning(f"{verdict.filename} is {verdict.problem}")
+                elif verdict.file_sha256:
+                    hashes.append((verdict.file_sha256, verdict.id))
+        finally:
+            pool.close()
+            pool.join()
+        stored = {check.id for check in checks if check.file_sha256}
+        hashes = [(digest, ep_id) for digest, ep_id in hashes if ep_id not in stored]
+        bad.sort(key=lambda verdict: verdict.filename)
+        short.sort(key=lambda verdict: verdict.filename)
+        queued = 0
+        if not dry_run:
+            with Database(self.db_file) as _db:
+                for batch in batches(hashes):
+                    _db.set_file_hashes(batch)
+            queued = self._requeue(bad)
+        return Verification(len(checks), bad, short, len(hashes), queued)
+
+    def _requeue(self, bad: tp.List[Verdict]) -> int:
+        """Queue replacements of bad files."""
+        if not bad:
+            return 0
+        ids = [verdict.id for verdict in bad]
+        with Database(self.db_file) as _db:
+            episodes = [
+                episode_from_record(*row)
+                for batch in batches(ids)
+                for row in _db.get_episode_records(batch)
+            ]
+        with JobQueue(self.db_file) as queue:
+            return queue.enqueue(episodes)
+
+
+def episode_from_record(
+    episode_id: int,
+    podcast_name: str,
+    podcast_url: str,
+    filename: str,
+    feed_id: str,
+    title: str,
+    summary: str,
+    published: str,
+    url: str,
+    length: int,
+) -> Episode:
+    """Recreate episode from its record, to replace its file.
+
+    :param episode_id: episode id, the record is replaced once downloaded
+    :param podcast_name: podcast name
+    :param podcast_url: rss feed url
+    :param filename: file location, which the download replaces
+    :param feed_id: id generated by rss feed for the episode
+    :param title: episode title
+    :param summary: episode summary
+    :param published: publication timestamp, see `timestamp`
+    :param url: audio file URL
+    :param length: audio file size advertised by the feed
+    :return: Episode
+    """
+    kind = mimetypes.guess_type(url.split("?")[0])[0] or ""
+    entry = fp.FeedParserDict(
+        id=feed_id,
+        links=[
+            fp.FeedParserDict(
+                type=kind if kind.startswith("audio/") else "audio/mpeg",
+                href=url,
+                length=str(length or ""),
+            )
+        ],
+    )
+    if title:
+        entry["title"] = title
+    if summary:
+        entry["summary"] = summary
+    if published:
+        entry["published_parsed"] = time.strptime(published, "%Y-%m-%d %H:%M:%S")
+    episode = Episode(path.dirname(filename), entry, podcast_name, podcast_url)
+    episode.filename = filename
+    episode.replaces = episode_id
+    return episode
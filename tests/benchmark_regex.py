@@ -0,0 +1,62 @@
+"""Benchmark episode number parsing.
+
+Run with `python -m tests.benchmark_regex`.  Compares compiling and trying
+each `compile_regex` pattern in turn, as `get_episode_number` used to do, trying
+precompiled patterns in turn, as `Episode` used to do, and the combined
+`EPISODE_PATTERN`, over a corpus of real-world style titles.
+"""
+from timeit import timeit
+
+from podd.utilities import compile_regex, episode_numbers
+
+PATTERNS = compile_regex()
+TITLES = [
+    'Episode 1021: The Long Con',
+    'EPISODE #44 Dan Carlin on the Bronze Age collapse',
+    '#1353 - Sam Harris',
+    'Show 221: Blitz Part 3',
+    'Ep. 7 - Roguelikes and Roguelites',
+    'Ep 118 Interview with a Cartographer',
+    '2019 Year in Review (Episode 52)',
+    'S4E12: The Finale',
+    'The Ezra Klein Show: Why Democracy Is Hard',
+    'Bonus: Live from the Fillmore',
+    'Tangentially Speaking 348 - Guest Name',
+    'Episode 12 – Part 2 of 3',
+    'Exchanges at Goldman Sachs: The Outlook for Oil',
+    'Jordan B. Peterson Podcast - Maps of Meaning 01',
+    'Trailer',
+    'Hardcore History 62 – Supernova in the East I',
+    'No. 6: The Prisoner',
+    '1 Year Anniversary Special!',
+    'Mailbag (Listener Questions)',
+    'Season 3, episode 8: Homecoming',
+]
+CORPUS = TITLES * 5000
+
+
+def recompiled():
+    for title in CORPUS:
+        for pattern in compile_regex():
+            match = pattern.search(title)
+            if match:
+                break
+
+
+def precompiled():
+    for title in CORPUS:
+        for pattern in PATTERNS:
+            match = pattern.search(title)
+            if match:
+                break
+
+
+def combined():
+    episode_numbers(CORPUS)
+
+
+if __name__ == '__main__':
+    runs = 5
+    for func in (recompiled, precompiled, combined):
+        seconds = timeit(func, number=runs) / runs
+        print(f'{func.__name__:12} {seconds * 1000:8.1f} ms for {len(CORPUS)} titles')
@@ -0,0 +1,105 @@
+"""Benchmark finding new feed entries.
+
+Run with `python -m tests.benchmark_seen`.  Compares loading every recorded
+feed id of a podcast into a set, as `Podcast` used to do, with `SeenIds`, over
+a database of podcasts with long back catalogs of long GUID URLs.  Each feed
+lists its newest entries, a few of which are new.
+"""
+import pathlib
+import sys
+import tempfile
+from time import perf_counter
+import tracemalloc
+
+from podd.database import Database
+from podd.seen import SeenIds
+from podd.utilities import create_database
+
+PODCASTS = 100
+EPISODES = 3000  # Recorded episodes per podcast
+FEED_ENTRIES = 100  # Entries per feed, the newest of which are new
+NEW_ENTRIES = 3
+
+
+def guid(podcast, number):
+    return f'https://podcast{podcast}.example.com/episodes/{number:06}-{"x" * 40}'
+
+
+def url(podcast):
+    return f'https://podcast{podcast}.example.com/feed.rss'
+
+
+def feed_ids(podcast):
+    newest = EPISODES + NEW_ENTRIES
+    return [guid(podcast, n) for n in range(newest - FEED_ENTRIES, newest)]
+
+
+def populate(database):
+    create_database(database, pathlib.Path(tempfile.gettempdir()))
+    with Database(database) as db:
+        db.cursor.executemany('INSERT INTO podcasts (name, url, directory) VALUES (?,?,?)',
+                              ((str(p), url(p), '') for p in range(PODCASTS)))
+        db.cursor.executemany(
+            'INSERT INTO episodes (podcast_id, feed_id) VALUES (?, ?)',
+            ((p + 1, guid(p, n)) for p in range(PODCASTS) for n in range(EPISODES)))
+        db._conn.commit()
+
+
+def with_sets(database):
+    sets = []
+    with Database(database) as db:
+        for podcast in range(PODCASTS):
+            old = db.get_episodes(url(podcast))
+            new = [feed_id for feed_id in feed_ids(podcast) if feed_id not in old]
+            assert len(new) == NEW_ENTRIES
+            sets.append(old)
+    return sets
+
+
+def with_filters(seen):
+    for podcast in range(PODCASTS):
+        known = seen.known(url(podcast), feed_ids(podcast))
+        assert len(known) == FEED_ENTRIES - NEW_ENTRIES
+
+
+def set_bytes(sets):
+    return sum(sys.getsizeof(s) + sum(sys.getsizeof(i) for i in s) for s in sets)
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as directory:
+        database = str(pathlib.Path(directory) / 'benchmark.db')
+        populate(database)
+        print(f'{PODCASTS} podcasts, {EPISODES} recorded episodes each, '
+              f'{FEED_ENTRIES} feed entries each, {NEW_ENTRIES} of them new')
+
+        start = perf_counter()
+        sets = with_sets(database)
+        print(f'sets:            {perf_counter() - start:.3f} s, '
+              f'{set_bytes(sets) / 2 ** 20:.1f} MiB if kept')
+        del sets
+
+        start = perf_counter()
+        with_filters(SeenIds(database))
+        print(f'filters, built:  {perf_counter() - start:.3f} s')
+        start = perf_counter()
+        with_filters(SeenIds(database))
+        print(f'filters, loaded: {perf_counter() - start:.3f} s')
+        seen = SeenIds(database)
+        with_filters(seen)
+        start = perf_counter()
+        with_filters(seen)
+        filter_bytes = sum(len(bloom.to_bytes()) for _, _, bloom in seen._filters.values())
+        print(f'filters, cached: {perf_counter() - start:.3f} s, '
+              f'{filter_bytes / 2 ** 20:.1f} MiB kept')
+
+        tracemalloc.start()
+        with_sets(database)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'sets peak allocation:    {peak / 2 ** 20:.1f} MiB')
+        tracemalloc.start()
+        with_filters(SeenIds(database))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'filters peak allocation: {peak / 2 ** 20:.1f} MiB')
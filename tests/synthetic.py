@@ -0,0 +1,98 @@
+"""Generate large synthetic databases.
+
+Run with `python -m tests.synthetic DATABASE [--podcasts N] [--episodes N]`.
+Podcasts and episodes are shaped like real ones, with long GUID URLs, titles,
+summaries and, for most episodes, download records, so that indexes, the
+full-text index and triggers are exercised as they are in use.
+"""
+import argparse
+import pathlib
+import random
+import time
+import typing as tp
+
+from podd.database import Database
+from podd.utilities import create_database, upgrade_database
+
+# Rows inserted per executemany call
+BATCH = 10000
+WORDS = ('history war science politics music interview comedy news economy '
+         'technology sports culture health crime space art film design').split()
+
+
+def podcast_url(podcast: int) -> str:
+    return f'https://feeds.podcast{podcast}.example.com/rss'
+
+
+def feed_id(podcast: int, episode: int) -> str:
+    return f'https://podcast{podcast}.example.com/episodes/{episode:06}-{"x" * 40}'
+
+
+def episode_rows(podcasts: int, episodes: int, directory: str) -> tp.Iterator[tuple]:
+    """Yield rows of the episodes table, excluding ids."""
+    rand = random.Random(podcasts * episodes)
+    topics = [' '.join(rand.sample(WORDS, 4)) for _ in range(997)]
+    summaries = [' '.join(rand.choices(WORDS, k=30)) for _ in range(1009)]
+    start = time.mktime((2010, 1, 1, 0, 0, 0, 0, 0, 0))
+    for podcast in range(1, podcasts + 1):
+        for episode in range(episodes):
+            n = podcast * episodes + episode
+            published = time.strftime(
+                '%Y-%m-%d %H:%M:%S', time.gmtime(start + episode * 604800 + podcast))
+            title = f'Episode {episode}: {topics[n % len(topics)]}'
+            summary = summaries[n % len(summaries)]
+            length = (10 + n % 140) * 2 ** 20
+            downloaded = episode >= episodes - 20 or n % 5
+            yield (
+                feed_id(podcast, episode), podcast, title, summary, published,
+                f'https://cdn.example.com/{podcast}/{episode}.mp3', length,
+                length if downloaded else None,
+                f'{directory}/podcast{podcast}/{title}.mp3' if downloaded else None,
+                published if downloaded else None,
+                f'{rand.getrandbits(256):064x}' if downloaded else None,
+            )
+
+
+def generate(database: str, podcasts: int = 10000, episodes: int = 200,
+             directory: str = '/podcasts') -> None:
+    """Create database with `podcasts` subscriptions of `episodes` episodes each.
+
+    :param database: location of database file, which must not exist
+    :param podcasts: number of podcasts
+    :param episodes: number of episodes per podcast
+    :param directory: download root
+    """
+    create_database(database, pathlib.Path(directory))
+    with Database(database) as db:
+        db.cursor.execute('PRAGMA synchronous=OFF')
+        # Triggers are recreated by `upgrade_database` once the index is rebuilt
+        db.cursor.execute('DROP TRIGGER episodes_fts_insert')
+        db.cursor.executemany(
+            'INSERT INTO podcasts (id, name, url, directory) VALUES (?, ?, ?, ?)',
+            ((n, f'Podcast {n}', podcast_url(n), f'{directory}/podcast{n}')
+             for n in range(1, podcasts + 1)))
+        rows = episode_rows(podcasts, episodes, directory)
+        while True:
+            batch = [row for _, row in zip(range(BATCH), rows)]
+            if not batch:
+                break
+            db.cursor.executemany(
+                'INSERT INTO episodes (feed_id, podcast_id, title, summary, published, '
+                'url, length, size, path, downloaded, sha256) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', batch)
+        db.cursor.execute("INSERT INTO episodes_fts (episodes_fts) VALUES ('rebuild')")
+    upgrade_database(database)
+    with Database(database) as db:
+        db.cursor.execute('ANALYZE')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('database')
+    parser.add_argument('--podcasts', type=int, default=10000)
+    parser.add_argument('--episodes', type=int, default=200, help='Episodes per podcast.')
+    args = parser.parse_args()
+    began = time.perf_counter()
+    generate(args.database, args.podcasts, args.episodes)
+    print(f'Generated {args.podcasts} podcasts of {args.episodes} episodes '
+          f'in {time.perf_counter() - began:.1f} s')
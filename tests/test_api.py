@@ -0,0 +1,127 @@
+"""Test embeddable API."""
+import asyncio
+from contextlib import redirect_stdout
+from io import StringIO
+from os import path
+import pathlib
+import shutil
+from time import gmtime
+import unittest as ut
+from unittest.mock import MagicMock, patch
+
+import feedparser as fp
+
+from podd.api import AsyncClient, Client, Progress
+from podd.database import Database
+from podd.fetch import FeedStats
+from podd.utilities import create_database
+
+DIRECTORY = path.join(path.dirname(path.abspath(__file__)), 'api')
+DATABASE = path.join(DIRECTORY, 'api.db')
+URL = 'examplepodcast.com/feed.rss'
+ARTWORK = MagicMock(return_value=MagicMock(path=lambda url: None))
+
+
+def entry(number):
+    return fp.FeedParserDict(
+        id=str(number), title=f'Episode {number}', published_parsed=gmtime(number * 86400),
+        links=[fp.FeedParserDict(type='audio/mpeg', href=f'http://cdn.com/{number}.mp3',
+                                 length='5')])
+
+
+def feed(*numbers, url=URL):
+    return fp.FeedParserDict(feed=fp.FeedParserDict(title='Example Podcast'),
+                             entries=[entry(n) for n in reversed(numbers)], href=url)
+
+
+def fetched(*numbers):
+    return lambda url, archive=None: (
+        feed(*numbers), FeedStats(url, '2019-06-01 12:00:00', 100, 0.1, 0.1, len(numbers), False))
+
+
+def response(*args, **kwargs):
+    resp = MagicMock(ok=True)
+    resp.iter_content.return_value = [b'audio']
+    return resp
+
+
+class TestClient(ut.TestCase):
+
+    def setUp(self):
+        pathlib.Path(DIRECTORY).mkdir()
+        create_database(DATABASE, pathlib.Path(DIRECTORY))
+
+    def tearDown(self):
+        shutil.rmtree(DIRECTORY)
+
+    @patch('podd.database.fetch_feed', lambda url: feed(1, 2) if url == URL else feed(url=url))
+    def test_add_feeds(self):
+        output = StringIO()
+        with Client(DATABASE) as client, redirect_stdout(output):
+            added = client.add_feeds([URL, 'empty.com/feed.rss', URL], newest_only=True)
+            self.assertEqual(['added', 'empty', 'exists'], [a.status for a in added])
+            self.assertEqual(path.join(DIRECTORY, 'Example Podcast'), added[0].directory)
+            self.assertEqual([('Example Podcast', URL, added[0].directory)],
+                             client.subscriptions())
+        self.assertEqual('', output.getvalue())
+
+    @patch('podd.api.ArtworkCache', ARTWORK)
+    @patch('podd.podcast.get', response)
+    def test_refresh_and_download(self):
+        events, output = [], StringIO()
+        with patch('podd.database.fetch_feed', lambda url: feed(1, 2)), redirect_stdout(output):
+            with Client(DATABASE, tagging_processes=1) as client:
+                client.add_feeds([URL], newest_only=True)
+                with patch('podd.downloader.timed_fetch', fetched(1, 2, 3)):
+                    refreshed = client.refresh(progress=events.append)
+                    pool = client._pool
+                    self.assertEqual(['Episode 3', 'Episode 2'],
+                                     [ep.title for ep in refreshed[0].episodes])
+                    report = client.download(refreshed[0].episodes, progress=events.append)
+                    self.assertIs(pool, client._pool)
+                    self.assertEqual([], client.refresh()[0].episodes)
+                    self.assertEqual([], client.refresh(subscriptions=['other.com/feed.rss']))
+        self.assertEqual(2, len(report.downloaded))
+        self.assertEqual([], report.failed)
+        self.assertEqual(Progress('refresh', 'Example Podcast', None, 1, 1), events[0])
+        self.assertEqual([1, 2], sorted(event.done for event in events[1:]))
+        self.assertEqual('', output.getvalue())
+        with Database(DATABASE) as db:
+            self.assertEqual({'1', '2', '3'}, db.get_episodes(URL))
+            self.assertEqual(2, len(db.get_feed_history()))  # Refresh stats recorded
+
+    @patch('podd.api.ArtworkCache', ARTWORK)
+    @patch('podd.podcast.get', response)
+    def test_tagging_crash(self):
+        tagger = MagicMock()
+        tagger.apply_async.return_value.get.side_effect = RuntimeError('worker died')
+        with patch('podd.database.fetch_feed', lambda url: feed(1)):
+            with Client(DATABASE) as client:
+                client.add_feeds([URL], newest_only=True)
+                client._tagger = tagger
+                with patch('podd.downloader.timed_fetch', fetched(1, 2)):
+                    report = client.download(client.refresh()[0].episodes)
+                client._tagger = None
+        self.assertEqual({'tagging error (RuntimeError)': 1}, dict(report.tag_failures))
+        with Database(DATABASE) as db:
+            self.assertEqual({'1', '2'}, db.get_episodes(URL))  # Recorded anyway
+
+    @patch('podd.database.fetch_feed', lambda url: feed(1))
+    def test_async(self):
+        events = []
+
+        async def main():
+            async with AsyncClient(DATABASE) as client:
+                added = await client.add_feeds([URL])
+                with patch('podd.downloader.timed_fetch', fetched(1, 2)):
+                    refreshed = await client.refresh(progress=events.append)
+            return added, refreshed
+
+        added, refreshed = asyncio.run(main())
+        self.assertEqual('added', added[0].status)
+        self.assertEqual(['Episode 2', 'Episode 1'], [ep.title for ep in refreshed[0].episodes])
+        self.assertEqual(1, len(events))
+
+
+if __name__ == '__main__':
+    ut.main()
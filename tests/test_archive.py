@@ -0,0 +1,86 @@
+"""Test feed archive and offline replay."""
+from multiprocessing.dummy import Pool as ThreadPool
+from os import path
+import pathlib
+import shutil
+import unittest as ut
+from unittest.mock import MagicMock, patch
+
+from podd.archive import FeedArchive, replay
+from podd.database import Database
+from podd.fetch import fetch_feed
+from podd.utilities import create_database
+
+DIRECTORY = path.join(path.dirname(path.abspath(__file__)), 'archive')
+DATABASE = path.join(DIRECTORY, 'archive.db')
+URL = 'http://examplepodcast.com/feed.rss'
+HEADERS = {'content-type': 'application/rss+xml; charset=utf-8'}
+
+
+def rss(*numbers):
+    items = ''.join(
+        f'<item><guid>{n}</guid><title>Episode {n}</title>'
+        f'<pubDate>Mon, 0{n} Jul 2019 10:00:00 GMT</pubDate>'
+        f'<enclosure url="http://cdn.com/{n}.mp3" type="audio/mpeg" length="5"/></item>'
+        for n in reversed(numbers))
+    return (f'<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+            f'<title>Example Podcast</title>{items}</channel></rss>').encode()
+
+
+class TestFeedArchive(ut.TestCase):
+
+    def setUp(self):
+        pathlib.Path(DIRECTORY).mkdir()
+        self.archive = FeedArchive(pathlib.Path(DIRECTORY) / 'feeds')
+
+    def tearDown(self):
+        shutil.rmtree(DIRECTORY)
+
+    def test_store(self):
+        first = self.archive.store(URL, rss(1, 2), HEADERS, fetched=100)
+        self.archive.store(URL, rss(1, 2), HEADERS, fetched=200)
+        self.archive.store(URL, rss(1, 2, 3), HEADERS, 'http://moved.com/feed.rss', 300)
+        self.assertEqual(2, self.archive.usage()[0])
+        self.assertEqual([100, 200, 300], [f.fetched for f in self.archive.fetches(URL)])
+        self.assertEqual([], self.archive.fetches('http://other.com/feed.rss'))
+        self.assertEqual(first, self.archive.latest(URL, before=200))
+        self.assertEqual(rss(1, 2), self.archive.body(first.sha256))
+        feed = self.archive.parse(self.archive.latest(URL))
+        self.assertEqual(['3', '2', '1'], [entry.id for entry in feed.entries])
+        self.assertEqual('http://moved.com/feed.rss', feed.href)
+
+    def test_concurrent_store(self):
+        urls = [f'http{"s" * (n % 2)}://examplepodcast.com/feed.rss?{n}' for n in range(32)]
+        with ThreadPool(8) as pool:
+            pool.map(lambda url: self.archive.store(url, rss(1, 2), HEADERS), urls)
+        self.assertEqual(1, self.archive.usage()[0])
+        self.assertEqual(rss(1, 2), self.archive.body(self.archive.latest(urls[-1]).sha256))
+
+    @patch('podd.fetch.get')
+    def test_fetch_feed(self, mock_get):
+        mock_get.return_value = MagicMock(content=rss(1), headers=HEADERS, url=URL)
+        feed = fetch_feed(URL, archive=self.archive)
+        self.assertEqual('Example Podcast', feed.feed.title)
+        (fetch,) = self.archive.fetches(URL)
+        self.assertEqual(HEADERS, fetch.headers)
+
+    def test_replay(self):
+        create_database(DATABASE, pathlib.Path(DIRECTORY))
+        with Database(DATABASE) as db:
+            db.add_podcast('Example Podcast', URL, DIRECTORY)
+            db.add_podcast('Other Podcast', 'http://other.com/feed.rss', DIRECTORY)
+            db.add_episode(URL, '1')
+        self.archive.store(URL, rss(1, 2, 3), HEADERS)
+        (example, other) = replay(DATABASE, self.archive)
+        self.assertEqual(2, example.episodes)
+        self.assertIsNone(other.fetched)
+        (only,) = replay(DATABASE, self.archive, podcast='example')
+        self.assertEqual(example[:4], only[:4])
+        with Database(DATABASE) as db:
+            self.assertEqual({'1'}, db.get_episodes(URL))
+            self.assertIsNone(db.get_seen_token(create=False))  # Wrote nothing
+        self.assertFalse(path.exists(path.join(DIRECTORY, 'archive.seen')))
+
+
+if __name__ == '__main__':
+    ut.main()
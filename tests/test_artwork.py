@@ -0,0 +1,113 @@
+"""Test artwork cache and cover art embedding."""
+from os import listdir, path, remove, utime
+import shutil
+import unittest as ut
+from unittest.mock import MagicMock, patch
+
+from mutagen.mp3 import MP3
+
+from podd.artwork import ArtworkCache
+from podd.tagging import TagJob, tag_file
+
+CACHE = path.join(path.dirname(path.abspath(__file__)), 'artwork')
+FILE = path.join(path.dirname(path.abspath(__file__)), 'cover.mp3')
+FRAMES = (b'\xff\xfb\x90\x64' + bytes(413)) * 40
+PNG = b'\x89PNG\r\n\x1a\n' + bytes(100)
+JPEG = b'\xff\xd8\xff\xe0' + bytes(200)
+
+
+def response(content=b'', status=200, etag=None):
+    resp = MagicMock(content=content, status_code=status, ok=status < 400)
+    resp.headers = {'ETag': etag} if etag else {}
+    return resp
+
+
+class TestArtworkCache(ut.TestCase):
+
+    def tearDown(self):
+        shutil.rmtree(CACHE)
+
+    @patch('podd.artwork.get')
+    def test_fetched_once_and_shared(self, mock_get):
+        mock_get.return_value = response(PNG, etag='"v1"')
+        cache = ArtworkCache(CACHE)
+        one = cache.path('http://a.com/art.png')
+        self.assertEqual(one, cache.path('http://a.com/art.png'))
+        two = cache.path('http://b.com/same-art.png')
+        self.assertEqual(2, mock_get.call_count)
+        self.assertEqual(one, two)  # Same content, same blob
+        self.assertEqual(1, len(listdir(path.join(CACHE, 'blobs'))))
+        with open(one, 'rb') as file:
+            self.assertEqual(PNG, file.read())
+
+    @patch('podd.artwork.get')
+    def test_revalidation(self, mock_get):
+        mock_get.return_value = response(PNG, etag='"v1"')
+        first = ArtworkCache(CACHE).path('http://a.com/art.png')
+        mock_get.return_value = response(status=304)
+        self.assertEqual(first, ArtworkCache(CACHE).path('http://a.com/art.png'))
+        self.assertEqual({'If-None-Match': '"v1"'}, mock_get.call_args[1]['headers'])
+        mock_get.return_value = response(JPEG, etag='"v2"')
+        second = ArtworkCache(CACHE).path('http://a.com/art.png')
+        self.assertNotEqual(first, second)
+        mock_get.return_value = response(status=500)
+        self.assertEqual(second, ArtworkCache(CACHE).path('http://a.com/art.png'))
+
+    @patch('podd.artwork.get')
+    def test_eviction(self, mock_get):
+        cache = ArtworkCache(CACHE, max_bytes=2 * len(JPEG) + 3)
+        mock_get.return_value = response(PNG)
+        old = cache.path('http://a.com/art.png')
+        utime(old, (0, 0))
+        mock_get.return_value = response(JPEG)
+        cache.path('http://b.com/art.jpg')
+        mock_get.return_value = response(JPEG + b'new')
+        cache.path('http://c.com/art.jpg')
+        self.assertFalse(path.exists(old))
+        self.assertEqual(2, len(listdir(path.join(CACHE, 'blobs'))))
+
+    @patch('podd.artwork.get')
+    def test_concurrent_eviction(self, mock_get):
+        cache = ArtworkCache(CACHE, max_bytes=len(JPEG))
+        mock_get.return_value = response(PNG)
+        cache.path('http://a.com/art.png')
+        mock_get.return_value = response(JPEG)
+        with patch('podd.artwork.os.remove', side_effect=FileNotFoundError):
+            self.assertIsNotNone(cache.path('http://b.com/art.jpg'))  # Evicted elsewhere
+
+    @patch('podd.artwork.get')
+    def test_unreadable_entry(self, mock_get):
+        mock_get.return_value = response(PNG, etag='"v1"')
+        first = ArtworkCache(CACHE).path('http://a.com/art.png')
+        entry = path.join(CACHE, 'urls', listdir(path.join(CACHE, 'urls'))[0])
+        with open(entry, 'w') as file:
+            file.write('{"url": "http://a.co')  # Interrupted write
+        self.assertEqual(first, ArtworkCache(CACHE).path('http://a.com/art.png'))
+        self.assertEqual({}, mock_get.call_args[1]['headers'])  # Treated as a miss
+        self.assertEqual(['blobs', 'urls'], sorted(listdir(CACHE)))
+        self.assertEqual(1, len(listdir(path.join(CACHE, 'urls'))))
+
+    def test_no_url(self):
+        self.assertIsNone(ArtworkCache(CACHE).path(None))
+
+
+class TestEmbedding(ut.TestCase):
+
+    def tearDown(self):
+        remove(FILE)
+
+    @patch('podd.artwork.get')
+    def test_embed_mp3_cover(self, mock_get):
+        mock_get.return_value = response(JPEG)
+        with open(FILE, 'wb') as file:
+            file.write(FRAMES)
+        artwork = ArtworkCache(CACHE).path('http://a.com/art.jpg')
+        self.assertIsNone(tag_file(TagJob(FILE, 'Episode', 'Example Podcast', artwork=artwork)))
+        shutil.rmtree(CACHE)
+        cover = MP3(FILE).tags.getall('APIC')[0]
+        self.assertEqual('image/jpeg', cover.mime)
+        self.assertEqual(JPEG, cover.data)
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,75 @@
+"""Test episode catalog and full-text search."""
+from os import path, remove
+import pathlib
+import unittest as ut
+
+from podd.database import Database
+from podd.utilities import create_database
+
+DATABASE = path.join(path.dirname(path.abspath(__file__)), 'catalog.db')
+DIRECTORY = pathlib.Path('/path/to/place/files')
+NAME = 'example podcast'
+URL = 'examplepodcast.com/feed.rss'
+URL2 = 'otherpodcast.com/feed.rss'
+
+
+class TestCatalog(ut.TestCase):
+
+    def setUp(self):
+        create_database(DATABASE, DIRECTORY)
+        with Database(DATABASE) as db:
+            db.add_podcast(name=NAME, url=URL, directory=str(DIRECTORY))
+            db.add_podcast(name='other', url=URL2, directory=str(DIRECTORY))
+            db.add_episode(URL, '1', title='Episode 1: Sourdough starters',
+                           summary='All about wild yeast.', published='2019-05-01 10:00:00',
+                           url='cdn.com/1.mp3', length=100, size=100, path='/p/1.mp3',
+                           downloaded='2019-05-02 08:00:00')
+            db.add_episode(URL, '2', title='Episode 2: Croissants',
+                           summary='Lamination, butter and yeast.', published='2019-06-01 10:00:00',
+                           url='cdn.com/2.mp3', length=200, size=200, path='/p/2.mp3',
+                           downloaded='2019-06-02 08:00:00')
+            db.add_episode(URL2, '3', title='Yeast in brewing')
+            db.add_episode(URL2, '4')  # Seeded without metadata, like older versions
+
+    def tearDown(self):
+        remove(DATABASE)
+
+    def test_search_text(self):
+        with Database(DATABASE) as db:
+            titles = [r[1] for r in db.search('yeast')]
+            self.assertCountEqual(['Episode 1: Sourdough starters', 'Episode 2: Croissants',
+                                   'Yeast in brewing'], titles)
+            self.assertEqual(['Episode 2: Croissants'], [r[1] for r in db.search('butter')])
+            self.assertEqual([], db.search('"unbalanced'))
+
+    def test_subscription_stats(self):
+        with Database(DATABASE) as db:
+            db.clear_episode_files([1])
+            example, other = db.get_subscription_stats()
+        self.assertEqual((NAME, URL, 2, 1, 200, '2019-06-01 10:00:00', '2019-06-02 08:00:00'),
+                         example[:2] + example[3:])
+        self.assertEqual(('other', 2, 0, 0, None, None), (other.name, *other[3:]))
+
+    def test_search_filters(self):
+        with Database(DATABASE) as db:
+            self.assertEqual(['Yeast in brewing'], [r[1] for r in db.search('yeast', podcast='oth')])
+            self.assertEqual(['Episode 2: Croissants'],
+                             [r[1] for r in db.search('yeast', since='2019-06-01')])
+
+    def test_list_downloaded(self):
+        with Database(DATABASE) as db:
+            results = db.search()
+        self.assertEqual([(NAME, 'Episode 2: Croissants', '2019-06-01 10:00:00',
+                           '2019-06-02 08:00:00', '/p/2.mp3'),
+                          (NAME, 'Episode 1: Sourdough starters', '2019-05-01 10:00:00',
+                           '2019-05-02 08:00:00', '/p/1.mp3')], results)
+
+    def test_index_follows_deletes(self):
+        with Database(DATABASE) as db:
+            db.remove_podcast(URL)
+            self.assertEqual(['Yeast in brewing'], [r[1] for r in db.search('yeast')])
+            self.assertEqual({'3', '4'}, db.get_episodes(URL2))
+
+
+if __name__ == '__main__':
+    ut.main()
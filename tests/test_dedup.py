@@ -0,0 +1,119 @@
+"""Test deduplication of downloaded files."""
+from hashlib import sha256
+from os import path, remove
+import pathlib
+import shutil
+import unittest as ut
+from unittest.mock import MagicMock, patch
+
+import feedparser as fp
+
+from podd.database import Database
+from podd.podcast import Episode
+from podd.utilities import create_database
+
+DIRECTORY = path.join(path.dirname(path.abspath(__file__)), 'dedup')
+DATABASE = path.join(DIRECTORY, 'dedup.db')
+URL = 'examplepodcast.com/feed.rss'
+AUDIO = b'\xff\xfb\x90\x64' + bytes(5000)
+
+
+def episode(title, url):
+    entry = fp.FeedParserDict(id=title, title=title, links=[
+        fp.FeedParserDict(type='audio/mpeg', href=url, length=str(len(AUDIO)))])
+    return Episode(DIRECTORY, entry, 'Example Podcast', URL)
+
+
+def response(content):
+    resp = MagicMock(ok=True)
+    resp.iter_content.return_value = [content[:1000], content[1000:]]
+    return resp
+
+
+class TestDeduplication(ut.TestCase):
+
+    def setUp(self):
+        pathlib.Path(DIRECTORY).mkdir(exist_ok=True)
+        create_database(DATABASE, pathlib.Path(DIRECTORY))
+
+    def tearDown(self):
+        shutil.rmtree(DIRECTORY)
+
+    @patch('podd.podcast.get')
+    def test_hash_while_downloading(self, mock_get):
+        mock_get.return_value = response(AUDIO)
+        ep = episode('Episode 1', 'http://cdn.com/1.mp3')
+        ep.download()
+        self.assertEqual(sha256(AUDIO).hexdigest(), ep.sha256)
+        self.assertEqual(ep.sha256, ep.record()['sha256'])
+
+    @patch('podd.podcast.get')
+    def test_known_url_linked(self, mock_get):
+        mock_get.return_value = response(AUDIO)
+        first = episode('Episode 1', 'http://cdn.com/1.mp3')
+        first.download()
+        second = episode('Cross-posted episode 1', 'http://cdn.com/1.mp3')
+        second.known = (first.filename, first.sha256)
+        second.download()
+        self.assertEqual(1, mock_get.call_count)
+        self.assertTrue(path.samefile(first.filename, second.filename))
+        self.assertEqual(first.sha256, second.sha256)
+        self.assertIsNone(second.tag_job())  # Shares first's tags
+
+    @patch('podd.podcast.get')
+    def test_missing_known_file_downloaded(self, mock_get):
+        mock_get.return_value = response(AUDIO)
+        ep = episode('Episode 1', 'http://cdn.com/1.mp3')
+        ep.known = (path.join(DIRECTORY, 'gone.mp3'), 'abc')
+        ep.download()
+        self.assertEqual(1, mock_get.call_count)
+        self.assertEqual(sha256(AUDIO).hexdigest(), ep.sha256)
+
+    @patch('podd.podcast.get')
+    def test_identical_content_linked(self, mock_get):
+        mock_get.return_value = response(AUDIO)
+        first = episode('Episode 1', 'http://cdn.com/1.mp3')
+        first.download()
+        second = episode('Episode 1 again', 'http://cdn.com/regenerated/1.mp3')
+        second.download()
+        self.assertFalse(path.samefile(first.filename, second.filename))
+        self.assertTrue(second.link(first.filename))
+        self.assertTrue(path.samefile(first.filename, second.filename))
+        self.assertFalse(path.exists(second.filename + '.link'))
+
+    @patch('podd.podcast.get')
+    def test_other_podcast_copied(self, mock_get):
+        mock_get.return_value = response(AUDIO)
+        first = episode('Episode 1', 'http://cdn.com/1.mp3')
+        first.download()
+        pathlib.Path(DIRECTORY, 'Other').mkdir()
+        entry = fp.FeedParserDict(id='1', title='Episode 1', links=[
+            fp.FeedParserDict(type='audio/mpeg', href='http://cdn.com/1.mp3')])
+        second = Episode(path.join(DIRECTORY, 'Other'), entry, 'Other Podcast', 'other.com/feed.rss')
+        second.known = (first.filename, first.sha256)
+        second.download()
+        self.assertEqual(1, mock_get.call_count)
+        self.assertFalse(path.samefile(first.filename, second.filename))
+        self.assertEqual(AUDIO, open(second.filename, 'rb').read())
+        self.assertEqual('Other Podcast', second.tag_job().podcast_name)  # Tagged separately
+
+    def test_lookups(self):
+        with open(path.join(DIRECTORY, '1.mp3'), 'wb') as file:
+            file.write(AUDIO)
+        with Database(DATABASE) as db:
+            db.add_podcast('Example Podcast', URL, DIRECTORY)
+            db.add_episode(URL, '1', url='http://cdn.com/1.mp3', sha256='abc',
+                           path=path.join(DIRECTORY, '1.mp3'), downloaded='2019-05-02 08:00:00')
+            db.add_episode(URL, '2', url='http://cdn.com/2.mp3', sha256='abc',
+                           path=path.join(DIRECTORY, 'gone.mp3'), downloaded='2019-06-02 08:00:00')
+            db.add_episode(URL, '3', url='http://cdn.com/3.mp3')
+            files = db.get_files(['http://cdn.com/1.mp3', 'http://cdn.com/3.mp3'])
+            self.assertEqual({'http://cdn.com/1.mp3': (path.join(DIRECTORY, '1.mp3'), 'abc')},
+                             files)
+            self.assertEqual(path.join(DIRECTORY, '1.mp3'), db.get_file_by_hash('abc'))
+            self.assertIsNone(db.get_file_by_hash('abc', exclude=path.join(DIRECTORY, '1.mp3')))
+            self.assertIsNone(db.get_file_by_hash('def'))
+
+
+if __name__ == '__main__':
+    ut.main()
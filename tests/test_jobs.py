@@ -0,0 +1,201 @@
+"""Test durable download queue."""
+from multiprocessing import Pool
+from os import listdir, path
+import pathlib
+import shutil
+from time import gmtime
+import unittest as ut
+from unittest.mock import MagicMock, patch
+
+import feedparser as fp
+
+from podd import jobs
+from podd.database import Database
+from podd.downloader import worker
+from podd.jobs import JobQueue, Worker, episode_from_payload, episode_payload
+from podd.podcast import Episode
+from podd.utilities import create_database
+
+DIRECTORY = path.join(path.dirname(path.abspath(__file__)), 'jobs')
+DATABASE = path.join(DIRECTORY, 'jobs.db')
+URL = 'examplepodcast.com/feed.rss'
+
+
+def episode(number):
+    entry = fp.FeedParserDict(
+        id=str(number), title=f'Episode {number}', summary='Summary',
+        published_parsed=gmtime(number * 86400), itunes_episode=str(number),
+        image=fp.FeedParserDict(href='http://a.com/ep.jpg'),
+        links=[fp.FeedParserDict(type='audio/mpeg', href=f'http://cdn.com/{number}.mp3',
+                                 length='100')])
+    return Episode(DIRECTORY, entry, 'Example Podcast', URL, 'http://a.com/art.jpg')
+
+
+def drain(_):
+    claimed = []
+    while True:
+        with JobQueue(DATABASE) as queue:
+            job = queue.claim('test')
+        if job is None:
+            return claimed
+        claimed.append(job[0])
+
+
+class TestJobQueue(ut.TestCase):
+
+    def setUp(self):
+        pathlib.Path(DIRECTORY).mkdir()
+        create_database(DATABASE, pathlib.Path(DIRECTORY))
+        with Database(DATABASE) as db:
+            db.add_podcast('Example Podcast', URL, DIRECTORY)
+
+    def tearDown(self):
+        shutil.rmtree(DIRECTORY)
+
+    def test_payload(self):
+        original = episode(3)
+        original.backlog = True
+        copy = episode_from_payload(episode_payload(original))
+        for attribute in ('title', 'summary', 'url', 'length', 'published', 'filename',
+                          'image', 'number', 'podcast_image', 'backlog'):
+            self.assertEqual(getattr(original, attribute), getattr(copy, attribute))
+
+    def test_claim_in_order_once(self):
+        with JobQueue(DATABASE) as queue:
+            self.assertEqual(2, queue.enqueue([episode(2), episode(1)]))
+            self.assertEqual(0, queue.enqueue([episode(1)]))
+            first, second = queue.claim('a'), queue.claim('b')
+            self.assertIsNone(queue.claim('c'))
+            self.assertEqual(['Episode 2', 'Episode 1'], [first[2].title, second[2].title])
+            self.assertEqual({'leased': 2}, queue.counts())
+
+    def test_lease_expiry(self):
+        with JobQueue(DATABASE) as queue:
+            queue.enqueue([episode(1)])
+            job_id, lease, ep = queue.claim('a')
+            with patch('podd.jobs.time.time', return_value=jobs.time.time() + 1000):
+                stolen = queue.claim('b')
+            self.assertEqual(job_id, stolen[0])
+            self.assertFalse(queue.complete(job_id, lease, ep))
+            self.assertTrue(queue.complete(job_id, stolen[1], stolen[2]))
+            self.assertEqual({'done': 1}, queue.counts())
+            self.assertEqual({'1'}, queue.get_episodes(URL))
+
+    def test_renew(self):
+        with JobQueue(DATABASE) as queue:
+            queue.enqueue([episode(1)])
+            _, lease, _ = queue.claim('a')
+            with patch('podd.jobs.time.time', return_value=jobs.time.time() + 200):
+                queue.renew([lease])
+            with patch('podd.jobs.time.time', return_value=jobs.time.time() + 400):
+                self.assertIsNone(queue.claim('b'))
+
+    def test_failures(self):
+        with JobQueue(DATABASE) as queue:
+            queue.enqueue([episode(1)])
+            for _ in range(jobs.MAX_ATTEMPTS):
+                job_id, lease, _ = queue.claim('a')
+                queue.fail(job_id, lease, 'download failed')
+            self.assertEqual({'failed': 1}, queue.counts())
+            self.assertIsNone(queue.claim('a'))
+            self.assertEqual(1, queue.enqueue([episode(1)]))
+            self.assertEqual({'pending': 1}, queue.counts())
+
+    def test_done_requeued_only_when_forgotten(self):
+        with JobQueue(DATABASE) as queue:
+            queue.enqueue([episode(1)])
+            job_id, lease, ep = queue.claim('a')
+            queue.complete(job_id, lease, ep)
+            self.assertEqual(0, queue.enqueue([episode(1)]))  # Still on record
+            replacement = episode(1)
+            replacement.replaces = 1
+            self.assertEqual(1, queue.enqueue([replacement]))
+            job_id, lease, ep = queue.claim('a')
+            queue.complete(job_id, lease, ep)
+            queue.cursor.execute('DELETE FROM episodes')
+            queue._conn.commit()
+            self.assertEqual(1, queue.enqueue([episode(1)]))
+            self.assertEqual({'pending': 1}, queue.counts())
+
+    def test_expired_leases_fail(self):
+        with JobQueue(DATABASE) as queue:
+            queue.enqueue([episode(1)])
+            now = jobs.time.time()
+            for attempt in range(1, jobs.MAX_ATTEMPTS + 1):
+                with patch('podd.jobs.time.time', return_value=now + 1000 * attempt):
+                    self.assertIsNotNone(queue.claim('crashing'))
+            with patch('podd.jobs.time.time', return_value=now + 1000 * attempt + 1000):
+                self.assertIsNone(queue.claim('a'))
+            self.assertEqual({'failed': 1}, queue.counts())
+
+    def test_concurrent_workers(self):
+        with JobQueue(DATABASE) as queue:
+            queue.enqueue([episode(n) for n in range(40)])
+        with Pool(4) as pool:
+            claimed = [job for jobs_ in pool.map(drain, range(4)) for job in jobs_]
+        self.assertEqual(40, len(claimed))
+        self.assertEqual(40, len(set(claimed)))
+
+    @patch('podd.jobs.ArtworkCache', MagicMock())
+    @patch('podd.podcast.get')
+    def test_worker(self, mock_get):
+        resp = MagicMock(ok=True)
+        resp.iter_content.side_effect = lambda size: [b'audio']
+        mock_get.return_value = resp
+        with JobQueue(DATABASE) as queue:
+            queue.enqueue([episode(n) for n in range(5)])
+        events = []
+        work = Worker(threads=2, db_file=DATABASE, progress=events.append)
+        work.run()
+        self.assertEqual(5, len(work.done))
+        self.assertEqual(sorted(work.done, key=id), sorted(events, key=id))
+        with JobQueue(DATABASE) as queue:
+            self.assertEqual({'done': 5}, queue.counts())
+            self.assertEqual(5, len(queue.search()))
+            self.assertEqual(5, queue.purge())
+
+
+    @patch('podd.jobs.ArtworkCache', MagicMock())
+    @patch('podd.jobs.Worker._process', side_effect=RuntimeError('tagging crashed'))
+    def test_worker_exception(self, _):
+        with JobQueue(DATABASE) as queue:
+            queue.enqueue([episode(n) for n in range(2)])
+        work = Worker(threads=2, db_file=DATABASE)
+        work.run()
+        self.assertEqual(2 * jobs.MAX_ATTEMPTS, len(work.failed))
+        with JobQueue(DATABASE) as queue:
+            self.assertEqual({'failed': 2}, queue.counts())
+            queue.cursor.execute('SELECT DISTINCT error FROM jobs')
+            self.assertEqual([('RuntimeError: tagging crashed',)], queue.cursor.fetchall())
+
+    @patch('podd.jobs.ArtworkCache', MagicMock())
+    @patch('podd.jobs.Episode.tag', side_effect=RuntimeError('tagging crashed'))
+    @patch('podd.podcast.get')
+    def test_partial_replacement_removed(self, mock_get, _):
+        resp = MagicMock(ok=True)
+        resp.iter_content.side_effect = lambda size: [b'audio']
+        mock_get.return_value = resp
+        replacement = episode(1)
+        replacement.replaces = 1
+        with open(replacement.filename, 'wb') as file:
+            file.write(b'old')
+        with JobQueue(DATABASE) as queue:
+            queue.enqueue([replacement])
+        with patch('podd.jobs.MAX_ATTEMPTS', 1):
+            Worker(threads=1, db_file=DATABASE).run()
+        self.assertEqual(['Episode 1.mp3'], [f for f in listdir(DIRECTORY) if '.mp3' in f])
+        with open(replacement.filename, 'rb') as file:
+            self.assertEqual(b'old', file.read())
+
+    @patch('podd.jobs.ArtworkCache', MagicMock())
+    def test_purge_after_work(self):
+        with JobQueue(DATABASE) as queue:
+            queue.enqueue([episode(1)])
+            job_id, lease, ep = queue.claim('a')
+            queue.complete(job_id, lease, ep)
+        worker(threads=1, purge=True, database=DATABASE)
+        with JobQueue(DATABASE) as queue:
+            self.assertEqual({}, queue.counts())
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,51 @@
+"""Test rendering of notification emails."""
+from os import listdir, path
+import pathlib
+import shutil
+from types import SimpleNamespace
+import unittest as ut
+from unittest.mock import patch
+
+from podd.message import Message, get_template
+from podd.settings import Config
+
+CACHE = pathlib.Path(path.dirname(path.abspath(__file__))) / 'templates'
+EPISODES = [SimpleNamespace(title='Episode 1 & 2', summary='<p>Summary</p>', image=None),
+            SimpleNamespace(title='Episode 3', summary=None, image='http://a.com/3.jpg')]
+PODCASTS = [('Example Podcast', 'http://a.com/art.jpg', EPISODES)]
+
+
+class TestMessage(ut.TestCase):
+
+    def setUp(self):
+        self.patch = patch.object(Config, 'template_cache_directory', CACHE)
+        self.patch.start()
+        get_template.cache_clear()
+
+    def tearDown(self):
+        self.patch.stop()
+        get_template.cache_clear()
+        shutil.rmtree(CACHE)
+
+    def test_render(self):
+        message = Message(PODCASTS, 'from@a.com', 'password', 'to@a.com')
+        self.assertIn('<p>Summary</p>', message.html)
+        self.assertIn('Episode 1 &amp; 2', message.html)
+        self.assertIn('http://a.com/3.jpg', message.html)
+        self.assertIn('~~Example Podcast~~', message.text)
+        with patch.object(Message, 'render_html') as mock_render:
+            self.assertIn('~~Example Podcast~~', message.mime().as_string())
+        mock_render.assert_not_called()  # Rendered once
+
+    def test_templates_compiled_once(self):
+        self.assertIs(get_template('base.html'), get_template('base.html'))
+        get_template('base.txt')
+        cached = listdir(CACHE)
+        self.assertEqual(2, len(cached))
+        get_template.cache_clear()
+        get_template('base.html')
+        self.assertEqual(cached, listdir(CACHE))
+
+
+if __name__ == '__main__':
+    ut.main()
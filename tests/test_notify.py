@@ -0,0 +1,122 @@
+"""Test background email delivery."""
+from email.message import EmailMessage
+from os import listdir, path
+import shutil
+import pathlib
+import socket
+from time import monotonic
+import unittest as ut
+from unittest.mock import patch
+
+from podd.notify import Notifier
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.handlers import Sink
+except ImportError:
+    Controller = None
+
+SPOOL = path.join(path.dirname(path.abspath(__file__)), 'spool')
+
+
+def email(number):
+    msg = EmailMessage()
+    msg['Subject'] = f'Report {number}'
+    msg['From'] = 'from@a.com'
+    msg['To'] = 'to@a.com'
+    msg.set_content(f'Message {number}')
+    return msg
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Recorder(Sink):
+
+    def __init__(self):
+        self.sessions = set()
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append(envelope.content)
+        return '250 OK'
+
+
+@ut.skipUnless(Controller, 'aiosmtpd is not installed')
+class TestNotifier(ut.TestCase):
+
+    def setUp(self):
+        self.handler = Recorder()
+        self.port = free_port()
+        self.controller = Controller(self.handler, hostname='127.0.0.1', port=self.port)
+
+    def tearDown(self):
+        shutil.rmtree(SPOOL, ignore_errors=True)
+
+    def notifier(self, **kwargs):
+        return Notifier('from@a.com', None, host='127.0.0.1', port=self.port,
+                        starttls=False, spool=SPOOL, **kwargs)
+
+    def test_connection_reused(self):
+        self.controller.start()
+        try:
+            with self.notifier() as notifier:
+                for number in range(3):
+                    notifier.submit(email(number))
+        finally:
+            self.controller.stop()
+        self.assertEqual(3, notifier.sent)
+        self.assertEqual(3, len(self.handler.messages))
+        self.assertEqual(1, len(self.handler.sessions))
+        self.assertIn(b'Message 2', self.handler.messages[2])
+
+    def test_spooled_and_resent(self):
+        with self.notifier(retries=2, backoff=0) as notifier:
+            notifier.submit(email(1))
+        self.assertEqual(1, notifier.spooled)
+        self.assertEqual(1, len(listdir(SPOOL)))
+        self.controller.start()
+        try:
+            with self.notifier() as notifier:
+                notifier.submit(email(2))
+        finally:
+            self.controller.stop()
+        self.assertEqual(2, notifier.sent)
+        self.assertEqual([], listdir(SPOOL))
+        self.assertIn(b'Subject: Report 1', self.handler.messages[0])
+
+    def test_spool_error(self):
+        with patch.object(pathlib.Path, 'write_bytes', side_effect=OSError) as mock_write:
+            with self.notifier(retries=1) as notifier:
+                notifier.submit(email(1))
+                notifier.submit(email(2))
+        self.assertEqual(2, mock_write.call_count)
+        self.assertEqual(0, notifier.spooled)
+
+
+class TestCloseTimeout(ut.TestCase):
+
+    def tearDown(self):
+        shutil.rmtree(SPOOL, ignore_errors=True)
+
+    def test_unresponsive_server(self):
+        with socket.socket() as server:
+            server.bind(('127.0.0.1', 0))
+            server.listen()  # Never greets
+            notifier = Notifier('from@a.com', None, host='127.0.0.1',
+                                port=server.getsockname()[1], starttls=False,
+                                spool=SPOOL).start()
+            notifier.submit(email(1))
+            start = monotonic()
+            notifier.close(timeout=0.5)
+            self.assertLess(monotonic() - start, 5)
+        self.assertEqual(1, notifier.spooled)
+        self.assertEqual(1, len(listdir(SPOOL)))
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,45 @@
+"""Test reading and writing subscription lists."""
+from os import path, remove
+import unittest as ut
+
+from podd.opml import read_feed_list, read_opml, write_opml
+
+FILE = path.join(path.dirname(path.abspath(__file__)), 'subscriptions')
+PODCASTS = [('Tangentially Speaking', 'http://tangent.libsyn.com/rss', '/podcasts/ts'),
+            ('Exchanges & Co', 'http://www.goldmansachs.com/exchanges-podcast/feed.rss', '/podcasts/ex')]
+OPML = b'''<?xml version="1.0" encoding="utf-8"?>
+<opml version="1.0">
+  <head><title>Overcast Podcast Subscriptions</title></head>
+  <body>
+    <outline text="feeds">
+      <outline type="rss" text="One" xmlUrl="http://one.com/rss" />
+      <outline type="rss" text="Two" xmlUrl=" http://two.com/rss " />
+      <outline type="rss" text="No url" />
+    </outline>
+  </body>
+</opml>'''
+
+
+class TestOPML(ut.TestCase):
+
+    def tearDown(self):
+        remove(FILE)
+
+    def test_round_trip(self):
+        write_opml(PODCASTS, FILE)
+        self.assertEqual([p[1] for p in PODCASTS], read_feed_list(FILE))
+
+    def test_read_nested_opml(self):
+        with open(FILE, 'wb') as file:
+            file.write(OPML)
+        self.assertEqual(['http://one.com/rss', 'http://two.com/rss'], read_opml(OPML))
+        self.assertEqual(['http://one.com/rss', 'http://two.com/rss'], read_feed_list(FILE))
+
+    def test_read_plain_list(self):
+        with open(FILE, 'w') as file:
+            file.write('http://one.com/rss\n\n  http://two.com/rss\nhttp://one.com/rss\n')
+        self.assertEqual(['http://one.com/rss', 'http://two.com/rss'], read_feed_list(FILE))
+
+
+if __name__ == '__main__':
+    ut.main()
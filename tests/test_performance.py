@@ -0,0 +1,103 @@
+"""Test database operations stay fast on large databases.
+
+Runs against a generated database, see `tests.synthetic`, of 1000 podcasts of
+50 episodes by default.  To check the scale of a large library, run e.g.
+
+    PODD_PERF_PODCASTS=10000 PODD_PERF_EPISODES=200 python -m pytest tests/test_performance.py
+
+Each operation must take less than its threshold, the median of a few calls,
+and no statement it runs may scan a table that grows with the library.  The
+latter catches a missing index on a small database as well as a large one.
+"""
+from contextlib import redirect_stdout
+from io import StringIO
+from os import environ, path
+import pathlib
+import shutil
+from statistics import median
+import time
+import unittest as ut
+from unittest.mock import patch
+
+import feedparser as fp
+
+from podd.database import Database, Feed
+from tests.synthetic import feed_id, generate, podcast_url
+
+DIRECTORY = path.join(path.dirname(path.abspath(__file__)), 'performance')
+DATABASE = path.join(DIRECTORY, 'performance.db')
+PODCASTS = int(environ.get('PODD_PERF_PODCASTS', 1000))
+EPISODES = int(environ.get('PODD_PERF_EPISODES', 50))
+CALLS = 5
+# Tables that may be read in full, since they don't grow with the episode count,
+# `podcasts` is aliased `p` throughout
+SMALL_TABLES = {'podcasts', 'p', 'settings', 'roots', 'profiles'}
+
+
+def setUpModule():
+    pathlib.Path(DIRECTORY).mkdir()
+    generate(DATABASE, PODCASTS, EPISODES, DIRECTORY)
+
+
+def tearDownModule():
+    shutil.rmtree(DIRECTORY)
+
+
+def feed(url):
+    entries = [fp.FeedParserDict(
+        id=feed_id(PODCASTS + 1, n), title=f'Episode {n}', summary='Summary',
+        published_parsed=time.gmtime((EPISODES - n) * 86400),
+        links=[fp.FeedParserDict(type='audio/mpeg', href=f'http://cdn.com/{n}.mp3',
+                                 length='5')]) for n in range(EPISODES)]
+    return fp.FeedParserDict(feed=fp.FeedParserDict(title=url), entries=entries, href=url)
+
+
+class TestPerformance(ut.TestCase):
+
+    def assertFast(self, operation, threshold, database=Database):
+        """Call operation with 0 to `CALLS` - 1, checking its time and statements."""
+        statements, times = [], []
+        for n in range(CALLS):
+            with database(DATABASE) as _db, redirect_stdout(StringIO()):
+                _db._conn.set_trace_callback(statements.append)
+                start = time.perf_counter()
+                operation(n, _db)
+                times.append(time.perf_counter() - start)
+        self.assertLess(median(times), threshold)
+        with Database(DATABASE) as _db:
+            for statement in statements:
+                if statement.split()[0].upper() not in ('SELECT', 'INSERT', 'UPDATE', 'DELETE'):
+                    continue
+                if 'episodes_fts' in statement:  # Full-text index internals
+                    continue
+                for *_, detail in _db.cursor.execute(f'EXPLAIN QUERY PLAN {statement}'):
+                    if detail.startswith('SCAN '):
+                        table = detail.split()[1].split('.')[-1]
+                        self.assertIn(table, SMALL_TABLES, f'{detail} in {statement}')
+
+    def test_get_podcasts(self):
+        self.assertFast(lambda n, db: db.get_podcasts(), 0.25)
+
+    def test_get_episodes(self):
+        self.assertFast(lambda n, db: db.get_episodes(podcast_url(n + 1)), 0.02)
+
+    def test_add_episode(self):
+        self.assertFast(
+            lambda n, db: db.add_episode(podcast_url(n + 11), f'new {n}', title='New'), 0.05)
+
+    def test_remove_podcast(self):
+        self.assertFast(lambda n, db: db.remove_podcast(podcast_url(n + 21)), 0.25)
+
+    def test_get_subscription_stats(self):
+        # Reads every episode, but only the covering index
+        self.assertFast(lambda n, db: db.get_subscription_stats(),
+                        0.5 * PODCASTS * EPISODES / 100000)
+
+    @patch('podd.database.fp.parse', feed)
+    def test_feed_add(self):
+        self.assertFast(
+            lambda n, db: db.add(f'http://new{n}.com/feed.rss', newest_only=True), 1.0, Feed)
+
+
+if __name__ == '__main__':
+    ut.main()
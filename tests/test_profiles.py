@@ -0,0 +1,108 @@
+"""Test processing several profiles in one run."""
+from contextlib import redirect_stdout
+from io import StringIO
+from os import listdir, path
+import pathlib
+import shutil
+from time import gmtime
+import unittest as ut
+from unittest.mock import MagicMock, patch
+
+import feedparser as fp
+
+from podd.database import Database, Options
+from podd.downloader import downloader, refresh_profiles
+from podd.fetch import FeedStats
+from podd.utilities import create_database
+
+DIRECTORY = path.join(path.dirname(path.abspath(__file__)), 'profiles')
+DATABASES = [path.join(DIRECTORY, f'{name}.db') for name in ('main', 'team')]
+ROOTS = [path.join(DIRECTORY, name) for name in ('main', 'team')]
+SHARED = 'shared.com/feed.rss'
+OWN = 'own.com/feed.rss'
+
+
+def feed(url):
+    entries = [fp.FeedParserDict(
+        id=str(n), title=f'{url[:3]} {n}', published_parsed=gmtime(n * 86400),
+        links=[fp.FeedParserDict(type='audio/mpeg', href=f'http://cdn.com/{url[:3]}{n}.mp3',
+                                 length='5')]) for n in (2, 1)]
+    return fp.FeedParserDict(feed=fp.FeedParserDict(title=url[:3]), entries=entries, href=url)
+
+
+def fetched(url, **kwargs):
+    return feed(url), FeedStats(url, '2019-07-01 10:00:00', 100, 0.5, 0.1, 2, False)
+
+
+def response(*args, **kwargs):
+    resp = MagicMock(ok=True)
+    resp.iter_content.return_value = [b'audio']
+    return resp
+
+
+class TestProfiles(ut.TestCase):
+
+    def setUp(self):
+        for database, root in zip(DATABASES, ROOTS):
+            pathlib.Path(root).mkdir(parents=True)
+            create_database(database, pathlib.Path(root))
+        with Database(DATABASES[0]) as db:
+            db.add_podcast('sha', SHARED, path.join(ROOTS[0], 'sha'))
+            db.add_episode(SHARED, '1')
+        with Database(DATABASES[1]) as db:
+            db.add_podcast('sha', SHARED, path.join(ROOTS[1], 'sha'))
+            db.add_podcast('own', OWN, path.join(ROOTS[1], 'own'))
+        for root in ROOTS:
+            for name in ('sha', 'own'):
+                pathlib.Path(root, name).mkdir()
+
+    def tearDown(self):
+        shutil.rmtree(DIRECTORY)
+
+    def test_profile_option(self):
+        with Options(DATABASES[0]) as options, redirect_stdout(StringIO()):
+            self.assertTrue(options.set_profile_option('team', DATABASES[1]))
+            self.assertFalse(options.set_profile_option('team', '/elsewhere.db'))
+            self.assertFalse(options.set_profile_option('other', DATABASES[1]))
+            self.assertFalse(options.set_profile_option('self', DATABASES[0]))
+            self.assertEqual([('team', DATABASES[1])], options.get_profiles())
+            self.assertTrue(options.set_profile_option('team', remove=True))
+            self.assertFalse(options.set_profile_option('team', remove=True))
+            self.assertEqual([], options.get_profiles())
+
+    def test_feeds_fetched_once(self):
+        subscriptions = {}
+        for database in DATABASES:
+            with Database(database) as db:
+                subscriptions[database] = db.get_podcasts(), (0, 0)
+        with patch('podd.downloader.timed_fetch', side_effect=fetched) as parse:
+            refreshed = refresh_profiles(subscriptions)
+        self.assertCountEqual([SHARED, OWN], [call.args[0] for call in parse.call_args_list])
+        new = {database: [ep.filename for pod in podcasts for ep in pod.episodes]
+               for database, podcasts in refreshed.items()}
+        self.assertEqual([path.join(ROOTS[0], 'sha', 'sha 2.mp3')], new[DATABASES[0]])
+        self.assertEqual(4, len(new[DATABASES[1]]))
+        self.assertTrue(all(name.startswith(ROOTS[1]) for name in new[DATABASES[1]]))
+        with Database(DATABASES[0]) as db:
+            self.assertEqual(1, len(db.get_feed_history()))
+        with Database(DATABASES[1]) as db:
+            self.assertEqual(2, len(db.get_feed_history()))
+
+    @patch('podd.downloader.ArtworkCache', MagicMock(return_value=MagicMock(path=lambda url: None)))
+    @patch('podd.downloader.timed_fetch', fetched)
+    @patch('podd.podcast.get', response)
+    def test_downloader(self):
+        with redirect_stdout(StringIO()):
+            downloader(databases=DATABASES)
+        self.assertEqual(['sha 2.mp3'], listdir(path.join(ROOTS[0], 'sha')))
+        self.assertEqual(2, len(listdir(path.join(ROOTS[1], 'own'))))
+        with Database(DATABASES[0]) as db:
+            self.assertEqual({'1', '2'}, db.get_episodes(SHARED))
+            self.assertEqual(set(), db.get_episodes(OWN))
+        with Database(DATABASES[1]) as db:
+            self.assertEqual({'1', '2'}, db.get_episodes(SHARED))
+            self.assertEqual({'1', '2'}, db.get_episodes(OWN))
+
+
+if __name__ == '__main__':
+    ut.main()
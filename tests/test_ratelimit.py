@@ -0,0 +1,62 @@
+"""Test bandwidth limiter."""
+from datetime import datetime, time
+import unittest as ut
+from unittest.mock import patch
+
+from podd.ratelimit import TokenBucket, parse_rate, parse_schedule
+
+SCHEDULE = '09:00-17:00=1k,22:00-06:00=0'
+
+
+class TestParsing(ut.TestCase):
+
+    def test_parse_rate(self):
+        self.assertEqual(1000, parse_rate('1000'))
+        self.assertEqual(512 * 1024, parse_rate('512k'))
+        self.assertEqual(2 * 1024 ** 2, parse_rate('2M'))
+        self.assertEqual(1536, parse_rate('1.5KB/s'))
+        self.assertEqual(0, parse_rate('0'))
+        with self.assertRaises(ValueError):
+            parse_rate('fast')
+        with self.assertRaises(ValueError):
+            parse_rate('-5')
+
+    def test_parse_schedule(self):
+        self.assertEqual([(time(9), time(17), 1024), (time(22), time(6), 0)],
+                         parse_schedule(SCHEDULE))
+        self.assertEqual([], parse_schedule(''))
+        with self.assertRaises(ValueError):
+            parse_schedule('9-17')
+
+
+class TestTokenBucket(ut.TestCase):
+
+    def test_current_rate(self):
+        bucket = TokenBucket(100, SCHEDULE)
+        self.assertEqual(1024, bucket.current_rate(datetime(2019, 1, 1, 12)))
+        self.assertEqual(100, bucket.current_rate(datetime(2019, 1, 1, 18)))
+        self.assertEqual(0, bucket.current_rate(datetime(2019, 1, 1, 23)))
+        self.assertEqual(0, bucket.current_rate(datetime(2019, 1, 1, 3)))
+
+    @patch('podd.ratelimit.sleep')
+    @patch('podd.ratelimit.monotonic')
+    def test_consume(self, mock_clock, mock_sleep):
+        mock_clock.return_value = 0
+        bucket = TokenBucket(1000)
+        bucket.consume(1000)  # Burst allowance
+        mock_sleep.assert_not_called()
+        bucket.consume(500)
+        mock_sleep.assert_called_once_with(0.5)
+        mock_clock.return_value = 2  # Debt repaid and bucket refilled
+        mock_sleep.reset_mock()
+        bucket.consume(1000)
+        mock_sleep.assert_not_called()
+
+    @patch('podd.ratelimit.sleep')
+    def test_unlimited(self, mock_sleep):
+        TokenBucket(0).consume(10 ** 9)
+        mock_sleep.assert_not_called()
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,115 @@
+"""Test reconciling podcast directories with the database."""
+from os import path
+import pathlib
+import shutil
+import unittest as ut
+from unittest.mock import patch
+
+import feedparser as fp
+
+from podd.database import Database
+from podd.reconcile import Reconciler
+from podd.utilities import batches, create_database
+
+DIRECTORY = path.join(path.dirname(path.abspath(__file__)), 'reconcile')
+DATABASE = path.join(path.dirname(path.abspath(__file__)), 'reconcile.db')
+URL = 'examplepodcast.com/feed.rss'
+
+
+def entry(number):
+    return fp.FeedParserDict(id=str(number), title=f'Episode {number}', links=[
+        fp.FeedParserDict(type='audio/mpeg', href=f'http://cdn.com/{number}.mp3')])
+
+
+def filename(number):
+    return path.join(DIRECTORY, f'Episode {number}.mp3')
+
+
+def write(name, size):
+    with open(path.join(DIRECTORY, name), 'wb') as file:
+        file.write(bytes(size))
+
+
+class TestReconciler(ut.TestCase):
+
+    def setUp(self):
+        pathlib.Path(DIRECTORY).mkdir()
+        create_database(DATABASE, pathlib.Path(DIRECTORY))
+        with Database(DATABASE) as db:
+            db.add_podcast('Example Podcast', URL, DIRECTORY)
+            db.add_episode(URL, '1', path=filename(1), size=100)
+            db.add_episode(URL, '2', path=filename(2), size=100)
+            db.add_episode(URL, '3', path=filename(3), size=100)
+            db.add_episode(URL, '5')  # Recorded by an older version
+        write('Episode 1.mp3', 100)
+        write('Episode 3.mp3', 50)
+        write('Episode 4.mp3', 100)
+        write('Episode 5.mp3', 100)
+        write('Stray.mp3', 100)
+        write('notes.txt', 100)
+        feed = fp.FeedParserDict(feed={}, entries=[entry(n) for n in range(1, 6)])
+        self.patch = patch('podd.reconcile.fetch_feed', return_value=feed)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        shutil.rmtree(DIRECTORY)
+        pathlib.Path(DATABASE).unlink()
+
+    def files(self):
+        with Database(DATABASE) as db:
+            return {feed_id: (location, size) for _, _, feed_id, location, size
+                    in db.get_episode_files()}
+
+    def test_dry_run(self):
+        before = self.files()
+        report = Reconciler(db_file=DATABASE).run(dry_run=True)
+        self.assertEqual([filename(4)], report.recorded)
+        self.assertEqual([filename(5)], report.backfilled)
+        self.assertEqual([filename(2)], report.missing)
+        self.assertEqual([filename(3)], report.truncated)
+        self.assertEqual([path.join(DIRECTORY, 'Stray.mp3')], report.unknown)
+        self.assertEqual(before, self.files())
+        self.assertTrue(path.exists(filename(3)))
+
+    def test_run(self):
+        Reconciler(db_file=DATABASE).run()
+        self.assertEqual({'1': (filename(1), 100), '2': (None, None),
+                          '4': (filename(4), 100), '5': (filename(5), 100)}, self.files())
+        self.assertTrue(path.exists(filename(3)))  # Replaced by the next download
+        with Database(DATABASE) as db:
+            self.assertEqual('Episode 5', db.search('Episode 5')[0][1])
+
+    def test_delete_truncated(self):
+        report = Reconciler(delete=True, db_file=DATABASE).run()
+        self.assertEqual([filename(3)], report.truncated)
+        self.assertFalse(path.exists(filename(3)))
+        self.assertNotIn('3', self.files())
+
+    def test_feed_length_not_trusted(self):
+        overstated = entry(4)
+        overstated.links[0]['length'] = '1000'
+        feed = fp.FeedParserDict(feed={}, entries=[overstated])
+        with patch('podd.reconcile.fetch_feed', return_value=feed):
+            report = Reconciler(db_file=DATABASE).run(dry_run=True)
+        self.assertEqual([filename(4)], report.recorded)
+
+    def test_redownload_offline(self):
+        report = Reconciler(feeds=False, redownload=True, db_file=DATABASE).run()
+        self.assertEqual([], report.recorded)
+        self.assertEqual(3, len(report.unknown))  # 4, 5 and Stray
+        self.assertEqual({'1': (filename(1), 100), '5': (None, None)}, self.files())
+
+    def test_unavailable_directory(self):
+        shutil.rmtree(DIRECTORY)
+        report = Reconciler(db_file=DATABASE).run()
+        self.assertEqual([DIRECTORY], report.unavailable)
+        self.assertEqual([], report.missing)
+        pathlib.Path(DIRECTORY).mkdir()
+
+    def test_batches(self):
+        self.assertEqual([[1, 2], [3]], list(batches([1, 2, 3], 2)))
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,105 @@
+"""Test cache of enclosure redirects."""
+from os import path
+import pathlib
+import shutil
+import unittest as ut
+from unittest.mock import MagicMock, patch
+
+import feedparser as fp
+
+from podd.podcast import Episode
+from podd.redirects import RedirectCache
+
+DIRECTORY = path.join(path.dirname(path.abspath(__file__)), 'redirects')
+CACHE = path.join(DIRECTORY, 'redirects.json')
+PODTRAC = 'https://dts.podtrac.com/redirect.mp3/'
+CHARTABLE = 'https://chtbl.com/track/ABC123/'
+
+
+def response(url, *hops, ok=True):
+    resp = MagicMock(ok=ok, url=url, history=[MagicMock(url=hop) for hop in hops])
+    resp.iter_content.return_value = [b'audio']
+    return resp
+
+
+class TestRedirectCache(ut.TestCase):
+
+    def setUp(self):
+        pathlib.Path(DIRECTORY).mkdir()
+        self.cache = RedirectCache(CACHE)
+
+    def tearDown(self):
+        shutil.rmtree(DIRECTORY)
+
+    def test_url(self):
+        self.cache.learn(['https://example.com/1.mp3', 'https://cdn.com/abc?sig=1'])
+        self.assertEqual('https://cdn.com/abc?sig=1', self.cache.resolve('https://example.com/1.mp3'))
+        self.assertEqual('https://example.com/2.mp3', self.cache.resolve('https://example.com/2.mp3'))
+        with patch('podd.redirects.time.time', return_value=1e12):
+            self.assertEqual('https://example.com/1.mp3',
+                             self.cache.resolve('https://example.com/1.mp3'))
+
+    def test_prefixes(self):
+        self.cache.learn([f'{PODTRAC}{CHARTABLE[8:]}cdn.com/1.mp3',
+                          f'{CHARTABLE}cdn.com/1.mp3', 'https://cdn.com/1.mp3'])
+        self.cache.learn(['https://op3.dev/e/https://cdn.com/1.mp3', 'https://cdn.com/1.mp3'])
+        self.cache.learn(['http://cdn.com/1.mp3', 'https://cdn.com/1.mp3'])  # Not a prefix
+        self.assertEqual(3 + 3, len(self.cache))  # URLs and prefixes
+        self.assertEqual('https://cdn.com/2.mp3',
+                         self.cache.resolve(f'{PODTRAC}{CHARTABLE[8:]}cdn.com/2.mp3'))
+        self.assertEqual('https://other.com/3.mp3', self.cache.resolve(f'{PODTRAC}other.com/3.mp3'))
+        self.assertEqual('https://cdn.com/4.mp3',
+                         self.cache.resolve('https://op3.dev/e/https://cdn.com/4.mp3'))
+        self.assertEqual('http://cdn.com/5.mp3', self.cache.resolve('http://cdn.com/5.mp3'))
+        self.cache.forget(f'{PODTRAC}{CHARTABLE[8:]}cdn.com/2.mp3')
+        self.assertEqual(f'{PODTRAC}other.com/3.mp3', self.cache.resolve(f'{PODTRAC}other.com/3.mp3'))
+
+    def test_save(self):
+        self.cache.learn([f'{PODTRAC}cdn.com/1.mp3', 'https://cdn.com/1.mp3'])
+        self.cache.save()
+        self.assertEqual('https://cdn.com/2.mp3',
+                         RedirectCache(CACHE).resolve(f'{PODTRAC}cdn.com/2.mp3'))
+        with patch('podd.redirects.time.time', return_value=1e12):
+            self.assertEqual(0, len(RedirectCache(CACHE)))
+
+
+class TestDownload(ut.TestCase):
+
+    def setUp(self):
+        pathlib.Path(DIRECTORY).mkdir()
+        self.cache = RedirectCache(CACHE)
+        self.cache.learn([f'{PODTRAC}cdn.com/1.mp3', 'https://cdn.com/1.mp3'])
+
+    def tearDown(self):
+        shutil.rmtree(DIRECTORY)
+
+    def episode(self, url):
+        entry = fp.FeedParserDict(id=url, title=url[-5:], links=[
+            fp.FeedParserDict(type='audio/mpeg', href=url, length='5')])
+        return Episode(DIRECTORY, entry, 'Example Podcast', 'examplepodcast.com/feed.rss')
+
+    @patch('podd.podcast.get')
+    def test_redirect_skipped(self, mock_get):
+        mock_get.return_value = response('https://cdn.com/2.mp3')
+        episode = self.episode(f'{PODTRAC}cdn.com/2.mp3')
+        episode.download(redirects=self.cache)
+        mock_get.assert_called_once_with('https://cdn.com/2.mp3', stream=True)
+        self.assertFalse(episode.error)
+
+    @patch('podd.podcast.get')
+    def test_fallback(self, mock_get):
+        mock_get.side_effect = [
+            response('https://cdn.com/2.mp3', ok=False),
+            response('https://new-cdn.com/2.mp3', f'{PODTRAC}cdn.com/2.mp3'),
+        ]
+        episode = self.episode(f'{PODTRAC}cdn.com/2.mp3')
+        episode.download(redirects=self.cache)
+        self.assertEqual(f'{PODTRAC}cdn.com/2.mp3', mock_get.call_args.args[0])
+        self.assertFalse(episode.error)
+        self.assertEqual('https://new-cdn.com/2.mp3',
+                         self.cache.resolve(f'{PODTRAC}cdn.com/2.mp3'))
+        self.assertEqual(f'{PODTRAC}cdn.com/3.mp3', self.cache.resolve(f'{PODTRAC}cdn.com/3.mp3'))
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -1,7 +1,8 @@
 """Test compiled regex."""
 import unittest as ut
 
-from podd.utilities import compile_regex, get_episode_number
+from podd.utilities import (compile_regex, episode_number, episode_numbers,
+                            get_episode_number)
 
 PATTERNS = compile_regex()
 
@@ -46,5 +47,38 @@ class TestCompiledRegex(ut.TestCase):
             self.assertIsNone(num)
 
 
+def legacy_episode_number(title):
+    """Try each of the old patterns in turn."""
+    for pattern in PATTERNS:
+        match = pattern.search(title)
+        if match:
+            return match.groups()[0]
+
+
+class TestEpisodeNumber(ut.TestCase):
+    """Test combined episode number pattern."""
+
+    TITLES = ['EPISODE 44 Dan Carlin',
+              '2019 recap, episode #12: the year that was',
+              '#105 - Guest Name',
+              'Show 221: Blitz',
+              'Ep. 7 Something',
+              'Episode: no number here, but 3 later',
+              'Bonus: no numbers at all',
+              '']
+
+    def test_matches_legacy_patterns(self):
+        for title in self.TITLES:
+            self.assertEqual(legacy_episode_number(title), get_episode_number(title), title)
+        self.assertEqual([legacy_episode_number(t) for t in self.TITLES],
+                         episode_numbers(self.TITLES))
+
+    def test_prefers_itunes_metadata(self):
+        entry = {'itunes_episode': '12', 'itunes_season': '3'}
+        self.assertEqual(('12', '3'), episode_number('Episode 44', entry))
+        self.assertEqual(('44', None), episode_number('Episode 44', {'itunes_episode': 'n/a'}))
+        self.assertEqual((None, None), episode_number('Trailer'))
+
+
 if __name__ == '__main__':
     ut.main()
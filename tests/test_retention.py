@@ -0,0 +1,123 @@
+"""Test retention policies."""
+from calendar import timegm
+from os import link, listdir, path
+import pathlib
+import shutil
+import unittest as ut
+
+from podd.database import Database, Options
+from podd.retention import Retention
+from podd.utilities import create_database
+
+DIRECTORY = path.join(path.dirname(path.abspath(__file__)), 'retention')
+DATABASE = path.join(path.dirname(path.abspath(__file__)), 'retention.db')
+URL = 'examplepodcast.com/feed.rss'
+URL2 = 'otherpodcast.com/feed.rss'
+NOW = timegm((2019, 6, 11, 0, 0, 0))
+
+
+def filename(url, day):
+    return path.join(DIRECTORY, f'{url[:5]}-{day}.mp3')
+
+
+class TestRetention(ut.TestCase):
+
+    def setUp(self):
+        pathlib.Path(DIRECTORY).mkdir()
+        create_database(DATABASE, pathlib.Path(DIRECTORY))
+        with Database(DATABASE) as db:
+            db.add_podcast('Example Podcast', URL, DIRECTORY)
+            db.add_podcast('Other Podcast', URL2, DIRECTORY)
+            for url in (URL, URL2):
+                for day in range(1, 11):
+                    with open(filename(url, day), 'wb') as file:
+                        file.write(bytes(100))
+                    db.add_episode(url, str(day), path=filename(url, day),
+                                   size=None if day == 1 else 100,
+                                   downloaded=f'2019-06-{day:02} 12:00:00')
+
+    def tearDown(self):
+        shutil.rmtree(DIRECTORY)
+        pathlib.Path(DATABASE).unlink()
+
+    def set_option(self, **options):
+        with Options(DATABASE) as opt:
+            self.assertTrue(opt.set_retention_option(**options))
+
+    def on_disk(self, url):
+        with Database(DATABASE) as db:
+            return sorted(int(feed_id) for _, podcast, feed_id, location, _
+                          in db.get_episode_files() if podcast == url and location)
+
+    def test_no_policy(self):
+        self.assertEqual([], Retention(DATABASE).run(now=NOW))
+        self.assertEqual(20, len(listdir(DIRECTORY)))
+
+    def test_per_podcast_policies(self):
+        self.set_option(episodes=3)
+        self.set_option(podcast='other', episodes=0, days=4)
+        evicted = Retention(DATABASE).run(now=NOW)
+        self.assertEqual([8, 9, 10], self.on_disk(URL))
+        self.assertEqual([7, 8, 9, 10], self.on_disk(URL2))
+        self.assertEqual(13, len(evicted))
+        self.assertEqual(7, len(listdir(DIRECTORY)))
+        with Database(DATABASE) as db:
+            self.assertEqual(20, len(db.get_episode_files()))  # Records are kept
+            self.assertIn('1', db.get_episodes(URL))
+
+    def test_bytes_and_quota(self):
+        self.set_option(size='250', quota='300')
+        evicted = Retention(DATABASE).run(now=NOW)
+        self.assertEqual(['bytes'] * 16 + ['quota'], [e.reason for e in evicted])
+        self.assertEqual([10], self.on_disk(URL))
+        self.assertEqual([9, 10], self.on_disk(URL2))
+
+    def test_hard_links_counted_once(self):
+        linked = path.join(DIRECTORY, 'linked.mp3')
+        link(filename(URL, 10), linked)
+        with Database(DATABASE) as db:
+            db.add_episode(URL, '11', path=linked, size=100,
+                           downloaded='2019-06-10 13:00:00')
+        self.set_option(podcast='example', size='300')
+        evicted = Retention(DATABASE).run(now=NOW)
+        self.assertEqual([8, 9, 10, 11], self.on_disk(URL))
+        self.assertEqual(700, sum(e.size for e in evicted))
+        self.set_option(podcast='example', size='0', episodes=1)
+        evicted = Retention(DATABASE).run(now=NOW)
+        self.assertEqual([(filename(URL, 10), 0), (filename(URL, 9), 100),
+                          (filename(URL, 8), 100)], [(e.path, e.size) for e in evicted])
+
+    def test_inherit(self):
+        self.set_option(episodes=5)
+        self.set_option(podcast='example', episodes=2)
+        self.set_option(podcast='example', inherit=True)
+        Retention(DATABASE).run(now=NOW)
+        self.assertEqual([6, 7, 8, 9, 10], self.on_disk(URL))
+
+    def test_newest_always_kept(self):
+        self.set_option(days=1, size='10')
+        Retention(DATABASE).run(now=NOW + 30 * 24 * 60 * 60)
+        self.assertEqual([10], self.on_disk(URL))
+
+    def test_dry_run(self):
+        self.set_option(episodes=1)
+        evicted = Retention(DATABASE).run(dry_run=True, now=NOW)
+        self.assertEqual(18, len(evicted))
+        self.assertEqual(20, len(listdir(DIRECTORY)))
+        self.assertEqual(list(range(1, 11)), self.on_disk(URL))
+
+    def test_sizes_recorded_once(self):
+        self.set_option(episodes=20)
+        Retention(DATABASE).run(now=NOW)
+        with Database(DATABASE) as db:
+            self.assertNotIn(None, [size for *_, size in db.get_episode_files()])
+
+    def test_invalid_options(self):
+        with Options(DATABASE) as opt:
+            self.assertFalse(opt.set_retention_option(episodes=-1))
+            self.assertFalse(opt.set_retention_option(podcast='podcast', days=1))
+            self.assertFalse(opt.set_retention_option(podcast='other', quota='1G'))
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,74 @@
+"""Test download scheduling policies."""
+from time import gmtime
+from types import SimpleNamespace
+import unittest as ut
+from unittest.mock import patch
+
+from podd.scheduling import (newest_first, round_robin, schedule, smallest_first,
+                             spread_volumes)
+
+A, B = 'a.com/feed.rss', 'b.com/feed.rss'
+
+
+def episode(title, podcast_url=A, published=None, length=None, backlog=False,
+            directory='/disk1/podcast'):
+    """Create minimal stand-in for an Episode."""
+    if published is not None:
+        published = gmtime(published)
+    return SimpleNamespace(title=title, podcast_url=podcast_url,
+                           published=published, length=length, backlog=backlog,
+                           filename=f'{directory}/{title}.mp3')
+
+
+def titles(episodes):
+    return [ep.title for ep in episodes]
+
+
+class TestScheduling(ut.TestCase):
+
+    def test_feed_order(self):
+        eps = [episode('1'), episode('2'), episode('3')]
+        self.assertEqual(['1', '2', '3'], titles(schedule(eps)))
+
+    def test_newest_first(self):
+        eps = [episode('old', published=100),
+               episode('undated'),
+               episode('new', published=300),
+               episode('middle', published=200)]
+        self.assertEqual(['new', 'middle', 'old', 'undated'], titles(newest_first(eps)))
+
+    def test_smallest_first(self):
+        eps = [episode('big', length=500),
+               episode('unknown'),
+               episode('small', length=5),
+               episode('medium', length=50)]
+        self.assertEqual(['small', 'medium', 'big', 'unknown'], titles(smallest_first(eps)))
+
+    def test_round_robin(self):
+        eps = [episode('a1'), episode('a2'), episode('a3'),
+               episode('b1', podcast_url=B), episode('b2', podcast_url=B)]
+        self.assertEqual(['a1', 'b1', 'a2', 'b2', 'a3'], titles(round_robin(eps)))
+
+    def test_backlog_last(self):
+        eps = [episode('old', length=1, backlog=True),
+               episode('fresh', length=100),
+               episode('older', length=2, backlog=True)]
+        self.assertEqual(['fresh', 'old', 'older'], titles(schedule(eps, 'smallest')))
+
+    def test_unknown_policy(self):
+        with self.assertRaises(KeyError):
+            schedule([], 'largest')
+
+
+    @patch('podd.scheduling.volume', lambda directory: directory.split('/')[1])
+    def test_spread_volumes(self):
+        eps = [episode('1'), episode('2'), episode('3', directory='/disk2/other'),
+               episode('4', directory='/disk2/other'), episode('5')]
+        self.assertEqual(['1', '3', '2', '4', '5'], titles(spread_volumes(eps)))
+        eps.append(episode('old', directory='/disk2/other', backlog=True))
+        self.assertEqual(['1', '3', '2', '4', '5', 'old'], titles(schedule(eps)))
+        self.assertEqual(['1', '2'], titles(spread_volumes(eps[:2])))
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,82 @@
+"""Test Bloom filter store of seen feed ids."""
+from os import listdir, path
+import pathlib
+import shutil
+import unittest as ut
+from unittest.mock import ANY, patch
+
+from podd.database import Database
+from podd.seen import BloomFilter, SeenIds
+from podd.utilities import create_database
+
+DIRECTORY = path.join(path.dirname(path.abspath(__file__)), 'seen')
+DATABASE = path.join(DIRECTORY, 'seen.db')
+URL = 'examplepodcast.com/feed.rss'
+
+
+def guid(number):
+    return f'https://examplepodcast.com/episodes/{number:06}-a-long-guid-url'
+
+
+class TestBloomFilter(ut.TestCase):
+
+    def test_membership(self):
+        bloom = BloomFilter(1000)
+        for n in range(1000):
+            bloom.add(guid(n))
+        self.assertTrue(all(guid(n) in bloom for n in range(1000)))
+        false_positives = sum(guid(n) in bloom for n in range(1000, 11000))
+        self.assertLess(false_positives, 300)
+        self.assertEqual(1000, len(bloom))
+        self.assertLess(len(bloom.to_bytes()), 1300)
+
+
+class TestSeenIds(ut.TestCase):
+
+    def setUp(self):
+        pathlib.Path(DIRECTORY).mkdir()
+        create_database(DATABASE, pathlib.Path(DIRECTORY))
+        with Database(DATABASE) as db:
+            db.add_podcast('Example Podcast', URL, DIRECTORY)
+            for n in range(10):
+                db.add_episode(URL, guid(n))
+
+    def tearDown(self):
+        shutil.rmtree(DIRECTORY)
+
+    def test_known(self):
+        seen = SeenIds(DATABASE)
+        self.assertEqual({guid(0), guid(9)}, seen.known(URL, [guid(0), guid(9), guid(10)]))
+        self.assertEqual(set(), seen.known('other.com/feed.rss', [guid(0)]))
+        self.assertEqual(2, len(listdir(path.join(DIRECTORY, 'seen.seen'))))
+
+    def test_incremental(self):
+        SeenIds(DATABASE).known(URL, [])
+        with Database(DATABASE) as db:
+            db.add_episode(URL, guid(10))
+        with patch.object(Database, 'get_episode_ids', autospec=True,
+                          side_effect=Database.get_episode_ids) as get_ids:
+            self.assertEqual({guid(10)}, SeenIds(DATABASE).known(URL, [guid(10)]))
+        get_ids.assert_called_once_with(ANY, URL, after=10)
+
+    def test_deleted_ids_reused(self):
+        seen = SeenIds(DATABASE)
+        seen.known(URL, [])
+        with Database(DATABASE) as db:
+            db.cursor.execute('DELETE FROM episodes WHERE feed_id = ?', (guid(9),))
+            db.add_episode(URL, guid(11))  # Takes over the deleted episode's id
+        self.assertEqual({guid(11)}, seen.known(URL, [guid(9), guid(11)]))
+
+    @patch('podd.seen.MIN_CAPACITY', 4)
+    def test_grows(self):
+        seen = SeenIds(DATABASE)
+        seen.known(URL, [])
+        with Database(DATABASE) as db:
+            for n in range(10, 50):
+                db.add_episode(URL, guid(n))
+        self.assertEqual({guid(49)}, seen.known(URL, [guid(49)]))
+        self.assertEqual(100, seen._filters[URL][2].capacity)
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,90 @@
+"""Test per-feed refresh statistics."""
+from os import path
+import pathlib
+import shutil
+import unittest as ut
+from unittest.mock import MagicMock, patch
+
+from requests.exceptions import ConnectionError
+
+from podd.database import Database
+from podd.fetch import FeedStats, timed_fetch
+from podd.utilities import create_database
+
+DIRECTORY = path.join(path.dirname(path.abspath(__file__)), 'stats')
+DATABASE = path.join(DIRECTORY, 'stats.db')
+SLOW = 'http://slow.com/feed.rss'
+FAST = 'http://fast.com/feed.rss'
+RSS = (b'<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+       b'<title>Example Podcast</title><item><guid>1</guid></item>'
+       b'<item><guid>2</guid></item></channel></rss>')
+
+
+def stats(url, fetch=0.1, failed=False, day=1):
+    return FeedStats(url, f'2019-07-{day:02} 10:00:00', 0 if failed else 2048,
+                     fetch, 0.0 if failed else 0.05, 0 if failed else 2, failed)
+
+
+class TestTimedFetch(ut.TestCase):
+
+    @patch('podd.fetch.get')
+    def test_fetched(self, mock_get):
+        mock_get.return_value = MagicMock(content=RSS, headers={}, url=SLOW)
+        feed, result = timed_fetch(SLOW)
+        self.assertEqual(2, len(feed.entries))
+        self.assertEqual((SLOW, len(RSS), 2, False),
+                         (result.url, result.size, result.entries, result.failed))
+        self.assertGreaterEqual(result.parse_seconds, 0)
+
+    @patch('podd.fetch.get', MagicMock(side_effect=ConnectionError))
+    def test_failed(self):
+        feed, result = timed_fetch(SLOW)
+        self.assertEqual([], feed.entries)
+        self.assertTrue(result.failed)
+        self.assertEqual(0, result.size)
+
+
+class TestFeedStats(ut.TestCase):
+
+    def setUp(self):
+        pathlib.Path(DIRECTORY).mkdir()
+        create_database(DATABASE, pathlib.Path(DIRECTORY))
+        with Database(DATABASE) as db:
+            db.add_podcast('Slow Podcast', SLOW, DIRECTORY)
+            db.add_podcast('Fast Podcast', FAST, DIRECTORY)
+
+    def tearDown(self):
+        shutil.rmtree(DIRECTORY)
+
+    def test_history_bounded(self):
+        with Database(DATABASE) as db:
+            for day in range(1, 6):
+                db.add_feed_stats([stats(SLOW, day=day), stats(FAST, day=day)], history=3)
+            db.add_feed_stats([stats('http://other.com/feed.rss')], history=3)
+            history = db.get_feed_history('slow')
+        self.assertEqual(['2019-07-05 10:00:00', '2019-07-04 10:00:00', '2019-07-03 10:00:00'],
+                         [row[1] for row in history])
+        with Database(DATABASE) as db:
+            self.assertEqual(6, len(db.get_feed_history()))
+            db.remove_podcast(SLOW)
+            self.assertEqual(3, len(db.get_feed_history()))
+
+    def test_report(self):
+        with Database(DATABASE) as db:
+            db.add_feed_stats([stats(SLOW, fetch=1.0), stats(FAST, failed=True)])
+            for day in range(2, 8):
+                db.add_feed_stats([stats(SLOW, fetch=3.0, day=day), stats(FAST, day=day)])
+            by_time = db.get_feed_report()
+            by_failures = db.get_feed_report('failures', limit=1)
+        self.assertEqual(['Slow Podcast', 'Fast Podcast'], [row[0] for row in by_time])
+        name, runs, size, fetch, parse, entries, failures, total, recent = by_time[0]
+        self.assertEqual((7, 2048, 2), (runs, size, entries))
+        self.assertEqual((2048, 2), by_failures[0][2:6:3])
+        self.assertAlmostEqual(19 / 7 + 0.05, total)
+        self.assertAlmostEqual(3.05, recent)
+        self.assertEqual('Fast Podcast', by_failures[0][0])
+        self.assertAlmostEqual(1 / 7, by_failures[0][6])
+
+
+if __name__ == '__main__':
+    ut.main()
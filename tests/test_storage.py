@@ -0,0 +1,124 @@
+"""Test placement of podcasts in download roots."""
+from os import path
+import pathlib
+import shutil
+from time import gmtime
+import unittest as ut
+from unittest.mock import patch
+
+import feedparser as fp
+
+from podd.database import Feed, Options
+from podd.storage import choose_root, volume
+from podd.utilities import create_database
+
+DIRECTORY = path.join(path.dirname(path.abspath(__file__)), 'roots')
+DATABASE = path.join(path.dirname(path.abspath(__file__)), 'roots.db')
+ROOTS = [path.join(DIRECTORY, name) for name in ('default', 'disk1', 'disk2')]
+
+
+def feed(number):
+    entry = fp.FeedParserDict(id='1', title='Episode 1', published_parsed=gmtime(0))
+    return fp.FeedParserDict(feed=fp.FeedParserDict(title=f'Podcast {number}'),
+                             entries=[entry], href=f'podcast{number}.com/feed.rss')
+
+
+class TestChooseRoot(ut.TestCase):
+
+    def test_free_space(self):
+        free = {'/a': 10, '/b': 30, '/c': -1}
+        with patch('podd.storage.free_space', free.get):
+            self.assertEqual('/b', choose_root(['/a', '/b', '/c']))
+        self.assertEqual('/a', choose_root(['/a']))
+
+    def test_round_robin(self):
+        roots = ['/a', '/b/', '/c']
+        self.assertEqual('/a', choose_root(roots, 'round-robin'))
+        self.assertEqual('/c', choose_root(roots, 'round-robin', '/b/Podcast'))
+        self.assertEqual('/a', choose_root(roots, 'round-robin', '/c/Podcast'))
+        self.assertEqual('/a', choose_root(roots, 'round-robin', '/elsewhere/Podcast'))
+
+    def test_volume(self):
+        here = path.dirname(path.abspath(__file__))
+        self.assertEqual(volume(here), volume(path.join(here, 'not', 'yet', 'created')))
+
+
+class TestRoots(ut.TestCase):
+
+    def setUp(self):
+        pathlib.Path(ROOTS[0]).mkdir(parents=True)
+        create_database(DATABASE, pathlib.Path(ROOTS[0]))
+
+    def tearDown(self):
+        shutil.rmtree(DIRECTORY)
+        pathlib.Path(DATABASE).unlink()
+
+    def test_roots(self):
+        with Options(DATABASE) as options:
+            self.assertEqual(ROOTS[:1], options.get_roots())
+            self.assertTrue(options.set_root_option(ROOTS[1]))
+            self.assertTrue(options.set_root_option(ROOTS[2]))
+            self.assertFalse(options.set_root_option(ROOTS[1]))
+            self.assertFalse(options.set_root_option(ROOTS[0]))
+            self.assertEqual(ROOTS, options.get_roots())
+            self.assertTrue(options.set_root_option(ROOTS[1], remove=True))
+            self.assertFalse(options.set_root_option(ROOTS[1], remove=True))
+            self.assertEqual([ROOTS[0], ROOTS[2]], options.get_roots())
+            self.assertFalse(options.set_placement_option('random'))
+
+    @patch('podd.database.fetch_feed', lambda url: feed(url[7]))
+    def test_placement(self):
+        with Options(DATABASE) as options:
+            options.set_root_option(ROOTS[1])
+            options.set_root_option(ROOTS[2])
+            options.set_placement_option('round-robin')
+        with Feed(DATABASE) as podcasts:
+            podcasts.add_many([f'podcast{n}.com/feed.rss' for n in range(4)])
+            podcasts.add_many(['podcast4.com/feed.rss'])
+            podcasts.add_many(['podcast5.com/feed.rss'], root=ROOTS[0])
+            directories = [directory for *_, directory in podcasts.get_podcasts()]
+        self.assertEqual([path.join(ROOTS[n % 3], f'Podcast {i}')
+                          for i, n in enumerate([0, 1, 2, 0, 1, 0])], directories)
+        self.assertTrue(all(path.isdir(directory) for directory in directories))
+
+
+    def test_invalid_feed_skipped(self):
+        def fetch(url):
+            fetched = feed(url[7])
+            if url[7] == '1':
+                fetched.entries = [fp.FeedParserDict(title='No id')] * 2
+            return fetched
+
+        with patch('podd.database.fetch_feed', fetch), Feed(DATABASE) as podcasts:
+            additions = podcasts.add_many([f'podcast{n}.com/feed.rss' for n in range(3)],
+                                          newest_only=True, verbose=False)
+            self.assertEqual(['added', 'invalid', 'added'], [a.status for a in additions])
+            self.assertEqual(['Podcast 0', 'Podcast 2'],
+                             [name for name, *_ in podcasts.get_podcasts()])
+
+    def test_undated_feed(self):
+        undated = fp.FeedParserDict(
+            feed=fp.FeedParserDict(title='Undated'), href='undated.com/feed.rss',
+            entries=[fp.FeedParserDict(id=str(n), title=f'Episode {n}') for n in (3, 2, 1)])
+        with patch('podd.database.fp.parse', return_value=undated), Feed(DATABASE) as podcasts:
+            podcasts.add('undated.com/feed.rss')
+            self.assertEqual(['Undated'], [name for name, *_ in podcasts.get_podcasts()])
+            self.assertEqual({'2', '1'}, podcasts.get_backlog('undated.com/feed.rss'))
+        with patch('podd.database.fetch_feed', return_value=undated), Feed(DATABASE) as podcasts:
+            podcasts.remove_podcast('undated.com/feed.rss')
+            (addition,) = podcasts.add_many(['undated.com/feed.rss'], newest_only=True,
+                                            verbose=False)
+            self.assertEqual('added', addition.status)
+            self.assertEqual({'2', '1'}, podcasts.get_episodes('undated.com/feed.rss'))
+
+    def test_add_is_atomic(self):
+        broken = fp.FeedParserDict(
+            feed=fp.FeedParserDict(title='Broken'), href='broken.com/feed.rss',
+            entries=[fp.FeedParserDict(title='No id')] * 2)
+        with patch('podd.database.fp.parse', return_value=broken), Feed(DATABASE) as podcasts:
+            podcasts.add('broken.com/feed.rss')
+            self.assertEqual([], podcasts.get_podcasts())
+        self.assertFalse(path.exists(path.join(ROOTS[0], 'Broken')))
+
+if __name__ == '__main__':
+    ut.main()
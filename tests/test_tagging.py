@@ -0,0 +1,92 @@
+"""Test writing tags while downloading."""
+from io import BytesIO
+from os import path, remove
+import unittest as ut
+
+from mutagen.id3 import ID3, COMM, TIT2
+from mutagen.mp3 import MP3
+
+from podd.tagging import InlineID3, TagJob, id3_tags, tag_file
+
+FILE = path.join(path.dirname(path.abspath(__file__)), 'inline.mp3')
+# MPEG-1 layer III, 128 kbps, 44.1 kHz frames are 417 bytes long
+FRAMES = (b'\xff\xfb\x90\x64' + bytes(413)) * 40
+
+
+def chunked(data, size=100):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def write(chunks):
+    with open(FILE, 'wb') as file:
+        for chunk in chunks:
+            file.write(chunk)
+
+
+class TestInlineID3(ut.TestCase):
+
+    def tearDown(self):
+        remove(FILE)
+
+    def test_untagged_stream(self):
+        inline = InlineID3(id3_tags('Episode 4', 'Example Podcast', '4'))
+        write(inline.stream(chunked(FRAMES)))
+        self.assertTrue(inline.tagged)
+        audio = MP3(FILE)
+        self.assertEqual(['Episode 4'], audio.tags['TIT2'].text)
+        self.assertEqual(['Example Podcast'], audio.tags['TALB'].text)
+        self.assertEqual(['4'], audio.tags['TRCK'].text)
+        with open(FILE, 'rb') as file:
+            self.assertTrue(file.read().endswith(FRAMES))
+
+    def test_existing_tag_is_updated(self):
+        old = ID3()
+        old.add(TIT2(encoding=3, text='Old title'))
+        old.add(COMM(encoding=3, lang='eng', desc='', text='Keep me'))
+        data = BytesIO()
+        old.save(data, padding=lambda info: 0)
+        inline = InlineID3(id3_tags('New title', 'Example Podcast'))
+        write(inline.stream(chunked(data.getvalue() + FRAMES, 7)))
+        self.assertTrue(inline.tagged)
+        tags = ID3(FILE)
+        self.assertEqual(['New title'], tags['TIT2'].text)
+        self.assertEqual(['Keep me'], tags.getall('COMM')[0].text)
+        self.assertEqual(1, len(tags.getall('TIT2')))
+        with open(FILE, 'rb') as file:
+            self.assertTrue(file.read().endswith(FRAMES))
+
+    def test_other_streams_untouched(self):
+        data = b'\x00\x00\x00\x20ftypM4A ' + bytes(1000)
+        inline = InlineID3(id3_tags('Episode', 'Example Podcast'))
+        write(inline.stream(chunked(data)))
+        self.assertFalse(inline.tagged)
+        with open(FILE, 'rb') as file:
+            self.assertEqual(data, file.read())
+
+
+class TestTagFile(ut.TestCase):
+
+    def tearDown(self):
+        remove(FILE)
+
+    def test_tag_mp3(self):
+        write([FRAMES])
+        self.assertIsNone(tag_file(TagJob(FILE, 'Episode 7', 'Example Podcast', '7')))
+        tags = MP3(FILE).tags
+        self.assertEqual(['Episode 7'], tags['TIT2'].text)
+        self.assertEqual(['7'], tags['TRCK'].text)
+
+    def test_failures(self):
+        write([b'not audio'])
+        self.assertEqual('HeaderNotFoundError', tag_file(TagJob(FILE, 'Episode', 'Example Podcast')))
+        unknown = FILE + '.bin'
+        with open(unknown, 'wb') as file:
+            file.write(b'\x00' * 100)
+        self.assertEqual('unknown filetype', tag_file(TagJob(unknown, 'Episode', 'Example Podcast')))
+        remove(unknown)
+        self.assertEqual('MutagenError',
+                         tag_file(TagJob(FILE + '.missing', 'Episode', 'Example Podcast')))
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,176 @@
+"""Test verifying downloaded files."""
+import os
+from os import path
+import pathlib
+import shutil
+import unittest as ut
+from unittest.mock import MagicMock, patch
+
+import feedparser as fp
+
+from podd.database import Database
+from podd.jobs import JobQueue, Worker
+from podd.podcast import Episode
+from podd.utilities import create_database
+from podd.verify import Check, Verifier, check_file
+
+DIRECTORY = path.join(path.dirname(path.abspath(__file__)), 'verify')
+DATABASE = path.join(path.dirname(path.abspath(__file__)), 'verify.db')
+URL = 'examplepodcast.com/feed.rss'
+FRAME = b'\xff\xfb\x90\x64' + bytes(413)  # MPEG-1 layer 3, 128 kbps, 44.1 kHz
+
+
+def filename(number):
+    return path.join(DIRECTORY, f'Episode {number}.mp3')
+
+
+def write(number, data):
+    with open(filename(number), 'wb') as file:
+        file.write(data)
+
+
+class TestCheckFile(ut.TestCase):
+
+    def setUp(self):
+        pathlib.Path(DIRECTORY).mkdir()
+        write(1, FRAME * 20)
+
+    def tearDown(self):
+        shutil.rmtree(DIRECTORY)
+
+    def check(self, length=None, size=None, file_sha256=None, hashes=False):
+        return check_file(Check(1, filename(1), length, size, file_sha256, hashes))
+
+    def test_good(self):
+        verdict = self.check(len(FRAME) * 20, len(FRAME) * 20)
+        self.assertIsNone(verdict.problem)
+        self.assertIsNone(verdict.file_sha256)
+
+    def test_missing(self):
+        self.assertEqual('missing', check_file(Check(2, filename(2), None, None, None, False)).problem)
+
+    def test_truncated(self):
+        self.assertEqual('truncated', self.check(size=len(FRAME) * 30).problem)
+
+    def test_short(self):
+        verdict = self.check(length=len(FRAME) * 30, size=len(FRAME) * 20)
+        self.assertIsNone(verdict.problem)
+        self.assertTrue(verdict.short)
+
+    def test_corrupt(self):
+        write(1, bytes(len(FRAME) * 20))
+        self.assertEqual('corrupt', self.check().problem)
+        write(1, b'')
+        self.assertEqual('corrupt', self.check(hashes=True).problem)
+
+    def test_hash(self):
+        digest = self.check(hashes=True).file_sha256
+        self.assertEqual(64, len(digest))
+        self.assertIsNone(self.check(file_sha256=digest, hashes=True).problem)
+        write(1, FRAME * 21)
+        self.assertEqual('changed', self.check(file_sha256=digest, hashes=True).problem)
+        self.assertIsNone(self.check(file_sha256=digest).problem)  # Not hashed
+
+
+class TestVerifier(ut.TestCase):
+
+    def setUp(self):
+        pathlib.Path(DIRECTORY).mkdir()
+        create_database(DATABASE, pathlib.Path(DIRECTORY))
+        with Database(DATABASE) as db:
+            db.add_podcast('Example Podcast', URL, DIRECTORY)
+            for number in range(1, 5):
+                db.add_episode(URL, str(number), title=f'Episode {number}',
+                               published='2019-06-01 12:00:00',
+                               url=f'http://cdn.com/{number}.mp3',
+                               length=len(FRAME) * 20, size=len(FRAME) * 20,
+                               path=filename(number))
+        write(1, FRAME * 20)
+        write(2, FRAME * 10)  # Interrupted
+        write(3, bytes(len(FRAME) * 20))  # Error page saved as audio
+        write(4, FRAME * 20)
+        with Database(DATABASE) as db:
+            db.cursor.execute('UPDATE episodes SET length = ? WHERE feed_id = ?',
+                              (len(FRAME) * 30, '4'))  # Feed overstates its length
+            db._conn.commit()
+
+    def tearDown(self):
+        shutil.rmtree(DIRECTORY)
+        pathlib.Path(DATABASE).unlink()
+
+    def test_dry_run(self):
+        report = Verifier(hashes=True, processes=2, db_file=DATABASE).run(dry_run=True)
+        self.assertEqual(4, report.checked)
+        self.assertEqual([(filename(2), 'truncated'), (filename(3), 'corrupt')],
+                         [(verdict.filename, verdict.problem) for verdict in report.bad])
+        self.assertEqual([filename(4)], [verdict.filename for verdict in report.short])
+        self.assertEqual(0, report.queued)
+        self.assertTrue(path.exists(filename(2)))
+        with Database(DATABASE) as db:
+            self.assertEqual(4, len(db.get_episode_checks()))
+
+    def test_requeue(self):
+        report = Verifier(processes=2, db_file=DATABASE).run()
+        self.assertEqual(2, report.queued)
+        self.assertTrue(path.exists(filename(2)))  # Kept until replaced
+        self.assertTrue(path.exists(filename(3)))
+        with Database(DATABASE) as db:
+            self.assertEqual(4, len(db.get_episode_checks()))
+        with JobQueue(DATABASE) as queue:
+            self.assertEqual({'pending': 2}, queue.counts())
+            _, _, episode = queue.claim('test')
+        self.assertEqual(filename(2), episode.filename)
+        self.assertEqual('http://cdn.com/2.mp3', episode.url)
+        self.assertEqual(len(FRAME) * 20, episode.length)
+
+    @patch('podd.jobs.ArtworkCache', MagicMock())
+    @patch('podd.podcast.get')
+    def test_replace(self, mock_get):
+        Verifier(processes=2, db_file=DATABASE).run()
+        good = MagicMock(ok=True, history=[])
+        good.iter_content.side_effect = lambda size: [FRAME * 20]
+        mock_get.side_effect = lambda url, stream: (
+            good if url.endswith('2.mp3') else MagicMock(ok=False, status_code=404))
+        work = Worker(threads=1, db_file=DATABASE)
+        with patch('podd.jobs.MAX_ATTEMPTS', 1):
+            work.run()
+        self.assertEqual([filename(2)], [episode.filename for episode in work.done])
+        self.assertLessEqual(len(FRAME) * 20, path.getsize(filename(2)))  # Tagged
+        self.assertEqual(bytes(len(FRAME) * 20), open(filename(3), 'rb').read())
+        self.assertEqual(sorted(os.listdir(DIRECTORY)), [f'Episode {n}.mp3' for n in range(1, 5)])
+        with Database(DATABASE) as db:
+            self.assertEqual(4, len(db.get_episode_checks()))
+        report = Verifier(processes=2, db_file=DATABASE).run(dry_run=True)
+        self.assertEqual([filename(3)], [verdict.filename for verdict in report.bad])
+
+    def test_hashes(self):
+        report = Verifier(hashes=True, processes=2, db_file=DATABASE).run()
+        self.assertEqual(2, report.hashed)
+        self.assertEqual(0, Verifier(hashes=True, processes=2, db_file=DATABASE).run().hashed)
+        write(4, FRAME * 21)
+        report = Verifier(hashes=True, processes=2, db_file=DATABASE).run()
+        self.assertEqual((filename(4), 'changed'),
+                         (report.bad[-1].filename, report.bad[-1].problem))
+
+
+class TestDownloadError(ut.TestCase):
+
+    def setUp(self):
+        pathlib.Path(DIRECTORY).mkdir()
+
+    def tearDown(self):
+        shutil.rmtree(DIRECTORY)
+
+    @patch('podd.podcast.get')
+    def test_not_ok(self, mock_get):
+        mock_get.return_value = MagicMock(ok=False, status_code=404, history=[])
+        entry = fp.FeedParserDict(id='1', title='Episode 1', links=[
+            fp.FeedParserDict(type='audio/mpeg', href='http://cdn.com/1.mp3')])
+        episode = Episode(DIRECTORY, entry, 'Example Podcast', URL)
+        episode.download()
+        self.assertTrue(episode.error)
+        self.assertFalse(path.exists(episode.filename))
+
+
+if __name__ == '__main__':
+    ut.main()